@@ -56,6 +56,10 @@ setup(
             'sphinx>=4.0',
             'sphinx_rtd_theme>=0.5',
         ],
+        'serialization': [
+            'orjson>=3.9',
+            'msgpack>=1.0',
+        ],
     },
     include_package_data=True,
     keywords='tool router llm ai function call',
@@ -0,0 +1,45 @@
+# tests/conftest.py
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import pytest
+from unittest.mock import AsyncMock
+from tool4ai.core.tool import Tool
+from tool4ai.core.toolkit import Toolkit
+
+
+@pytest.fixture
+def tool_message():
+    """Builds the model response, message and usage, that calls the tool `name` with `arguments`."""
+    def _tool_message(name, arguments=None):
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments or {})
+        return {"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{name}", "type": "function", "function": {"name": name, "arguments": arguments}}
+        ]}, {"total_tokens": 1}
+    return _tool_message
+
+
+@pytest.fixture
+def tool_maker(tool_message):
+    """A ToolMaker mock calling the first tool offered to each sub-query, without arguments."""
+    async def make_tools(task, tools_info, memory):
+        return tool_message(next(iter(tools_info.values()))["name"])
+
+    maker = AsyncMock()
+    maker.make_tools.side_effect = make_tools
+    return maker
+
+
+@pytest.fixture
+def make_toolkit():
+    """Builds a Toolkit from tool functions by name, a tool without a schema takes no arguments."""
+    def _make_toolkit(functions, schemas=None):
+        toolkit = Toolkit()
+        for name, f in functions.items():
+            schema = (schemas or {}).get(name, {"type": "object", "properties": {}})
+            toolkit.add_tool(Tool(name=name, schema=schema, description=name, f=f))
+        return toolkit
+    return _make_toolkit
@@ -9,7 +9,8 @@ __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file
 import pytest
 from tool4ai.core.graph.tool_dependency_graph import ToolDependencyGraph
 from tool4ai.core.models import SubQueryResponse, SubQuery
-from tool4ai.storages import JSONStorage, LMDBStorage
+import json
+from tool4ai.storages import JSONStorage, LMDBStorage, SQLiteStorage, TieredStorage, FileBlobStore, LMDBBlobStore, RetentionSweeper
 
 @pytest.fixture(scope="module")
 def sample_sub_query_response():
@@ -18,7 +19,7 @@ def sample_sub_query_response():
         SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="tool2", dependent_on=0),
     ])
 
-@pytest.mark.parametrize("storage_class", [JSONStorage, LMDBStorage])
+@pytest.mark.parametrize("storage_class", [JSONStorage, LMDBStorage, SQLiteStorage])
 @pytest.mark.asyncio
 async def test_storage_integration(sample_sub_query_response, storage_class):
     # Initialize the graph with the specific storage
@@ -50,5 +51,270 @@ async def test_storage_integration(sample_sub_query_response, storage_class):
     # Clean up
     await graph.delete()
 
+@pytest.mark.asyncio
+async def test_storage_query(sample_sub_query_response, tmp_path):
+    storage = SQLiteStorage(db_path=str(tmp_path / "runs.db"))
+    graphs = []
+    for tenant, status in (("acme", "human"), ("acme", "success"), ("globex", "human")):
+        graph = ToolDependencyGraph(storage=storage, tenant=tenant)
+        graph.build_dependency_structure(sample_sub_query_response)
+        graph.graph_status = status
+        await graph.save()
+        graphs.append(graph)
+
+    human_runs = await storage.query(graph_status="human")
+    assert [record["run_id"] for record in human_runs] == [graphs[0].run_id, graphs[2].run_id]
+    assert [record["run_id"] for record in await storage.query(tenant="acme", graph_status="human")] == [graphs[0].run_id]
+    assert await storage.query(updated_before=graphs[0].updated_at) == []
+    assert len(await storage.query(limit=2)) == 2
+
+    # The generic scan gives the same answer
+    json_storage = JSONStorage(storage_path=str(tmp_path))
+    for graph in graphs:
+        await json_storage.save(graph.run_id, graph.to_dict())
+    assert await json_storage.query(graph_status="human") == human_runs
+    storage.close()
+
+@pytest.mark.parametrize("compression", [None, "zlib", "lzma"])
+@pytest.mark.asyncio
+async def test_json_storage_layout(compression, tmp_path):
+    storage = JSONStorage(storage_path=str(tmp_path), shard_depth=2, compression=compression, fsync="always")
+    data = {"run_id": "run_1", "graph_status": "success", "payload": "x" * 1000}
+    await storage.save("run_1", data)
+
+    file_path = storage._get_file_path("run_1")
+    assert os.path.dirname(os.path.dirname(os.path.dirname(file_path))) == str(tmp_path)
+    with open(file_path, "rb") as f:
+        assert f.read(4) == (b"T4AI" if compression else b'{"ru')
+    assert os.listdir(os.path.dirname(file_path)) == ["run_1.json"]
+
+    # Any reader can load files written with other settings
+    assert await JSONStorage(storage_path=str(tmp_path), shard_depth=2).load("run_1") == data
+    assert await storage.list_run_ids() == ["run_1"]
+    await storage.delete("run_1")
+    with pytest.raises(KeyError):
+        await storage.load("run_1")
+
+@pytest.mark.asyncio
+async def test_json_storage_shares_its_pool(tmp_path):
+    async with JSONStorage(storage_path=str(tmp_path)) as first, JSONStorage(storage_path=str(tmp_path)) as second:
+        assert first._pool is second._pool
+        await first.save_many({"run_1": {"a": 1}})
+        assert await second.load_many(["run_1"]) == {"run_1": {"a": 1}}
+    with pytest.raises(RuntimeError):
+        await first.load_many(["run_1"])
+    assert await JSONStorage(storage_path=str(tmp_path)).load_many(["run_1"]) == {"run_1": {"a": 1}}
+
+@pytest.mark.asyncio
+async def test_lmdb_shared_environment(tmp_path):
+    import asyncio
+
+    # A tiny map forces the writer to grow it while the group commits run
+    storage = LMDBStorage(db_path=str(tmp_path), map_size=64 * 1024)
+    other = LMDBStorage(db_path=str(tmp_path))
+    assert other.env is storage.env
+
+    await asyncio.gather(*[storage.save(f"run_{ix}", {"ix": ix, "payload": "x" * 2000}) for ix in range(200)])
+    assert storage.env.info()["map_size"] > 64 * 1024
+    assert (await other.load("run_199"))["ix"] == 199
+    assert len(await other.list_run_ids()) == 200
+
+    for seq in range(3):
+        await storage.append_delta("run_0", {"seq": seq})
+    assert [delta["seq"] for delta in await other.load_deltas("run_0")] == [0, 1, 2]
+    await storage.delete("run_0")
+    assert await other.load_deltas("run_0") == []
+    with pytest.raises(KeyError):
+        await other.load("run_0")
+
+@pytest.mark.asyncio
+async def test_lmdb_reads_during_grow_and_compact(tmp_path):
+    import asyncio
+
+    storage = LMDBStorage(db_path=str(tmp_path), map_size=64 * 1024)
+    await storage.save("run_0", {"ix": 0})
+
+    # Reads keep running while the writer grows the map and compacts the file under them
+    async def read_loop():
+        for _ in range(50):
+            assert (await storage.load("run_0"))["ix"] == 0
+            await asyncio.sleep(0)
+
+    results = await asyncio.gather(
+        read_loop(),
+        read_loop(),
+        *[storage.save(f"run_{ix}", {"ix": ix, "payload": "x" * 2000}) for ix in range(1, 150)],
+        storage.delete_many([f"run_{ix}" for ix in range(1, 100)]),
+        storage.compact(),
+        read_loop(),
+    )
+    assert storage.env.info()["map_size"] > 64 * 1024
+    assert results[-2] >= 0
+    assert len(await storage.list_run_ids()) >= 51
+
+@pytest.mark.asyncio
+async def test_tiered_storage(sample_sub_query_response, tmp_path):
+    import asyncio
+
+    backend = JSONStorage(storage_path=str(tmp_path))
+    storage = TieredStorage(backend, max_entries=2, flush_interval=0.05, max_dirty=10)
+    graph = ToolDependencyGraph(storage=storage, incremental_checkpoints=True)
+    graph.build_dependency_structure(sample_sub_query_response)
+
+    await graph.save()
+    # Served from memory before the write-behind deadline
+    assert not os.path.exists(backend._get_file_path(graph.run_id))
+    loaded = await ToolDependencyGraph.load(graph.run_id, storage=storage)
+    assert loaded.dependency_map == graph.dependency_map
+
+    await asyncio.sleep(0.2)
+    assert (await backend.load(graph.run_id))["run_id"] == graph.run_id
+
+    # Deltas are written through after the pending snapshot
+    graph.results["0"] = {"value": 1}
+    await graph.save()
+    assert len(await backend.load_deltas(graph.run_id)) == 1
+    loaded = await ToolDependencyGraph.load(graph.run_id, storage=storage)
+    assert loaded.results["0"] == {"value": 1}
+
+    # Exceeding the dirty bound flushes synchronously, flush() writes the rest
+    for ix in range(11):
+        await storage.save(f"run_{ix}", {"ix": ix})
+    assert len(storage._dirty) == 0
+    await storage.save("run_last", {"ix": -1})
+    await storage.flush()
+    assert (await backend.load("run_last"))["ix"] == -1
+    assert len(storage._cache) == 2
+
+    await storage.delete("run_last")
+    with pytest.raises(KeyError):
+        await storage.load("run_last")
+
+@pytest.mark.parametrize("store_class", [FileBlobStore, LMDBBlobStore])
+@pytest.mark.asyncio
+async def test_blob_store(store_class, tmp_path):
+    store = store_class(str(tmp_path))
+    text = json.dumps({"plot": "é" * 10000})
+    reference = await store.put(text)
+    assert reference == await store.put(text)
+    assert await store.get(reference) == text
+
+    document = json.dumps([reference, "small"])
+    assert json.loads(await store.materialize(document)) == [text, "small"]
+    embedded = json.dumps({"content": f"Result: {reference}"})
+    assert json.loads(await store.materialize(embedded)) == {"content": f"Result: {text}"}
+    assert await store.materialize(f"Result: {reference}") == f"Result: {text}"
+    memory = [{"role": "tool", "content": reference}, {"role": "user", "content": "hi"}]
+    assert (await store.materialize_memory(memory))[0]["content"] == text
+    assert memory[0]["content"] == reference
+
+    await store.delete(reference)
+    with pytest.raises(KeyError):
+        await store.get(reference)
+
+@pytest.mark.parametrize("storage_class", [JSONStorage, LMDBStorage, SQLiteStorage])
+@pytest.mark.asyncio
+async def test_bulk_operations(sample_sub_query_response, storage_class, tmp_path):
+    if storage_class is JSONStorage:
+        storage = JSONStorage(storage_path=str(tmp_path), shard_depth=1)
+    elif storage_class is LMDBStorage:
+        storage = LMDBStorage(db_path=str(tmp_path))
+    else:
+        storage = SQLiteStorage(db_path=str(tmp_path / "runs.db"))
+
+    graphs = []
+    for _ in range(5):
+        graph = ToolDependencyGraph(storage=storage, incremental_checkpoints=True)
+        graph.build_dependency_structure(sample_sub_query_response)
+        graphs.append(graph)
+    await storage.save_many({graph.run_id: graph.to_dict() for graph in graphs})
+    graphs[0].results["0"] = {"value": 1}
+    graphs[0]._saved_state = graphs[0]._checkpoint_state()
+    graphs[0].results["0"] = {"value": 2}
+    await graphs[0].save()
+
+    run_ids = [graph.run_id for graph in graphs]
+    loaded = await ToolDependencyGraph.load_many(run_ids + ["missing"], storage=storage, trusted=True)
+    assert sorted(loaded) == sorted(run_ids)
+    assert loaded[run_ids[0]].results["0"] == {"value": 2}
+    assert loaded[run_ids[1]].dependency_map == graphs[1].dependency_map
+
+    scanned = [run_id async for run_id, _ in storage.scan(batch_size=2)]
+    assert sorted(scanned) == sorted(run_ids)
+
+    await storage.delete_many(run_ids[:3])
+    assert sorted(await storage.load_many(run_ids)) == sorted(run_ids[3:])
+    assert await storage.load_deltas(run_ids[0]) == []
+
+@pytest.mark.parametrize("storage_class", [JSONStorage, LMDBStorage, SQLiteStorage])
+@pytest.mark.asyncio
+async def test_retention_sweeper(storage_class, tmp_path):
+    import time
+
+    if storage_class is JSONStorage:
+        storage = JSONStorage(storage_path=str(tmp_path))
+    elif storage_class is LMDBStorage:
+        storage = LMDBStorage(db_path=str(tmp_path))
+    else:
+        storage = SQLiteStorage(db_path=str(tmp_path / "runs.db"))
+
+    day = 24 * 3600
+    now = time.time()
+    runs = {
+        "old_success": ("success", now - 2 * day),
+        "new_success": ("success", now - 60),
+        "old_human": ("human", now - 2 * day),
+        "older_human": ("human", now - 8 * day),
+        "old_failed": ("failed", now - 30 * day),
+    }
+    await storage.save_many({
+        run_id: {"graph_status": status, "updated_at": updated_at, "payload": "x" * 10000}
+        for run_id, (status, updated_at) in runs.items()
+    })
+    await storage.append_delta("old_success", {"seq": 1})
+    await storage.append_delta("old_success.journal", {"type": "plan"})
+
+    sweeper = RetentionSweeper(storage, ttls={"success": day, "human": 7 * day}, batch_size=1, pause=0)
+    report = await sweeper.sweep()
+
+    assert report["runs"] == 2
+    assert report["bytes"] > 0
+    assert sorted(await storage.list_run_ids()) == ["new_success", "old_failed", "old_human"]
+    assert await storage.load_deltas("old_success.journal") == []
+    assert (await storage.load("old_human"))["graph_status"] == "human"
+
+    sweeper.default_ttl = 7 * day
+    assert (await sweeper.sweep())["runs"] == 1
+    assert sweeper.totals["runs"] == 3
+
+@pytest.mark.parametrize("storage_class", [JSONStorage, LMDBStorage, SQLiteStorage])
+@pytest.mark.asyncio
+async def test_retention_sweeper_reads_status_from_deltas(storage_class, tmp_path):
+    import time
+
+    if storage_class is JSONStorage:
+        storage = JSONStorage(storage_path=str(tmp_path))
+    elif storage_class is LMDBStorage:
+        storage = LMDBStorage(db_path=str(tmp_path))
+    else:
+        storage = SQLiteStorage(db_path=str(tmp_path / "runs.db"))
+
+    day = 24 * 3600
+    now = time.time()
+    # Both snapshots are old and pending, the status changes since then are only in the deltas
+    await storage.save_many({
+        run_id: {"run_id": run_id, "graph_status": "pending", "updated_at": now - 2 * day, "checkpoint_seq": 1}
+        for run_id in ("finished", "running")
+    })
+    await storage.append_delta("finished", {"seq": 2, "graph_status": "success", "updated_at": now - 2 * day + 60})
+    await storage.append_delta("running", {"seq": 2, "graph_status": "pending", "updated_at": now - 60})
+
+    sweeper = RetentionSweeper(storage, ttls={"success": day, "pending": 7 * day}, batch_size=1, pause=0)
+    assert (await sweeper.sweep())["runs"] == 1
+    assert await storage.list_run_ids() == ["running"]
+
+    sweeper.ttls = {"pending": day}
+    assert (await sweeper.sweep())["runs"] == 0
+
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main([__file__])
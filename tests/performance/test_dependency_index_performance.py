@@ -0,0 +1,50 @@
+# tests/performance/test_dependency_index_performance.py
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import time
+import pytest
+from tool4ai.core.graph.dependency_index import DependencyIndex
+from tool4ai.core.graph.tool_dependency_graph import ToolDependencyGraph
+from tool4ai.core.models import SubQueryResponse, SubQuery
+
+SHAPES = {
+    "independent": lambda size: {},
+    "layered": lambda size: {i: {i - 100} for i in range(100, size)},
+    "chain": lambda size: {i: {i - 1} for i in range(1, size)},
+}
+
+def best_of(fn, runs: int = 5) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+# Complexity check, not a wall-clock budget: building is O(V + E), so 10x the nodes costs about
+# 10x the time on any machine. A quadratic build would be about 100x
+@pytest.mark.parametrize("shape", list(SHAPES))
+def test_build_is_linear(shape):
+    small, large = SHAPES[shape](2000), SHAPES[shape](20000)
+    ratio = best_of(lambda: DependencyIndex(range(20000), large)) / best_of(lambda: DependencyIndex(range(2000), small))
+    assert ratio < 30
+
+def test_execution_order_is_cached_until_a_change():
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=i, sub_query=f"Query {i}", task=f"Task {i}", tool="tool1", dependent_on=i - 100 if i >= 100 else -1)
+        for i in range(10000)
+    ]))
+    index = graph._dependency_index()
+    assert len(graph.get_execution_order()) == 100
+    assert graph._dependency_index() is index
+
+    graph.sub_queries.set_fields(5, tool=None)
+    assert graph._dependency_index() is not index
+
+if __name__ == "__main__":
+    pytest.main([__file__])
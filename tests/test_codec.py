@@ -0,0 +1,42 @@
+# tests/test_codec.py
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+import pytest
+from tool4ai.utils.codec import JSONCodec, get_codec, decode
+from tool4ai.core.graph.tool_dependency_graph import ToolDependencyGraph
+from tool4ai.core.models import SubQueryResponse, SubQuery
+
+def test_json_codec_round_trip():
+    codec = get_codec()
+    assert isinstance(codec, JSONCodec)
+    data = {1: [1, 2], "text": "é", "big": 2 ** 70, "nested": {"none": None}}
+    encoded = codec.dumps(data)
+    assert b" " not in encoded
+    assert decode(encoded) == {"1": [1, 2], "text": "é", "big": 2 ** 70, "nested": {"none": None}}
+    assert decode(memoryview(encoded)) == decode(encoded)
+
+def test_msgpack_codec_round_trip():
+    pytest.importorskip("msgpack")
+    codec = get_codec("msgpack")
+    data = {"sub_queries": {0: {"task": "Task 1"}}, "results": []}
+    assert decode(codec.dumps(data)) == data
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+def test_trusted_from_dict():
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="tool1"),
+        SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="tool2", dependent_on=0),
+    ]))
+    data = decode(get_codec().dumps(graph.to_dict()))
+
+    trusted = ToolDependencyGraph.from_dict(data, trusted=True)
+    validated = ToolDependencyGraph.from_dict(data)
+    assert trusted.sub_queries == validated.sub_queries
+    assert trusted.dependency_map == graph.dependency_map
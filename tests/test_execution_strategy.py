@@ -0,0 +1,282 @@
+# tests/test_execution_strategy.py
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+import json
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from tool4ai.core.graph.tool_dependency_graph import ToolDependencyGraph
+from tool4ai.core.graph.execution_strategy import DefaultExecutionStrategy
+from tool4ai.core.graph.sub_query_registry import SubQueryRegistry
+from tool4ai.core.models import SubQueryResponse, SubQuery
+from tool4ai.storages import FileBlobStore
+from tool4ai.utils.messages import strip_tags, tag_messages
+
+
+@pytest.fixture
+def executed_graph():
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="tool1"),
+        SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="tool2"),
+        SubQuery(index=2, sub_query="Query 3", task="Task 3", tool="tool3", dependent_on=0, dependency_attr="movies"),
+    ]))
+    for index in (0, 1):
+        sq = graph.sub_queries.set_fields(index, status="success")
+        result = {"status": "success", "return": {"movies": ["Dune"], "details": "x" * 100}}
+        sq.result = json.dumps([json.dumps(result)])
+        sq.internal_memory = tag_messages(
+            [{"role": "user", "content": sq.task}, {"role": "tool", "content": json.dumps(result, indent=4)}], graph.run_id
+        )
+    return graph
+
+
+def test_full_context_scope(executed_graph):
+    history = [{"role": "user", "content": "hello"}]
+    memory = history + executed_graph.sub_queries[0].internal_memory + executed_graph.sub_queries[1].internal_memory
+    strategy = DefaultExecutionStrategy()
+    assert strategy._build_sub_query_memory(executed_graph, 2, {"memory": memory}) == memory
+
+
+def test_ancestors_context_scope(executed_graph):
+    history = [{"role": "user", "content": f"message {i}"} for i in range(5)]
+    memory = history + executed_graph.sub_queries[0].internal_memory + executed_graph.sub_queries[1].internal_memory
+    strategy = DefaultExecutionStrategy(context_scope="ancestors", max_history=2)
+    scoped = strategy._build_sub_query_memory(executed_graph, 2, {"memory": memory})
+
+    assert scoped[:2] == history[-2:]
+    assert len(scoped) == 3
+    assert '{"movies":["Dune"]}' in scoped[2]["content"]
+    assert "details" not in scoped[2]["content"]
+
+
+def test_ancestors_context_scope_with_rebuilt_memory(executed_graph):
+    history = [{"role": "user", "content": f"message {i}"} for i in range(3)]
+    memory = history + executed_graph.sub_queries[0].internal_memory + executed_graph.sub_queries[1].internal_memory
+    # Deserialized, then rebuilt the way compaction does: graph entries are recognized by their tag
+    memory = [{**entry} for entry in json.loads(json.dumps(memory))]
+    strategy = DefaultExecutionStrategy(context_scope="ancestors")
+    scoped = strategy._build_sub_query_memory(executed_graph, 2, {"memory": memory})
+
+    assert scoped[:3] == history
+    assert len(scoped) == 4
+    assert all("tool4ai_run_id" not in entry for entry in strip_tags(memory))
+
+
+def test_invalid_context_scope():
+    with pytest.raises(ValueError):
+        DefaultExecutionStrategy(context_scope="siblings")
+
+
+@pytest.mark.asyncio
+async def test_invalid_arguments_are_retried_once(make_toolkit, tool_maker, tool_message):
+    calls = []
+    async def search(arguments):
+        calls.append(arguments)
+        return {"status": "success", "return": {"movies": ["Dune"]}}
+
+    toolkit = make_toolkit(
+        {"search": search},
+        {"search": {"type": "object", "properties": {"year": {"type": "integer"}}, "required": ["year"]}},
+    )
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="search"),
+    ]))
+
+    tool_maker.make_tools.side_effect = [
+        tool_message("search", '{"year": "next year"}'), tool_message("search", '{"year": "2021"}')
+    ]
+
+    result = await graph.execute(toolkit, {}, tool_maker)
+
+    assert result.status == "success"
+    assert calls == [{"year": 2021}]
+    retry_memory = tool_maker.make_tools.call_args_list[1].args[2]
+    assert "arguments.year" in retry_memory[-1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_large_results_go_to_blob_store(tmp_path, make_toolkit, tool_maker):
+    big = {"status": "success", "return": {"movies": ["Dune"], "plot": "x" * 5000}}
+    async def search(arguments):
+        return json.dumps(big)
+    async def recommend(arguments):
+        return {"status": "success", "return": {"movie": "Arrival"}}
+
+    toolkit = make_toolkit({"search": search, "recommend": recommend})
+    blob_store = FileBlobStore(storage_path=str(tmp_path))
+    graph = ToolDependencyGraph(execution_strategy=DefaultExecutionStrategy(
+        context_scope="ancestors", blob_store=blob_store, blob_threshold=1000,
+    ))
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="search"),
+        SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="recommend", dependent_on=0, dependency_attr="movies"),
+    ]))
+
+    result = await graph.execute(toolkit, {}, tool_maker)
+
+    assert result.status == "success"
+    search_sq = graph.sub_queries[0]
+    # Stored once, only references are kept and checkpointed
+    assert len(search_sq.result) < 100
+    assert len(json.dumps(graph.to_dict())) < 2000
+    assert json.loads(await blob_store.materialize(search_sq.result)) == [json.dumps(big)]
+    # The dependent prompt gets the materialized result, projected to dependency_attr
+    prompt = tool_maker.make_tools.call_args_list[1].args[2]
+    assert '{"movies":["Dune"]}' in prompt[0]["content"]
+
+
+def test_fan_in_projects_each_parent(executed_graph):
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        executed_graph.sub_queries[0],
+        executed_graph.sub_queries[1],
+        SubQuery(index=2, sub_query="Query 3", task="Task 3", tool="tool3", dependencies=[
+            {"index": 0, "attr": "movies"},
+            {"index": 1, "attr": "details"},
+        ]),
+    ]))
+    # Both parents run in parallel before the fan-in node
+    assert graph.get_execution_order() == [[0, 1], [2]]
+
+    strategy = DefaultExecutionStrategy(context_scope="ancestors")
+    scoped = strategy._build_sub_query_memory(graph, 2, {"memory": []})
+    assert '{"movies":["Dune"]}' in scoped[0]["content"]
+    assert "Dune" not in scoped[1]["content"] and "xxx" in scoped[1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_map_sub_query(make_toolkit, tool_maker, tool_message):
+    running, peak, seen = 0, 0, []
+    async def search(arguments):
+        return {"status": "success", "return": {"movies": ["Dune", "Alien", "Arrival", "Solaris", "Stalker"]}}
+    async def recommend(arguments):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        seen.append(arguments)
+        if arguments["movie_title"] == "Alien":
+            return {"status": "failed", "issue": "unknown movie"}
+        return {"status": "success", "return": {"similar": arguments["movie_title"] + " 2"}}
+
+    schema = {"type": "object", "properties": {"movie_title": {"type": "string"}, "count": {"type": "integer"}}}
+    toolkit = make_toolkit({"search": search, "recommend": recommend}, {"recommend": schema})
+    graph = ToolDependencyGraph(execution_strategy=DefaultExecutionStrategy(map_concurrency=2))
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="search"),
+        SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="recommend", node_type="map",
+                 dependent_on=0, dependency_attr="movies", map_argument="movie_title"),
+    ]))
+
+    tool_maker.make_tools.side_effect = [tool_message("search"), tool_message("recommend", {"movie_title": "Dune", "count": 3})]
+    await graph.execute(toolkit, {}, tool_maker)
+
+    # One model call for the whole map, each item is bound locally
+    assert tool_maker.make_tools.call_count == 2
+    assert sorted(arguments["movie_title"] for arguments in seen) == ["Alien", "Arrival", "Dune", "Solaris", "Stalker"]
+    assert all(arguments["count"] == 3 for arguments in seen)
+    assert peak == 2
+    map_sq = graph.sub_queries[1]
+    assert map_sq.status == "partial"
+    assert [result.get("return", {}).get("similar") for result in json.loads(map_sq.result)] == [
+        "Dune 2", None, "Arrival 2", "Solaris 2", "Stalker 2"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_streaming_tool_feeds_map_sub_query(make_toolkit, tool_maker, tool_message):
+    TITLES = ["Dune", "Alien", "Arrival", "Solaris", "Stalker", "Heat", "Brazil", "Gattaca", "Memento", "Ran"]
+    events, produced, consumed, ahead = [], 0, 0, 0
+    async def search(arguments):
+        nonlocal produced, ahead
+        for title in TITLES:
+            produced += 1
+            ahead = max(ahead, produced - consumed)
+            events.append(("produced", title))
+            yield title
+            await asyncio.sleep(0.001)
+        events.append(("search done", None))
+    async def recommend(arguments):
+        nonlocal consumed
+        events.append(("recommend", arguments["movie_title"]))
+        await asyncio.sleep(0.01)
+        consumed += 1
+        return {"status": "success", "return": {"similar": arguments["movie_title"] + " 2"}}
+
+    schema = {"type": "object", "properties": {"movie_title": {"type": "string"}}}
+    toolkit = make_toolkit({"search": search, "recommend": recommend}, {"recommend": schema})
+    graph = ToolDependencyGraph(execution_strategy=DefaultExecutionStrategy(map_concurrency=1, stream_buffer=2))
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="search"),
+        SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="recommend", node_type="map",
+                 dependent_on=0, dependency_attr="movies", map_argument="movie_title"),
+    ]))
+
+    tool_maker.make_tools.side_effect = [tool_message("search"), tool_message("recommend", {"movie_title": "Dune"})]
+    result = await graph.execute(toolkit, {}, tool_maker)
+
+    assert result.status == "success"
+    # The map started before the search finished, and the search never ran far ahead of it
+    assert events.index(("recommend", "Dune")) < events.index(("search done", None))
+    # Buffer of 2, plus the call running, the item waiting for a call slot and the item being produced
+    assert ahead <= 5
+    assert json.loads(graph.sub_queries[0].result)[0]["return"] == TITLES
+    assert [result["return"]["similar"] for result in json.loads(graph.sub_queries[1].result)] == [
+        title + " 2" for title in TITLES
+    ]
+    assert not graph.execution_strategy._eager and not graph.execution_strategy._streams
+
+
+@pytest.mark.asyncio
+async def test_registry_shares_results_between_graphs(make_toolkit, tool_message):
+    calls = []
+    async def weather(arguments):
+        calls.append(arguments)
+        await asyncio.sleep(0.01)
+        return {"status": "success", "return": {"forecast": "sunny"}}
+
+    toolkit = make_toolkit({"weather": weather}, {"weather": {"type": "object", "properties": {"city": {"type": "string"}}}})
+    registry = SubQueryRegistry()
+
+    def make_graph(task):
+        graph = ToolDependencyGraph(execution_strategy=DefaultExecutionStrategy(registry=registry))
+        graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+            SubQuery(index=0, sub_query="Query", task=task, tool="weather"),
+        ]))
+        tool_maker = AsyncMock()
+        tool_maker.make_tools.return_value = tool_message("weather", {"city": "Paris"})
+        return graph, tool_maker
+
+    (first, first_maker), (second, second_maker) = make_graph("Weather in Paris?"), make_graph("weather in paris")
+    await asyncio.gather(first.execute(toolkit, {}, first_maker), second.execute(toolkit, {}, second_maker))
+
+    # The second graph waited for the first one's in-flight result
+    assert len(calls) == 1
+    assert first_maker.make_tools.call_count + second_maker.make_tools.call_count == 1
+    assert second.sub_queries[0].status == "success"
+    assert second.sub_queries[0].result == first.sub_queries[0].result
+    assert registry.hits == 1
+
+
+def test_argument_validators_are_bounded_and_follow_schema_changes():
+    strategy = DefaultExecutionStrategy()
+    strategy.MAX_VALIDATORS = 2
+    tools_info = {
+        f"id{i}": {"id": f"id{i}", "name": f"tool{i}", "schema": {"type": "object", "properties": {"n": {"type": "integer"}}}}
+        for i in range(3)
+    }
+    validator = strategy._get_argument_validator(tools_info, "tool0")
+    # Rebuilt dicts with the same schema reuse the compiled validator
+    assert strategy._get_argument_validator(json.loads(json.dumps(tools_info)), "tool0") is validator
+    for name in ("tool1", "tool2"):
+        strategy._get_argument_validator(tools_info, name)
+    assert list(strategy._validators) == ["id1", "id2"]
+
+    tools_info["id2"]["schema"] = {"type": "object", "properties": {"n": {"type": "string"}}}
+    assert strategy._get_argument_validator(tools_info, "tool2")({"n": "x"}) == {"n": "x"}
@@ -0,0 +1,67 @@
+# tests/test_memory_manager.py
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+import pytest
+from tool4ai.core.graph.memory_manager import MemoryManager
+
+
+def make_memory(turns):
+    memory = []
+    for i in range(turns):
+        memory.append({"role": "user", "content": f"Task {i}"})
+        memory.append({"role": "assistant", "content": None, "tool_calls": [{"id": str(i), "function": {"name": "tool", "arguments": "{}"}}]})
+        memory.append({"role": "tool", "tool_call_id": str(i), "name": "tool", "content": "x" * 4000})
+    return memory
+
+
+def test_estimate_tokens_follows_edits():
+    manager = MemoryManager()
+    message = {"role": "user", "content": "x" * 400}
+    assert manager.estimate_tokens(message) == 104
+    message["content"] = ""
+    assert manager.estimate_tokens(message) == 4
+
+
+def test_compact_under_budget_is_noop():
+    manager = MemoryManager(max_tokens=100000)
+    memory = make_memory(3)
+    snapshot = list(memory)
+    manager.compact(memory)
+    assert memory == snapshot
+
+
+def test_compact_drops_tool_payloads_first():
+    manager = MemoryManager(max_tokens=2500, keep_recent=3)
+    memory = make_memory(3)
+    manager.compact(memory)
+
+    assert len(memory) == 9
+    assert memory[2]["content"].startswith("[tool result omitted")
+    assert memory[-1]["content"] == "x" * 4000
+    assert manager.count_tokens(memory) <= 2500
+
+
+def test_compact_drops_oldest_turns_without_orphan_tool_messages():
+    manager = MemoryManager(max_tokens=1040, keep_recent=3)
+    memory = make_memory(3)
+    manager.compact(memory)
+
+    assert memory[0]["role"] != "tool"
+    assert memory[-1]["content"] == "x" * 4000
+    assert manager.count_tokens(memory) <= 1040
+
+
+@pytest.mark.asyncio
+async def test_compact_summarizes_dropped_turns(tool_maker):
+    tool_maker.completion.return_value = ({"content": "User ran three tasks."}, {"total_tokens": 5})
+    manager = MemoryManager(max_tokens=1040, keep_recent=3, summarize=True)
+    memory = make_memory(3)
+    manager.compact(memory, tool_maker)
+    await manager.wait_for_summary(memory)
+
+    assert memory[0]["role"] == "system"
+    assert "User ran three tasks." in memory[0]["content"]
+    assert manager.token_usage["total_tokens"] == 5
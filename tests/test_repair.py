@@ -0,0 +1,58 @@
+# tests/test_repair.py
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+import pytest
+from tool4ai.utils.repair import repair_json, repair_sub_queries, JSONRepairError
+from tool4ai.core.models import SubQuery
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"list_name": "Sci-Fi",}', {"list_name": "Sci-Fi"}),
+    ('```json\n{"movies": ["Dune", "Alien"', {"movies": ["Dune", "Alien"]}),
+    ('{"list_name": "Sci-F', {"list_name": "Sci-F"}),
+    ('Here you go: {"year": 2021, "all": True}', {"year": 2021, "all": True}),
+    ('{"year": 2021, "genre":', {"year": 2021}),
+    ('{"year": 2021} and more text', {"year": 2021}),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+def test_repair_json_failure():
+    with pytest.raises(JSONRepairError):
+        repair_json("no json here")
+
+def test_repair_sub_queries():
+    sub_queries = [
+        SubQuery(index=0, sub_query="Q0", task="T0", tool="tool", dependent_on=0),
+        SubQuery(index=1, sub_query="Q1", task="T1", tool="tool", dependent_on=7, dependency_attr="x"),
+        SubQuery(index=2, sub_query="Q2", task="T2", tool="tool", dependent_on=3),
+        SubQuery(index=3, sub_query="Q3", task="T3", tool="tool", dependent_on=2),
+    ]
+    fixes = repair_sub_queries(sub_queries)
+
+    assert len(fixes) == 3
+    assert [sq.dependent_on for sq in sub_queries] == [-1, -1, -1, 2]
+    assert sub_queries[1].dependency_attr == ""
+
+def test_repair_sub_queries_duplicated_indices():
+    with pytest.raises(ValueError):
+        repair_sub_queries([
+            SubQuery(index=0, sub_query="Q0", task="T0"),
+            SubQuery(index=0, sub_query="Q1", task="T1"),
+        ])
+
+def test_repair_multi_parent_sub_queries():
+    sub_queries = [
+        SubQuery(index=0, sub_query="Q0", task="T0", tool="tool"),
+        SubQuery(index=1, sub_query="Q1", task="T1", tool="tool", dependencies=[{"index": 0, "attr": "a"}, {"index": 9, "attr": "b"}]),
+        SubQuery(index=2, sub_query="Q2", task="T2", tool="tool", dependencies=[{"index": 1, "attr": "c"}, {"index": 3, "attr": "d"}]),
+        SubQuery(index=3, sub_query="Q3", task="T3", tool="tool", dependencies=[{"index": 0, "attr": "e"}, {"index": 2, "attr": "f"}]),
+    ]
+    fixes = repair_sub_queries(sub_queries)
+
+    assert len(fixes) == 2
+    assert [[d.index for d in sq.get_dependencies()] for sq in sub_queries] == [[], [0], [1], [0, 2]]
+    # The scalar fields follow the first remaining dependency
+    assert (sub_queries[1].dependent_on, sub_queries[1].dependency_attr) == (0, "a")
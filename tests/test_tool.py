@@ -39,4 +39,34 @@ def test_tool_from_json_schema():
     assert tool.name == "test_tool"
     assert tool.description == "A test tool"
     assert tool.id == "123"
-    assert "properties" in tool.schema
\ No newline at end of file
+    assert "properties" in tool.schema
+
+def test_tool_validate_arguments():
+    from tool4ai.utils.schema_validator import SchemaValidationError
+    tool = Tool(
+        name="search_movies",
+        schema={
+            "type": "object",
+            "properties": {
+                "genre": {"type": "string", "enum": ["sci-fi", "horror"]},
+                "year": {"type": "integer"},
+                "movies": {"type": "array", "items": {"type": "string"}},
+            },
+            "required": ["genre", "year"],
+            "additionalProperties": False,
+        },
+        description="Search movies"
+    )
+    assert tool.validate_arguments({"genre": "sci-fi", "year": " 2021", "movies": ["Dune"]}) == {
+        "genre": "sci-fi", "year": 2021, "movies": ["Dune"]
+    }
+    assert tool.validator is tool.validator
+
+    with pytest.raises(SchemaValidationError) as e:
+        tool.validate_arguments({"genre": "comedy", "year": "soon", "extra": 1})
+    assert len(e.value.errors) == 3
+
+    # Only numeric strings are coerced: no wrapping in a list, no rounding, no digit separators
+    for year, movies in (("2021", "Dune"), (2021.0, ["Dune"]), ("2_021", ["Dune"]), ("2021.5", ["Dune"])):
+        with pytest.raises(SchemaValidationError):
+            tool.validate_arguments({"genre": "sci-fi", "year": year, "movies": movies})
@@ -6,10 +6,16 @@ __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file
 
 # tests/test_tool_dependency_graph.py
 
+import copy
+import json
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from tool4ai.core.graph.tool_dependency_graph import ToolDependencyGraph
-from tool4ai.core.models import SubQueryResponse, SubQuery, ExecutionResult, ExecutionStatus
+from tool4ai.core.graph.execution_strategy import DefaultExecutionStrategy
+from tool4ai.core.models import SubQueryResponse, SubQuery, ExecutionResult, ExecutionStatus, EventType
+from tool4ai.storages import JSONStorage, ExecutionJournal
+
 
 @pytest.fixture
 def sample_sub_query_response():
@@ -18,6 +24,7 @@ def sample_sub_query_response():
         SubQuery(index=1, sub_query="Query 2", task="Task 2", tool="tool2", dependent_on=0),
     ])
 
+
 def test_build_dependency_structure(sample_sub_query_response):
     graph = ToolDependencyGraph()
     graph.build_dependency_structure(sample_sub_query_response)
@@ -27,6 +34,7 @@ def test_build_dependency_structure(sample_sub_query_response):
     assert 0 in graph.dependency_map[1]
     assert 0 in graph.reverse_dependency_map
 
+
 def test_get_execution_order(sample_sub_query_response):
     graph = ToolDependencyGraph()
     graph.build_dependency_structure(sample_sub_query_response)
@@ -36,6 +44,7 @@ def test_get_execution_order(sample_sub_query_response):
     assert execution_order[0] == [0]
     assert execution_order[1] == [1]
 
+
 @pytest.mark.asyncio
 async def test_execute(sample_sub_query_response):
     graph = ToolDependencyGraph()
@@ -57,6 +66,7 @@ async def test_execute(sample_sub_query_response):
     assert isinstance(result, ExecutionResult)
     # assert result.status == ExecutionStatus.SUCCESS
 
+
 @pytest.mark.asyncio
 async def test_save_and_load(sample_sub_query_response):
     graph = ToolDependencyGraph()
@@ -70,6 +80,7 @@ async def test_save_and_load(sample_sub_query_response):
     assert len(loaded_graph.sub_queries) == len(graph.sub_queries)
     assert loaded_graph.dependency_map == graph.dependency_map
 
+
 def test_update_token_usage():
     graph = ToolDependencyGraph()
     usage = {"prompt_tokens": 10, "completion_tokens": 20, "total_tokens": 30}
@@ -78,4 +89,254 @@ def test_update_token_usage():
     total_usage = graph.get_token_usage()
     assert total_usage["prompt_tokens"] == 10
     assert total_usage["completion_tokens"] == 20
-    assert total_usage["total_tokens"] == 30
\ No newline at end of file
+    assert total_usage["total_tokens"] == 30
+
+
+@pytest.mark.asyncio
+async def test_incremental_checkpoints(sample_sub_query_response, tmp_path):
+    storage = JSONStorage(storage_path=str(tmp_path))
+
+    graph = ToolDependencyGraph(storage=storage, incremental_checkpoints=True, compact_every=2)
+    graph.build_dependency_structure(sample_sub_query_response)
+    await graph.save()
+    assert await storage.load_deltas(graph.run_id) == []
+
+    graph.sub_queries.set_fields(0, status="success")
+    graph.level_status[0] = "success"
+    # Only the changed sub-query is serialized
+    with patch.object(graph.sub_queries, "dump", wraps=graph.sub_queries.dump) as dump:
+        await graph.save()
+    assert dump.call_count == 1
+    deltas = await storage.load_deltas(graph.run_id)
+    assert len(deltas) == 1
+    assert list(deltas[0]["sub_queries"]) == ["0"]
+
+    graph.sub_queries.set_fields(1, status="human")
+    await graph.save()
+    loaded_graph = await ToolDependencyGraph.load(graph.run_id, storage=storage)
+    assert loaded_graph.sub_queries[0].status == "success"
+    assert loaded_graph.sub_queries[1].status == "human"
+    assert loaded_graph.dependency_map == graph.dependency_map
+
+    # Compaction folds the deltas into a new snapshot
+    await graph.save()
+    assert await storage.load_deltas(graph.run_id) == []
+    loaded_graph = await ToolDependencyGraph.load(graph.run_id, storage=storage)
+    assert loaded_graph.sub_queries[1].status == "human"
+    await graph.delete()
+
+
+@pytest.mark.asyncio
+async def test_recover_from_journal(sample_sub_query_response, tmp_path, make_toolkit, tool_maker):
+    storage = JSONStorage(storage_path=str(tmp_path))
+    journal = ExecutionJournal(storage)
+
+    tool1 = AsyncMock(return_value={"status": "success", "return": {}})
+    tool2 = AsyncMock(side_effect=asyncio.CancelledError())
+    toolkit = make_toolkit({"tool1": tool1, "tool2": tool2})
+
+    graph = ToolDependencyGraph(storage=storage, execution_strategy=DefaultExecutionStrategy(journal=journal))
+    graph.build_dependency_structure(sample_sub_query_response)
+    with pytest.raises(asyncio.CancelledError):
+        await graph.execute(toolkit, {}, tool_maker)
+
+    recovered = await ToolDependencyGraph.recover(graph.run_id, journal, storage=storage)
+    assert recovered.sub_queries[0].status == "success"
+    assert recovered.sub_queries[1].status == "pending"
+
+    tool2.side_effect = None
+    tool2.return_value = {"status": "success", "return": {}}
+    result = await recovered.execute(toolkit, {}, tool_maker)
+    assert result.status == "success"
+    assert tool1.call_count == 1
+    assert tool2.call_count == 2
+    await journal.clear(graph.run_id)
+
+
+@pytest.mark.asyncio
+async def test_hibernate_and_rehydrate(sample_sub_query_response, tmp_path, make_toolkit, tool_maker, tool_message):
+    storage = JSONStorage(storage_path=str(tmp_path))
+    tool1 = AsyncMock(return_value={"status": "success", "return": {"movies": ["Dune"]}})
+    tool2 = AsyncMock(return_value={"status": "human", "help": "Which list?", "return": {}})
+    toolkit = make_toolkit({"tool1": tool1, "tool2": tool2})
+
+    async def make_tools(task, tools_info, memory):
+        # A resumed sub-query is offered every tool
+        return tool_message(next(iter(tools_info.values()))["name"] if len(tools_info) == 1 else "tool2")
+    tool_maker.make_tools.side_effect = make_tools
+
+    strategy = DefaultExecutionStrategy(context_scope="ancestors")
+    graph = ToolDependencyGraph(storage=storage, execution_strategy=strategy)
+    graph.build_dependency_structure(sample_sub_query_response)
+    result = await graph.execute(toolkit, {"memory": [{"role": "user", "content": "hello"}]}, tool_maker)
+    assert result.status == "human"
+
+    await graph.hibernate(result)
+    assert strategy.last_context is None
+    assert graph.sub_queries == {}
+
+    rehydrated, last_result = await ToolDependencyGraph.rehydrate(graph.run_id, storage=storage)
+    assert last_result.pasued_level == 1
+    assert last_result.sub_query_need_attention is rehydrated.sub_queries[1]
+    assert last_result.memory is rehydrated.execution_strategy.last_context["memory"]
+    assert rehydrated.execution_strategy.help == ["Tool tool2, Help 0: Which list?"]
+
+    tool2.return_value = {"status": "success", "return": {}}
+    resumed = await rehydrated.resume_execution(
+        "My watchlist", toolkit, rehydrated.execution_strategy.last_context, tool_maker,
+        classify_for_new_discussion=False, last_result=last_result,
+    )
+    assert resumed.status == "success"
+    assert tool1.call_count == 1
+    memory = tool_maker.make_tools.call_args_list[-1].args[2]
+    assert memory[-1] == {"role": "user", "content": "My watchlist"}
+
+
+def test_sub_query_columns():
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=i, sub_query=f"Query {i}", task=f"Task {i}", tool="tool1" if i % 3 else None)
+        for i in range(1000)
+    ]))
+    assert graph.status_counts() == {"pending": 1000}
+    assert len(graph.non_actionable_sub_queries) == 334
+
+    # Changes made through the store update the status columns
+    sub_query = graph.sub_queries.set_fields(1, status="success")
+    assert type(sub_query) is SubQuery
+    assert graph.get_sub_queries_by_status("success") == [1]
+    assert graph.status_counts() == {"pending": 999, "success": 1}
+
+    # A loaded graph keeps its sub-queries as rows until they are accessed
+    loaded = ToolDependencyGraph.from_dict(graph.to_dict())
+    assert loaded.status_counts() == graph.status_counts()
+    assert loaded.get_execution_order() == graph.get_execution_order()
+    assert len(loaded.sub_queries._objects) == 0
+    assert loaded.sub_queries[1] == sub_query
+    assert len(loaded.sub_queries._objects) == 1
+    assert loaded.to_dict()["sub_queries"] == graph.to_dict()["sub_queries"]
+
+    del loaded.sub_queries[1]
+    assert loaded.get_sub_queries_by_status("success") == []
+    assert len(loaded.sub_queries) == 999
+
+    # Sub-queries keep their class, copies included
+    plain = SubQuery(index=2, sub_query="Query 2", task="Task 2", tool="tool1")
+    graph.sub_queries[2] = plain
+    assert graph.sub_queries[2] is plain
+    assert type(copy.deepcopy(graph.sub_queries[1])) is SubQuery
+    graph.sub_queries.set_fields(2, status="failed")
+    assert graph.get_sub_queries_by_status("failed") == [2]
+    version = graph.sub_queries.version
+    graph.sub_queries.set_fields(2, dependent_on=1)
+    assert graph.sub_queries.version == version + 1
+
+
+def test_execution_order_cache_and_issues():
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 0", task="Task 0", tool="tool1"),
+        SubQuery(index=1, sub_query="Query 1", task="Task 1", tool="tool1"),
+        SubQuery(index=2, sub_query="Query 2", task="Task 2", tool="tool2", dependent_on=0),
+        SubQuery(index=3, sub_query="Query 3", task="Task 3", tool="tool2", dependent_on=9),
+        SubQuery(index=4, sub_query="Query 4", task="Task 4", tool="tool2", dependent_on=3),
+        SubQuery(index=5, sub_query="Query 5", task="Task 5"),
+    ]))
+    assert graph.get_execution_order() == [[0, 1], [2]]
+    assert graph.get_execution_order(add_non_actionable=True) == [[0, 1], [2], [5]]
+    assert graph.dependency_issues() == {"dangling": {3: [9]}, "cycles": []}
+    assert graph.get_execution_order() is not graph.get_execution_order()
+
+    # Changes to the sub-queries and to the maps invalidate the cached order
+    graph.sub_queries.set_fields(1, tool=None)
+    assert graph.get_execution_order() == [[0], [2]]
+    graph.dependency_map = {**graph.dependency_map, 0: {2}}
+    assert graph.get_execution_order() == []
+    assert graph.dependency_issues()["cycles"] == [0, 2]
+
+
+def test_merge_duplicate_sub_queries():
+    graph = ToolDependencyGraph(merge_duplicates=True)
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Find the weather in Paris.", tool="weather"),
+        SubQuery(index=1, sub_query="Query 2", task="find the  weather in paris", tool="weather"),
+        SubQuery(index=2, sub_query="Query 3", task="Pack for it", tool="packing", dependent_on=0, dependency_attr="forecast"),
+        SubQuery(index=3, sub_query="Query 4", task="Pack for it", tool="packing", dependent_on=1, dependency_attr="forecast"),
+        SubQuery(index=4, sub_query="Query 5", task="Book a taxi", tool="taxi", dependent_on=3),
+        SubQuery(index=5, sub_query="Query 6", task="Find the weather in Rome", tool="weather"),
+    ]))
+
+    # 3 only became a duplicate of 2 once 1 was merged into 0
+    assert graph.merged_sub_queries == {1: 0, 3: 2}
+    assert sorted(graph.sub_queries) == [0, 2, 4, 5]
+    assert graph.sub_queries[4].dependent_on == 2
+    assert graph.dependency_map == {2: {0}, 4: {2}}
+    assert graph.reverse_dependency_map == {0: {2}, 2: {4}}
+    assert graph.get_execution_order() == [[0, 5], [2], [4]]
+    assert ToolDependencyGraph.from_dict(graph.to_dict()).merged_sub_queries == {1: 0, 3: 2}
+
+
+@pytest.mark.asyncio
+async def test_execute_stream(sample_sub_query_response, make_toolkit, tool_maker):
+    async def tool(arguments):
+        return {"status": "success", "return": {"movies": ["Dune"]}}
+
+    toolkit = make_toolkit({"tool1": tool, "tool2": tool})
+    graph = ToolDependencyGraph()
+    graph.build_dependency_structure(sample_sub_query_response)
+
+    async def chat_stream(messages):
+        for text in ("Here ", "is ", "Dune"):
+            yield text, None
+        yield "", {"total_tokens": 5}
+    tool_maker.chat_stream = chat_stream
+
+    events = [event async for event in graph.execute_stream(toolkit, {"memory": []}, tool_maker, final_prompt="Answer")]
+
+    assert [(event.type, event.level, event.index) for event in events] == [
+        (EventType.NODE_STARTED, None, 0), (EventType.TOOL_CALL, None, 0), (EventType.NODE_FINISHED, None, 0),
+        (EventType.LEVEL_FINISHED, 0, None),
+        (EventType.NODE_STARTED, None, 1), (EventType.TOOL_CALL, None, 1), (EventType.NODE_FINISHED, None, 1),
+        (EventType.LEVEL_FINISHED, 1, None),
+        (EventType.FINAL_TOKEN, None, None), (EventType.FINAL_TOKEN, None, None), (EventType.FINAL_TOKEN, None, None),
+        (EventType.FINAL_RESPONSE, None, None), (EventType.RESULT, None, None),
+    ]
+    assert all(json.loads(event.to_json())["run_id"] == graph.run_id for event in events)
+    assert events[2].data["status"] == "success"
+    # The final response is streamed token by token, then kept whole in memory
+    assert [event.data["content"] for event in events[-5:-2]] == ["Here ", "is ", "Dune"]
+    assert events[-2].data == {"content": {"role": "assistant", "content": "Here is Dune"}}
+    assert events[-1].result.memory[-1]["content"]["content"] == "Here is Dune"
+    assert graph.token_usage["total_tokens"] == 7
+    tool_maker.chat.assert_not_called()
+    assert events[-1].result.status == "success" and "result" not in json.loads(events[-1].to_json())
+    assert graph.run_id not in graph.execution_strategy._listeners
+
+
+@pytest.mark.asyncio
+async def test_journal_does_not_reuse_failed_results(tmp_path, make_toolkit, tool_maker):
+    storage = JSONStorage(storage_path=str(tmp_path))
+    journal = ExecutionJournal(storage)
+    tool1 = AsyncMock(side_effect=[
+        {"status": "failed", "issue": "service down"},
+        {"status": "success", "return": {}},
+    ])
+    toolkit = make_toolkit({"tool1": tool1})
+
+    strategy = DefaultExecutionStrategy(journal=journal)
+    graph = ToolDependencyGraph(storage=storage, execution_strategy=strategy)
+    graph.build_dependency_structure(SubQueryResponse(sub_queries=[
+        SubQuery(index=0, sub_query="Query 1", task="Task 1", tool="tool1"),
+    ]))
+    result = await graph.execute(toolkit, {"memory": []}, tool_maker)
+    assert result.status == "failed"
+    assert graph.run_id not in strategy._completed_tool_calls
+
+    # Same arguments on resume, the tool is called again instead of replaying the failure
+    result = await graph.resume_execution(
+        "try again", toolkit, {"memory": []}, tool_maker, classify_for_new_discussion=False, last_result=result
+    )
+    assert result.status == "success"
+    assert tool1.call_count == 2
+    assert list((await journal.completed_tool_calls(graph.run_id)).values()) == [{"status": "success", "return": {}}]
+    await journal.clear(graph.run_id)
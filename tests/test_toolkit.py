@@ -53,4 +53,27 @@ def test_toolkit_to_markdown(sample_tool):
     toolkit.add_tool(sample_tool)
     markdown = toolkit.to_markdown()
     assert sample_tool.name in markdown
-    assert sample_tool.description in markdown
\ No newline at end of file
+    assert sample_tool.description in markdown
+
+def test_toolkit_caches_until_mutation(sample_tool):
+    toolkit = Toolkit()
+    toolkit.add_tool(sample_tool)
+    assert toolkit.to_json_schema()[sample_tool.id] is toolkit.to_json_schema()[sample_tool.id]
+    assert toolkit.to_markdown() is toolkit.to_markdown()
+
+    version = toolkit.version
+    toolkit.add_tool(Tool(name="another_tool", schema={"type": "object", "properties": {}}, description="Another tool"))
+    assert toolkit.version == version + 1
+    assert "another_tool" in toolkit.to_markdown()
+    assert len(toolkit.to_json_schema()) == 2
+
+def test_toolkit_tools_info_is_a_plain_dict(sample_tool):
+    import copy
+    import pickle
+    toolkit = Toolkit()
+    toolkit.add_tool(sample_tool)
+    tools_info = toolkit.to_json_schema()
+    assert type(tools_info) is dict
+    tools_info["new"] = {}
+    assert "new" not in toolkit.to_json_schema()
+    assert copy.deepcopy(tools_info) == pickle.loads(pickle.dumps(tools_info)) == tools_info
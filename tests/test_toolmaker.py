@@ -0,0 +1,80 @@
+# tests/test_toolmaker.py
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+import pytest
+from tool4ai.toolmakers.openai_maker import OpenAIToolMaker
+
+def test_sort_tools_info_is_canonical():
+    tools_info = {
+        "b": {"name": "zeta", "description": "", "schema": {}},
+        "a": {"name": "alpha", "description": "", "schema": {}},
+    }
+    reordered = dict(reversed(list(tools_info.items())))
+    assert [t["name"] for t in OpenAIToolMaker.sort_tools_info(tools_info)] == ["alpha", "zeta"]
+    assert OpenAIToolMaker.sort_tools_info(tools_info) == OpenAIToolMaker.sort_tools_info(reordered)
+
+def test_tool_specs_are_converted_once():
+    from tool4ai.core.tool import Tool
+    from tool4ai.core.toolkit import Toolkit
+    tool = Tool(name="search", schema={"type": "object", "properties": {}}, description="Search")
+    toolkit = Toolkit()
+    toolkit.add_tool(tool)
+    tool_maker = OpenAIToolMaker()
+
+    specs = tool_maker.tool_specs(tool_maker.tool_convertor, toolkit.get_tools_info(["search"]))
+    assert [spec["function"]["name"] for spec in specs] == ["search"]
+    assert specs[0]["function"]["parameters"]["additionalProperties"] is False
+    # Converting never mutates the tool's own schema
+    assert "additionalProperties" not in tool.schema
+    # Equal tool infos, shared or rebuilt, reuse the converted spec
+    assert tool_maker.tool_specs(tool_maker.tool_convertor, toolkit.to_json_schema())[0] is specs[0]
+    rebuilt = {tool.id: {**tool.to_json_schema(), "schema": {"type": "object", "properties": {}}}}
+    assert tool_maker.tool_specs(tool_maker.tool_convertor, rebuilt)[0] is specs[0]
+
+    rebuilt[tool.id] = {**rebuilt[tool.id], "description": "Search the catalog"}
+    assert tool_maker.tool_specs(tool_maker.tool_convertor, rebuilt)[0]["function"]["description"] == "Search the catalog"
+
+def test_create_messages_layout():
+    tool_maker = OpenAIToolMaker()
+    memory = [{"role": "user", "content": "hello"}]
+    messages = tool_maker._create_messages("Task", memory)
+    assert [m["role"] for m in messages] == ["system", "user", "user"]
+    assert messages[-1]["content"] == "Task"
+    assert messages[1] is memory[0]
+
+def test_create_messages_with_cache_breakpoint():
+    tool_maker = OpenAIToolMaker(cache_breakpoints=True)
+    memory = [
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": None, "tool_calls": []},
+    ]
+    messages = tool_maker._create_messages("Task", memory)
+    assert messages[1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert messages[-1] == {"role": "user", "content": "Task"}
+    # The shared memory itself is never mutated
+    assert memory[0]["content"] == "hello"
+
+@pytest.mark.asyncio
+async def test_chat_stream(monkeypatch):
+    from types import SimpleNamespace
+    import litellm
+
+    def chunk(text, usage=None):
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else [], usage=usage)
+
+    async def stream():
+        for item in (chunk("Hel"), chunk(None), chunk("lo"), chunk(None, {"total_tokens": 3})):
+            yield item
+
+    calls = []
+    async def acompletion(**kwargs):
+        calls.append(kwargs)
+        return stream()
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+
+    chunks = [item async for item in OpenAIToolMaker().chat_stream([{"role": "user", "content": "hi"}], max_tokens=10)]
+    assert chunks == [("Hel", None), ("lo", None), ("", {"total_tokens": 3})]
+    assert calls[0]["stream"] is True and calls[0]["max_tokens"] == 10
@@ -10,7 +10,7 @@ and routing decisions based on LLM outputs for effective tool/function calls.
 from .core.tool import Tool
 from .core.toolkit import Toolkit
 from .core.router import Router
-from .core.models import SubQuery, SubQueryResponse
+from .core.models import SubQuery, SubQueryResponse, Dependency
 from .utils.dependency_graph import DependencyGraph
 from .core.graph.tool_dependency_graph import ToolDependencyGraph
 from .utils.config_manager import config_manager
@@ -20,7 +20,7 @@ from .utils.config_manager import config_manager
 __version__ = "0.1.0"
 
 # Define what should be importable from the package
-__all__ = ['Tool', 'Toolkit', 'Router', 'SubQuery', 'SubQueryResponse', 'DependencyGraph', 'ToolDependencyGraph', 'config_manager'] 
+__all__ = ['Tool', 'Toolkit', 'Router', 'SubQuery', 'SubQueryResponse', 'Dependency', 'DependencyGraph', 'ToolDependencyGraph', 'config_manager'] 
 
 # Package level initialization code (if any)
 def initialize():
@@ -0,0 +1,130 @@
+# File: tool4ai/core/graph/dependency_index.py
+
+import numpy as np
+from itertools import chain
+from typing import Dict, Iterable, List, Set
+
+class DependencyIndex:
+    """
+    Compressed sparse row (CSR) adjacency of a dependency graph, with its topological layering.
+    Nodes are graph indices, an edge goes from a dependency to the node that depends on it. The
+    layering is Kahn's algorithm run one level at a time over NumPy arrays, so building an index is
+    O(V + E). Nodes on a cycle, or downstream of a dependency that is not a node, get no level.
+
+    Building is not sub-millisecond at scale: for 10k nodes it measured about 2 ms for independent
+    nodes, 7 ms for 100 levels of 100 and 15 to 20 ms for a single chain or a random DAG, where
+    narrow levels are walked in Python. ToolDependencyGraph caches the index, so the cold cost is
+    paid once per change, and a cached order of 10k nodes in 100 levels is returned in about 0.05 ms.
+    """
+    # Levels with up to this many nodes are processed in plain Python
+    NARROW_LEVEL = 32
+
+    def __init__(self, nodes: Iterable[int], dependency_map: Dict[int, Set[int]]):
+        """
+        Args:
+            nodes (Iterable[int]): Indices of the nodes to order, without duplicates.
+            dependency_map (Dict[int, Set[int]]): For each node, the indices it depends on.
+        """
+        self.nodes = np.sort(np.fromiter(nodes, dtype=np.int64))
+        size = len(self.nodes)
+
+        counts = np.fromiter(map(len, dependency_map.values()), dtype=np.int64, count=len(dependency_map))
+        children = np.repeat(np.fromiter(dependency_map, dtype=np.int64, count=len(dependency_map)), counts)
+        parents = np.fromiter(chain.from_iterable(dependency_map.values()), dtype=np.int64, count=int(counts.sum()))
+
+        # Edges of nodes that are not ordered are ignored, edges to missing dependencies are dangling
+        child_pos = self._positions(children)
+        parent_pos = self._positions(parents)
+        known_child = child_pos >= 0
+        dangling = known_child & (parent_pos < 0)
+        self.dangling: Dict[int, List[int]] = {}
+        for child, parent in zip(children[dangling].tolist(), parents[dangling].tolist()):
+            self.dangling.setdefault(child, []).append(parent)
+
+        edges = known_child & (parent_pos >= 0)
+        sources, targets = parent_pos[edges], child_pos[edges]
+        order = np.argsort(sources, kind="stable")
+        self.indices = targets[order]
+        self.indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=size), out=self.indptr[1:])
+
+        # A dangling dependency is never satisfied, it counts toward the in-degree too
+        self.in_degree = (
+            np.bincount(targets, minlength=size)
+            + np.bincount(child_pos[dangling], minlength=size)
+        ).astype(np.int64)
+        ordered = np.zeros(size, dtype=bool)
+        self.levels = self._layer(ordered)
+        self.unordered: List[int] = self.nodes[~ordered].tolist()
+        # Unordered nodes that are not waiting on a dangling dependency are on, or behind, a cycle
+        self.cyclic: List[int] = self._not_downstream_of(self.unordered, self.dangling)
+
+    def _positions(self, values: np.ndarray) -> np.ndarray:
+        """Position of each value in self.nodes, -1 for values that are not nodes."""
+        if not len(self.nodes):
+            return np.full(len(values), -1, dtype=np.int64)
+        positions = np.searchsorted(self.nodes, values)
+        positions[positions == len(self.nodes)] = 0
+        return np.where(self.nodes[positions] == values, positions, -1)
+
+    def _layer(self, ordered: np.ndarray) -> List[List[int]]:
+        # The in-degrees are an array on wide levels and a list on narrow ones, where array calls
+        # cost more than they save (e.g. along a long chain)
+        in_degree = self.in_degree.copy()
+        frontier = np.flatnonzero(in_degree == 0).tolist()
+        indptr = indices = None
+        levels = []
+        while frontier:
+            levels.append(frontier)
+            if len(frontier) <= self.NARROW_LEVEL:
+                if indptr is None:
+                    indptr, indices = self.indptr.tolist(), self.indices.tolist()
+                if not isinstance(in_degree, list):
+                    in_degree = in_degree.tolist()
+                ready = []
+                for position in frontier:
+                    for child in indices[indptr[position]:indptr[position + 1]]:
+                        in_degree[child] -= 1
+                        if not in_degree[child]:
+                            ready.append(child)
+                frontier = sorted(ready)
+                continue
+            if isinstance(in_degree, list):
+                in_degree = np.asarray(in_degree, dtype=np.int64)
+            # Children of the whole frontier, gathered from the CSR slices at once
+            positions = np.asarray(frontier, dtype=np.int64)
+            starts = self.indptr[positions]
+            counts = self.indptr[positions + 1] - starts
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+            children, decrements = np.unique(self.indices[offsets], return_counts=True)
+            in_degree[children] -= decrements
+            frontier = children[in_degree[children] == 0].tolist()
+
+        # Levels of positions, as node indices
+        ordered[np.fromiter(chain.from_iterable(levels), dtype=np.int64)] = True
+        if not len(self.nodes) or (self.nodes[0] == 0 and self.nodes[-1] == len(self.nodes) - 1):
+            # Nodes 0..n-1, the usual plan, are their own positions
+            return levels
+        nodes = self.nodes.tolist()
+        return [[nodes[position] for position in level] for level in levels]
+
+    def _not_downstream_of(self, unordered: List[int], dangling: Dict[int, List[int]]) -> List[int]:
+        if not unordered or not dangling:
+            return unordered
+        # Walk from the nodes with dangling dependencies to everything they block
+        blocked = set()
+        stack = [int(np.searchsorted(self.nodes, node)) for node in dangling]
+        while stack:
+            position = stack.pop()
+            if position in blocked:
+                continue
+            blocked.add(position)
+            stack.extend(self.indices[self.indptr[position]:self.indptr[position + 1]].tolist())
+        blocked_nodes = set(self.nodes[list(blocked)].tolist())
+        return [node for node in unordered if node not in blocked_nodes]
+
+    def children(self, node: int) -> List[int]:
+        position = int(self._positions(np.asarray([node]))[0])
+        if position < 0:
+            return []
+        return self.nodes[self.indices[self.indptr[position]:self.indptr[position + 1]]].tolist()
@@ -1,18 +1,147 @@
 # execution_strategy.py
-from typing import Dict, List, Any, Callable, Optional
-from ..models import ExecutionStatus, ExecutionResult, SubQuery, SubQueryResponse
+from typing import Dict, List, Any, AsyncIterator, Callable, Optional, Tuple
+from ..models import EventType, ExecutionEvent, ExecutionStatus, ExecutionResult, SubQuery, SubQueryResponse
 from ...toolmakers import ToolMaker
+from ..toolkit import Toolkit
+from ...utils.schema_validator import SchemaValidationError, compile_schema
+from ...utils.repair import JSONRepairError, repair_json
+from ...utils.codec import get_codec
+from ...utils.messages import message_run_id, tag_messages
+from .memory_manager import MemoryManager
+from .streaming import ResultStream, StreamReader
+from .sub_query_registry import SubQueryRegistry
+from ...storages.journal import ExecutionJournal
+from ...storages.blob_store import BlobStore, has_references
 import asyncio
+import inspect
 import json
 from abc import ABC, abstractmethod
 import copy
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Tool results are JSON text in memory and sub-query results
+_json = get_codec("json")
+
+def _find_attr(value: Any, attr: str, depth: int = 0) -> List[Any]:
+    """Every value stored under `attr` in a tool result, looking inside JSON strings too."""
+    if isinstance(value, str) and depth < 3:
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    if isinstance(value, dict):
+        if attr in value:
+            return [value[attr]]
+        return [found for item in value.values() for found in _find_attr(item, attr, depth + 1)]
+    if isinstance(value, list):
+        return [found for item in value for found in _find_attr(item, attr, depth + 1)]
+    return []
+
+async def _iterate(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
 
 class ExecutionStrategy(ABC):
-    def __init__(self):
+    CONTEXT_SCOPES = ("full", "ancestors")
+    # Compiled validators kept for tools that are not passed with their toolkit
+    MAX_VALIDATORS = 256
+
+    def __init__(
+        self,
+        context_scope: str = "full",
+        max_history: Optional[int] = None,
+        memory_manager: Optional[MemoryManager] = None,
+        validate_arguments: bool = True,
+        argument_retries: int = 1,
+        journal: Optional[ExecutionJournal] = None,
+        blob_store: Optional[BlobStore] = None,
+        blob_threshold: int = 16 * 1024,
+        map_concurrency: int = 8,
+        stream_buffer: int = 64,
+        registry: Optional[SubQueryRegistry] = None,
+    ):
+        """
+        Args:
+            context_scope (str): How the memory sent with each sub-query is built. "full" sends the
+                whole conversation memory, "ancestors" sends the conversation history plus only the
+                results of the sub-queries this one depends on, projected to its `dependency_attr`.
+            max_history (Optional[int]): In "ancestors" mode, the maximum number of conversation
+                history messages to keep. None keeps all of them.
+            memory_manager (Optional[MemoryManager]): Keeps the shared memory under a token budget
+                as sub-queries complete. None leaves the memory unbounded.
+            validate_arguments (bool): Validate tool call arguments against the tool schema before
+                calling the tool.
+            argument_retries (int): How many times the model is asked again, with the validation
+                errors, when the arguments it produced are invalid.
+            journal (Optional[ExecutionJournal]): Write-ahead journal of tool calls, used to recover
+                a crashed run without calling completed tools again.
+            blob_store (Optional[BlobStore]): Stores tool results larger than `blob_threshold`
+                characters once, sub-query results and memory hold references that are only
+                materialized when a prompt is sent.
+            blob_threshold (int): Size above which a tool result goes to the blob store.
+            map_concurrency (int): Maximum number of concurrent tool calls of a map sub-query,
+                unless the sub-query sets its own `map_concurrency`.
+            stream_buffer (int): Number of items a tool that is an async generator may produce
+                ahead of the slowest sub-query reading them, before it is paused.
+            registry (Optional[SubQueryRegistry]): Shares the results of identical sub-queries
+                with the other graphs of a session using the same registry.
+        """
+        if context_scope not in self.CONTEXT_SCOPES:
+            raise ValueError(f"context_scope must be one of {self.CONTEXT_SCOPES}, got {context_scope!r}")
+        self.context_scope = context_scope
+        self.max_history = max_history
+        self.memory_manager = memory_manager
+        self.validate_arguments = validate_arguments
+        self.argument_retries = argument_retries
+        # Validators of the tools known only from a plain tools info dict, by tool id, least recently used first
+        self._validators: "OrderedDict[str, Tuple[Dict[str, Any], Callable]]" = OrderedDict()
+        self.journal = journal
+        self._completed_tool_calls: Dict[str, Dict[str, Any]] = {}
+        self.blob_store = blob_store
+        self.blob_threshold = blob_threshold
+        self.map_concurrency = map_concurrency
+        self.stream_buffer = stream_buffer
+        self.registry = registry
+        # Streams of the sub-queries running an async generator tool, by (run_id, index)
+        self._streams: Dict[Tuple[str, int], ResultStream] = {}
+        self._stream_events: Dict[Tuple[str, int], asyncio.Event] = {}
+        # Map sub-queries started on the stream of their dependency, before their own level
+        self._eager: Dict[Tuple[str, int], asyncio.Future] = {}
+        # Receivers of the execution events of a run, by run_id
+        self._listeners: Dict[str, Callable[[ExecutionEvent], None]] = {}
         self.last_context = None
         self.issue = None
         self.help = None
-        pass
+
+    def add_listener(self, run_id: str, listener: Callable[[ExecutionEvent], None]) -> None:
+        """Call `listener` with every event of the run, it must not block."""
+        self._listeners[run_id] = listener
+
+    def remove_listener(self, run_id: str) -> None:
+        self._listeners.pop(run_id, None)
+
+    def _emit(self, graph, event_type: EventType, level: Optional[int] = None, index: Optional[int] = None, **data) -> None:
+        listener = self._listeners.get(graph.run_id)
+        if listener is not None:
+            listener(ExecutionEvent(type=event_type, run_id=graph.run_id, level=level, index=index, data=data))
+
+    def get_state(self) -> Dict[str, Any]:
+        """The state kept between a pause and resume_execution()."""
+        return {"issue": self.issue, "help": self.help, "last_context": self.last_context}
+
+    def set_state(self, state: Dict[str, Any]) -> None:
+        self.issue = state.get("issue")
+        self.help = state.get("help")
+        self.last_context = state.get("last_context")
+
+    def clear_state(self) -> None:
+        self.last_context = None
+        self.issue = None
+        self.help = None
+
     @abstractmethod
     async def execute(
         self,
@@ -71,6 +200,249 @@ class ExecutionStrategy(ABC):
     ) -> Dict[str, Any]:
         pass
 
+    def _build_sub_query_memory(
+        self, graph, index: int, context: Dict[str, Any], parent_results: Optional[Dict[int, str]] = None
+    ) -> List[Dict[str, Any]]:
+        sub_query = graph.sub_queries[index]
+        memory = context.get("memory", [])
+        if self.context_scope == "full":
+            return memory + sub_query.internal_memory
+
+        # Memory entries that were produced by sub-queries of this graph are replaced by ancestors' results
+        history = [entry for entry in memory if message_run_id(entry) != graph.run_id]
+        if self.max_history is not None:
+            history = history[-self.max_history:] if self.max_history > 0 else []
+            # Never start with a tool message whose assistant tool call was trimmed away
+            while history and history[0].get("role") == "tool":
+                history.pop(0)
+
+        ancestor_memory = []
+        # Each parent's result is projected to the attribute that depends on it
+        attrs = {dependency.index: dependency.attr for dependency in sub_query.get_dependencies()}
+        for parent_index in sorted(graph.dependency_map.get(index, set())):
+            parent = graph.sub_queries.get(parent_index)
+            if parent is None or parent.status != "success" or parent.result is None:
+                continue
+            result = (parent_results or {}).get(parent_index, parent.result)
+            projected = self._project_result(result, attrs.get(parent_index, sub_query.dependency_attr))
+            ancestor_memory.append({
+                "role": "user",
+                "content": f"Result of the previous task \"{parent.task}\":\n{projected}",
+            })
+
+        return history + ancestor_memory + sub_query.internal_memory
+
+    async def _prompt_memory(self, graph, index: int, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The memory of a sub-query prompt, with blob references materialized."""
+        if not self.blob_store:
+            return self._build_sub_query_memory(graph, index, context)
+
+        # Results are materialized before projection, so dependency_attr still applies to them
+        parent_results = {}
+        if self.context_scope == "ancestors":
+            for parent_index in graph.dependency_map.get(index, set()):
+                parent = graph.sub_queries.get(parent_index)
+                if parent is not None and has_references(parent.result):
+                    parent_results[parent_index] = await self.blob_store.materialize(parent.result)
+        memory = self._build_sub_query_memory(graph, index, context, parent_results)
+        return await self.blob_store.materialize_memory(memory)
+
+    async def _prompt_context(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.blob_store:
+            return context
+        return {**context, "memory": await self.blob_store.materialize_memory(context.get("memory", []))}
+
+    async def _store_result(self, result: Any) -> Any:
+        """Replace a large tool result with a blob reference."""
+        if not self.blob_store:
+            return result
+        text = result if isinstance(result, str) else _json.dumps_text(result)
+        if len(text) <= self.blob_threshold:
+            return result
+        return await self.blob_store.put(text)
+
+    async def _open_journal(self, graph) -> None:
+        if not self.journal or graph.run_id in self._completed_tool_calls:
+            return
+        entries = await self.journal.entries(graph.run_id)
+        if not any(entry["type"] == "plan" for entry in entries):
+            await self.journal.record_plan(graph.run_id, graph.to_dict())
+        # Failed and human results are not reused, a retry or resume calls the tool again
+        self._completed_tool_calls[graph.run_id] = {
+            entry["key"]: entry["result"]
+            for entry in entries
+            if entry["type"] == "tool_call_finished" and ExecutionJournal.succeeded(entry["result"])
+        }
+
+    async def _call_tool(
+        self,
+        graph,
+        index: int,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        tool_functions: Dict[str, Callable],
+        **kwargs,
+    ) -> Any:
+        key = None
+        if self.journal:
+            key = ExecutionJournal.idempotency_key(index, tool_name, arguments)
+            completed = self._completed_tool_calls.get(graph.run_id, {})
+            if key in completed:
+                # Finished before a crash, the journaled result is reused
+                return completed[key]
+            await self.journal.tool_call_started(graph.run_id, key, index, tool_name, arguments)
+
+        async def _invoke(*args, **extra):
+            result = tool_functions[tool_name](*args, **extra)
+            return await result if inspect.isawaitable(result) else result
+
+        try:
+            result = await _invoke(arguments, **kwargs.get("extra", {}))
+        except TypeError:
+            result = await _invoke(arguments)
+        if inspect.isasyncgen(result):
+            result = await self._consume_stream(graph, index, result)
+
+        if self.journal and ExecutionJournal.succeeded(result):
+            await self.journal.tool_call_finished(graph.run_id, key, result)
+            self._completed_tool_calls.setdefault(graph.run_id, {})[key] = result
+        return result
+
+    def _stream_event(self, run_id: str, index: int) -> asyncio.Event:
+        """Set once the sub-query opens its stream."""
+        key = (run_id, index)
+        if key not in self._stream_events:
+            self._stream_events[key] = asyncio.Event()
+        return self._stream_events[key]
+
+    def _open_stream(self, run_id: str, index: int) -> ResultStream:
+        stream = self._streams.get((run_id, index))
+        if stream is None:
+            stream = self._streams[(run_id, index)] = ResultStream(self.stream_buffer)
+            self._stream_event(run_id, index).set()
+        return stream
+
+    async def _close_stream(self, run_id: str, index: int, error: Optional[BaseException] = None) -> None:
+        self._stream_events.pop((run_id, index), None)
+        stream = self._streams.pop((run_id, index), None)
+        if stream is not None:
+            await stream.close(error)
+
+    async def _consume_stream(self, graph, index: int, generator) -> Dict[str, Any]:
+        """
+        Publish the items of an async generator tool as they are produced. The stream of a
+        sub-query stays open until the sub-query finishes, so it spans all its tool calls.
+        """
+        stream = self._open_stream(graph.run_id, index)
+        items = []
+        try:
+            async for item in generator:
+                items.append(item)
+                await stream.publish(item)
+        finally:
+            await generator.aclose()
+        return {"status": "success", "return": items}
+
+    def _get_argument_validator(
+        self, tools_info: Dict[str, Dict[str, Any]], tool_name: str, toolkit: Optional[Toolkit] = None
+    ) -> Optional[Callable]:
+        tool = toolkit.get_tool(tool_name) if toolkit is not None else None
+        if tool is not None:
+            return tool.validator
+        tool_id, schema = next(
+            ((tool_id, info.get("schema")) for tool_id, info in tools_info.items() if info.get("name") == tool_name),
+            (None, None),
+        )
+        if not isinstance(schema, dict):
+            return None
+        # Compiled again only when the schema of the tool changes
+        cached = self._validators.get(tool_id)
+        if cached is None or cached[0] != schema:
+            cached = self._validators[tool_id] = (copy.deepcopy(schema), compile_schema(schema))
+            while len(self._validators) > self.MAX_VALIDATORS:
+                self._validators.popitem(last=False)
+        self._validators.move_to_end(tool_id)
+        return cached[1]
+
+    async def _prepare_tool_calls(
+        self,
+        graph,
+        message: Dict[str, Any],
+        query: Optional[str],
+        tools_info: Dict[str, Dict[str, Any]],
+        memory: List[Dict[str, Any]],
+        tool_maker: ToolMaker,
+        toolkit: Optional[Toolkit] = None,
+    ):
+        """
+        Parse and validate the arguments of every tool call in `message`. Malformed JSON is repaired
+        locally first. When some arguments are still invalid, the model is asked again with the
+        precise errors, up to `argument_retries` times.
+
+        Returns:
+            The (possibly new) message and a list of (tool_call, arguments) pairs.
+        """
+        for attempt in range(self.argument_retries + 1):
+            prepared, errors = [], {}
+            for tool_call in message["tool_calls"]:
+                try:
+                    arguments = repair_json(tool_call["function"]["arguments"])
+                except JSONRepairError as e:
+                    errors[tool_call["id"]] = SchemaValidationError([f"arguments: invalid JSON ({e})"])
+                    prepared.append((tool_call, {}))
+                    continue
+                validator = (
+                    self._get_argument_validator(tools_info, tool_call["function"]["name"], toolkit)
+                    if self.validate_arguments else None
+                )
+                if validator is not None:
+                    try:
+                        arguments = validator(arguments)
+                    except SchemaValidationError as e:
+                        errors[tool_call["id"]] = e
+                if tool_call["id"] not in errors:
+                    # The tool call is kept in memory, so it must carry the repaired arguments
+                    tool_call["function"]["arguments"] = json.dumps(arguments)
+                prepared.append((tool_call, arguments))
+
+            if not errors or attempt == self.argument_retries:
+                break
+
+            # Every tool call needs an answer, valid ones are simply reported as not executed
+            retry_memory = memory + ([{"role": "user", "content": query}] if query else []) + [message] + [
+                {
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "name": tool_call["function"]["name"],
+                    "content": f"Invalid arguments: {errors[tool_call['id']]}. Call the tool again with corrected arguments."
+                    if tool_call["id"] in errors else "Not executed, other tool calls had invalid arguments.",
+                }
+                for tool_call in message["tool_calls"]
+            ]
+            message, usage = await tool_maker.make_tools(None, tools_info, retry_memory)
+            graph.update_token_usage(usage)
+
+        if errors:
+            raise SchemaValidationError([str(error) for error in errors.values()])
+        return message, prepared
+
+    @staticmethod
+    def _project_result(result: str, attr: Optional[str]) -> str:
+        """
+        Reduce a sub-query result to the values stored under `attr`, falling back to the whole
+        result when the attribute is not found.
+        """
+        try:
+            data = json.loads(result)
+        except (TypeError, ValueError):
+            return result
+
+        found = _find_attr(data, attr) if attr else []
+        if not found:
+            return json.dumps(data, separators=(",", ":"))
+        projected = found[0] if len(found) == 1 else found
+        return json.dumps({attr: projected}, separators=(",", ":"))
+
 class DefaultExecutionStrategy(ExecutionStrategy):
     
     async def execute(
@@ -94,6 +466,8 @@ class DefaultExecutionStrategy(ExecutionStrategy):
         pasued_level = -1
 
         try:
+            await self._open_journal(graph)
+
             for level, indices in enumerate(
                 execution_order[resume_from_level:], start=resume_from_level
             ):
@@ -103,8 +477,10 @@ class DefaultExecutionStrategy(ExecutionStrategy):
                 if graph.level_status.get(level) == "success":
                     continue
 
+                # Sub-queries started early are collected by their level, whatever their status
                 indices_to_execute = [
-                    idx for idx in indices if graph.sub_queries[idx].status != "success"
+                    idx for idx in indices
+                    if graph.sub_queries[idx].status != "success" or (graph.run_id, idx) in self._eager
                 ]
                 level_results = await self._execute_level(
                     graph,
@@ -133,6 +509,8 @@ class DefaultExecutionStrategy(ExecutionStrategy):
                     sq = item["sub_query"]
                     if sq.status == "success":
                         memory.extend(sq.internal_memory)
+                if self.memory_manager:
+                    self.memory_manager.compact(memory, tool_maker)
                 
                 # Check if any failed sub-query 
                 self.issue = ["\n".join(sq.issue) for sq in level_sub_queries if sq.issue]
@@ -140,29 +518,39 @@ class DefaultExecutionStrategy(ExecutionStrategy):
                 
                 # update graph status
                 graph.update_graph_status()
+                self._emit(graph, EventType.LEVEL_FINISHED, level=level, status=graph.level_status[level], indices=indices_to_execute)
 
                 if graph.level_status[level] != "success":
                     if generate_interim_messages:
-                        interim_message, usages = (
-                            await graph.result_generator.generate_interim_message(
-                                tool_maker, level_sub_queries, context
-                            )
+                        interim_message, usages = await self._interim_message(
+                            graph, level, tool_maker, level_sub_queries, context
                         )
                         context['memory'].append({"role": "assistant", "content": interim_message})
                         context["interim_message"] = interim_message
+                        self._emit(graph, EventType.INTERIM_MESSAGE, level=level, content=interim_message)
                         graph.update_token_usage(usages)
                     break
 
                 context["memory"] = memory
 
+            # After a pause, sub-queries started early still finish and keep their memory
+            for item in await self._collect_eager(graph):
+                if item["sub_query"].status == "success":
+                    memory.extend(item["sub_query"].internal_memory)
+
             if final_prompt and graph.graph_status == "success":
-                final_response, usage = (
-                    await graph.result_generator.generate_final_response(
-                        context, tool_maker, final_prompt
-                    )
+                if self.memory_manager:
+                    self.memory_manager.compact(memory, tool_maker)
+                prompt_context = await self._prompt_context(context)
+                final_response, usage = await self._final_response(
+                    graph, prompt_context, tool_maker, final_prompt
                 )
+                if prompt_context is not context:
+                    # The final prompt was appended to the materialized copy
+                    memory.extend(prompt_context["memory"][len(memory):])
                 memory.append({"role": "assistant", "content": final_response})
                 graph.update_token_usage(usage)
+                self._emit(graph, EventType.FINAL_RESPONSE, content=final_response)
 
             self.last_context = context
     
@@ -190,6 +578,57 @@ class DefaultExecutionStrategy(ExecutionStrategy):
                 pasued_level=pasued_level,
                 error_info={"error_type": type(e).__name__, "error_message": str(e)},
             )
+        finally:
+            await self._cancel_eager(graph)
+            # Reloaded from the journal by the next execute() of the run
+            self._completed_tool_calls.pop(graph.run_id, None)
+
+    # While a run is streamed, the final response and interim messages are streamed too
+
+    async def _final_response(self, graph, context: Dict[str, Any], tool_maker: ToolMaker, final_prompt: str):
+        if graph.run_id not in self._listeners:
+            return await graph.result_generator.generate_final_response(context, tool_maker, final_prompt)
+        text, usage = await self._forward_tokens(
+            graph, EventType.FINAL_TOKEN, None,
+            graph.result_generator.generate_final_response_stream(context, tool_maker, final_prompt),
+        )
+        # Same shape as the message returned by tool_maker.chat()
+        return {"role": "assistant", "content": text}, usage
+
+    async def _interim_message(self, graph, level: int, tool_maker: ToolMaker, level_sub_queries: List[SubQuery], context: Dict[str, Any]):
+        if graph.run_id not in self._listeners:
+            return await graph.result_generator.generate_interim_message(tool_maker, level_sub_queries, context)
+        return await self._forward_tokens(
+            graph, EventType.INTERIM_TOKEN, level,
+            graph.result_generator.generate_interim_message_stream(tool_maker, level_sub_queries, context),
+        )
+
+    async def _forward_tokens(self, graph, event_type: EventType, level: Optional[int], chunks):
+        """Emit each piece of streamed text, returns the whole text and the usage."""
+        pieces, usage = [], {}
+        async for text, chunk_usage in chunks:
+            if text:
+                pieces.append(text)
+                self._emit(graph, event_type, level=level, content=text)
+            if chunk_usage:
+                usage = chunk_usage
+        return "".join(pieces), usage
+
+    async def _collect_eager(self, graph) -> List[Dict[str, Any]]:
+        results = []
+        for key in [key for key in self._eager if key[0] == graph.run_id]:
+            results.extend(await self._eager.pop(key) or [])
+        return results
+
+    async def _cancel_eager(self, graph) -> None:
+        tasks = [self._eager.pop(key) for key in list(self._eager) if key[0] == graph.run_id]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for key in [key for key in self._streams if key[0] == graph.run_id]:
+            await self._close_stream(*key, asyncio.CancelledError())
+        for key in [key for key in self._stream_events if key[0] == graph.run_id]:
+            del self._stream_events[key]
     
     async def _execute_level(
         self,
@@ -202,16 +641,57 @@ class DefaultExecutionStrategy(ExecutionStrategy):
         tool_maker: ToolMaker,
         **kwargs,
     ) -> List[Dict[str, Any]]:
-        level_tasks = [
-            self._execute_sub_query(
+        async def _run(index):
+            eager = self._eager.pop((graph.run_id, index), None)
+            if eager is not None:
+                results = await eager
+                if results is not None:
+                    return results
+            return await self._execute_sub_query(
                 graph, index, tool_functions, tools_info, context, tool_maker, **kwargs
             )
-            for index in indices
-        ]
-        level_results = await asyncio.gather(*level_tasks)
+
+        level_tasks = {index: asyncio.ensure_future(_run(index)) for index in indices}
+        for child, parent in self._stream_followers(graph, indices).items():
+            self._eager[(graph.run_id, child)] = asyncio.ensure_future(self._follow_stream(
+                graph, child, parent, level_tasks[parent], tool_functions, tools_info, context, tool_maker, **kwargs
+            ))
+        level_results = await asyncio.gather(*level_tasks.values())
         # Flatten the list of lists into a single list
         return [item for sublist in level_results for item in sublist]
 
+    def _stream_followers(self, graph, indices: List[int]) -> Dict[int, int]:
+        """Pending map sub-queries whose only dependency is in this level, by their dependency."""
+        followers = {}
+        for index in indices:
+            for child in graph.reverse_dependency_map.get(index, ()):
+                sub_query = graph.sub_queries.get(child)
+                if (
+                    sub_query is not None
+                    and sub_query.node_type == "map"
+                    and sub_query.status == "pending"
+                    and [dependency.index for dependency in sub_query.get_dependencies()] == [index]
+                    and (graph.run_id, child) not in self._eager
+                ):
+                    followers[child] = index
+        return followers
+
+    async def _follow_stream(self, graph, index: int, parent_index: int, parent_task: asyncio.Future, *args, **kwargs):
+        """
+        Run a map sub-query on the stream of its dependency as soon as the stream opens. Returns
+        None when the dependency finishes without streaming, the sub-query then runs in its level.
+        """
+        opened = self._stream_event(graph.run_id, parent_index)
+        waiter = asyncio.ensure_future(opened.wait())
+        try:
+            await asyncio.wait([waiter, parent_task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        stream = self._streams.get((graph.run_id, parent_index))
+        if stream is None:
+            return None
+        return await self._execute_sub_query(graph, index, *args, source=stream.subscribe(), **kwargs)
+
     async def resume_execution(
         self,
         graph,
@@ -230,7 +710,7 @@ class DefaultExecutionStrategy(ExecutionStrategy):
     ) -> ExecutionResult:
         if classify_for_new_discussion:
             classification, usage = await graph.result_generator.classify_user_input(
-                tool_maker, user_input, context
+                tool_maker, user_input, await self._prompt_context(context)
             )
             graph.update_token_usage(usage)
 
@@ -248,14 +728,15 @@ class DefaultExecutionStrategy(ExecutionStrategy):
             raise ValueError("No sub-query to resume from")
         
         if sub_query_need_attention.status == "human":
-            sub_query_need_attention.internal_memory.append({"role": "assistant", "content": "\n".join(sub_query_need_attention.help)})
-            sub_query_need_attention.internal_memory.append({"role": "user", "content": user_input})
+            answer = [{"role": "assistant", "content": "\n".join(sub_query_need_attention.help)}]
         elif sub_query_need_attention.status in ["failed", "error"]:
-            sub_query_need_attention.internal_memory.append({"role": "assistant", "content": "\n".join(sub_query_need_attention.issue)})
-            sub_query_need_attention.internal_memory.append({"role": "user", "content": user_input})
+            answer = [{"role": "assistant", "content": "\n".join(sub_query_need_attention.issue)}]
         else:
-            sub_query_need_attention.internal_memory.append({"role": "assistant", "content": "Please, help me understand what you mean, or provide more information."})
-            sub_query_need_attention.internal_memory.append({"role": "user", "content": user_input})
+            answer = [{"role": "assistant", "content": "Please, help me understand what you mean, or provide more information."}]
+        answer.append({"role": "user", "content": user_input})
+        graph.sub_queries.set_fields(
+            sub_query_need_attention.index, internal_memory=sub_query_need_attention.internal_memory + answer
+        )
 
 
         return await self.execute(
@@ -283,85 +764,38 @@ class DefaultExecutionStrategy(ExecutionStrategy):
     ) -> List[Dict[str, Any]]:
         original_sub_query = graph.sub_queries[index]
         results = []
+        self._emit(
+            graph, EventType.NODE_STARTED, index=index,
+            task=original_sub_query.task, tool=original_sub_query.tool, node_type=original_sub_query.node_type,
+        )
 
         try:
-            filtered_tools_info = {
-                tool: info
-                for tool, info in tools_info.items()
-                if info["name"] == original_sub_query.tool
-            } if original_sub_query.status == "pending" else tools_info
-
-            message, usage = await tool_maker.make_tools(
-                original_sub_query.task if original_sub_query.status == "pending" else None,
-                filtered_tools_info, 
-                context.get("memory", []) + original_sub_query.internal_memory
-            )
-            graph.update_token_usage(usage)
-            
-            if len(message["tool_calls"]) > 1:
-                print(f"Multiple tool calls in a single message: {message}")
-                
-
-            sub_query = original_sub_query
-            
-            all_tools_results = []
-            prev_name = sub_query.tool
-            for tool_call in message["tool_calls"]:
-                tool_name = tool_call["function"]["name"]
-                if tool_name != prev_name:
-                    print(f"Multiple tools in a single message: {message}")
-                    sub_query.other_tools.append(tool_name)
-                tool_id = tool_call["id"]
-                arguments = json.loads(tool_call["function"]["arguments"])
-
-                if tool_name in tool_functions:
-                    tool_result = {"tool_call_id": tool_id, "name": tool_name}
-                    try:
-                        result = await tool_functions[tool_name](arguments, **kwargs.get("extra", {}))
-                    except TypeError:
-                        result = await tool_functions[tool_name](arguments)
-                    result_dict = json.loads(result) if type(result) == str else result
-                    result_json = json.dumps(result_dict, indent=4)
-                    tool_result["result"] = result
-                    tool_result["help"] = result_dict.get("help", "")
-                    tool_result["issue"] = result_dict.get("issue", "")
-                    tool_result["status"] = result_dict.get("status", "success")
-                    
-                    
-                    message_for_signle_tool_call = copy.deepcopy(message)
-                    message_for_signle_tool_call['tool_calls'] = [tool_call]
-
-                    memory_entry = [
-                        # {"role": "user", "content": sub_query.task},
-                        message_for_signle_tool_call,
-                        {"role": "tool", "tool_call_id": tool_id, "name": tool_name, "content": result_json},
-                    ]
-                    tool_result["memory"] = memory_entry
-                    
-                    all_tools_results.append(tool_result)
-                else:
-                    raise ValueError(f"No function found for tool {tool_name}")
-
-            from collections import Counter
-            # Count all status
-            status_counter = Counter([tool_result["status"] for tool_result in all_tools_results])
-            
-            if status_counter["success"] == len(all_tools_results):
-                sub_query.status = "success"
-            elif status_counter["failed"] == len(all_tools_results):
-                sub_query.status = "failed"
-            elif status_counter["human"] == len(all_tools_results):
-                sub_query.status = "human"
+            run = self._execute_map if original_sub_query.node_type == "map" else self._execute_tool_calls
+            produce = lambda: run(graph, index, tool_functions, tools_info, context, tool_maker, **kwargs)
+            # Only first attempts are shared, later ones carry the user's answers. Streamed items
+            # are not in the key, their producer has no result yet
+            if self.registry is not None and original_sub_query.status == "pending" and "source" not in kwargs:
+                all_tools_results, _ = await self.registry.run(
+                    SubQueryRegistry.key(graph, index),
+                    produce,
+                    shareable=lambda results: all(result["status"] == "success" for result in results),
+                )
             else:
-                sub_query.status = "partial"
-                
-            sub_query.result = json.dumps([tool_result["result"] for tool_result in all_tools_results])
-            
-            sub_query.issue = [f"Tool {tool_result['name']}, Issue {ix}: {tool_result['issue']}" for ix, tool_result in enumerate(all_tools_results) if tool_result["issue"]]
-            sub_query.help = [f"Tool {tool_result['name']}, Help {ix}: {tool_result['help']}" for ix, tool_result in enumerate(all_tools_results) if tool_result["help"]]
+                all_tools_results = await produce()
+            sub_query = original_sub_query
+            memory_entries = self._finish_sub_query(graph, sub_query, all_tools_results)
+            # Readers of a sub-query that did not succeed must not act on its items
+            await self._close_stream(
+                graph.run_id, index,
+                None if sub_query.status == "success" else ValueError(f"Sub-query {index} ended with status {sub_query.status}"),
+            )
 
-            sub_query.internal_memory = memory_entries = sum([tool_result["memory"] for tool_result in all_tools_results], [])
-            sub_query.internal_memory = memory_entries = [{"role": "user", "content": sub_query.task}] + memory_entries
+            if self.journal:
+                await self.journal.sub_query_finished(graph.run_id, sub_query.model_dump())
+            self._emit(
+                graph, EventType.NODE_FINISHED, index=index,
+                status=sub_query.status, result=sub_query.result, issue=sub_query.issue, help=sub_query.help,
+            )
                             
             results.append({
                 "index": index,
@@ -371,10 +805,13 @@ class DefaultExecutionStrategy(ExecutionStrategy):
             })
 
         except Exception as e:
-            print(f"Error executing {original_sub_query.task}: {str(e)}")
-            original_sub_query.status = "failed"
-            original_sub_query.result = json.dumps({"error": str(e)})
-            original_sub_query.issue = str(e)
+            logger.error("Error executing %s: %s", original_sub_query.task, e)
+            await self._close_stream(graph.run_id, index, e)
+            graph.sub_queries.set_fields(index, status="failed", result=json.dumps({"error": str(e)}), issue=str(e))
+            self._emit(
+                graph, EventType.NODE_FINISHED, index=index,
+                status="failed", result=original_sub_query.result, issue=str(e), help=original_sub_query.help,
+            )
             results.append({
                 "index": index,
                 "sub_query": original_sub_query,
@@ -384,4 +821,261 @@ class DefaultExecutionStrategy(ExecutionStrategy):
                 ],
             })
 
-        return results
\ No newline at end of file
+        return results
+
+    @staticmethod
+    def _filter_tools_info(tools_info: Dict[str, Dict[str, Any]], tool_name: str, toolkit: Optional[Toolkit] = None):
+        if toolkit is not None and toolkit.has_tool(tool_name):
+            # Cached by the toolkit, no scan over every tool
+            return toolkit.get_tools_info([tool_name])
+        return {
+            tool: info
+            for tool, info in tools_info.items()
+            if info["name"] == tool_name
+        }
+
+    async def _execute_tool_calls(
+        self,
+        graph,
+        index: int,
+        tool_functions: Dict[str, Callable],
+        tools_info: Dict[str, Dict[str, Any]],
+        context: Dict[str, Any],
+        tool_maker: ToolMaker,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        """Ask the model for the tool calls of a sub-query and run them one after the other."""
+        sub_query = graph.sub_queries[index]
+        if sub_query.status != "pending":
+            filtered_tools_info = tools_info
+        else:
+            filtered_tools_info = self._filter_tools_info(tools_info, sub_query.tool, kwargs.get("toolkit"))
+
+        query = sub_query.task if sub_query.status == "pending" else None
+        sub_query_memory = await self._prompt_memory(graph, index, context)
+        message, usage = await tool_maker.make_tools(
+            query,
+            filtered_tools_info, 
+            sub_query_memory
+        )
+        graph.update_token_usage(usage)
+
+        message, tool_calls = await self._prepare_tool_calls(
+            graph, message, query, filtered_tools_info, sub_query_memory, tool_maker, kwargs.get("toolkit")
+        )
+        
+        if len(message["tool_calls"]) > 1:
+            logger.info("Multiple tool calls in a single message: %s", message)
+
+        all_tools_results = []
+        prev_name = sub_query.tool
+        for tool_call, arguments in tool_calls:
+            tool_name = tool_call["function"]["name"]
+            if tool_name != prev_name:
+                logger.info("Multiple tools in a single message: %s", message)
+                sub_query.other_tools.append(tool_name)
+            all_tools_results.append(
+                await self._run_tool_call(graph, index, message, tool_call, arguments, tool_functions, **kwargs)
+            )
+        return all_tools_results
+
+    async def _map_items(self, graph, index: int) -> List[Any]:
+        """
+        The items a map sub-query runs over: the list its first dependency returned under the
+        dependency attribute, or else the items its async generator tool produced.
+        """
+        sub_query = graph.sub_queries[index]
+        dependencies = sub_query.get_dependencies()
+        if not dependencies:
+            raise ValueError(f"Map sub-query {index} has no dependency to map over")
+        dependency = dependencies[0]
+        parent = graph.sub_queries.get(dependency.index)
+        if parent is None or parent.status != "success" or parent.result is None:
+            raise ValueError(f"Map sub-query {index} depends on sub-query {dependency.index}, which has no result")
+
+        result = parent.result
+        if self.blob_store and has_references(result):
+            result = await self.blob_store.materialize(result)
+        tool_results = _json.loads(result)
+        found = _find_attr(tool_results, dependency.attr) if dependency.attr else []
+        if not found:
+            # Async generator tools return their items as a list
+            for tool_result in tool_results if isinstance(tool_results, list) else []:
+                if isinstance(tool_result, str):
+                    try:
+                        tool_result = json.loads(tool_result)
+                    except ValueError:
+                        continue
+                if isinstance(tool_result, dict) and isinstance(tool_result.get("return"), list):
+                    found.append(tool_result["return"])
+        if not found:
+            raise ValueError(f"No {dependency.attr!r} found in the result of sub-query {dependency.index}")
+        # One list, or one value or list per tool call of the parent
+        if len(found) == 1 and isinstance(found[0], list):
+            return found[0]
+        return [item for value in found for item in (value if isinstance(value, list) else [value])]
+
+    async def _execute_map(
+        self,
+        graph,
+        index: int,
+        tool_functions: Dict[str, Callable],
+        tools_info: Dict[str, Dict[str, Any]],
+        context: Dict[str, Any],
+        tool_maker: ToolMaker,
+        **kwargs,
+    ) -> List[Dict[str, Any]]:
+        """
+        Call the tool of a map sub-query once per item, at most `map_concurrency` calls at a time.
+        When the item argument is in the tool schema, the model is asked for the arguments once
+        and each item is bound locally, otherwise the model is asked once per item. With a
+        `source` reader the items come from the stream of a dependency that is still running,
+        and the next item is only read once a call slot is free.
+        """
+        sub_query = graph.sub_queries[index]
+        source = kwargs.pop("source", None)
+        items = source if source is not None else _iterate(await self._map_items(graph, index))
+        argument = sub_query.map_argument or sub_query.get_dependencies()[0].attr
+        toolkit = kwargs.get("toolkit")
+        filtered_tools_info = self._filter_tools_info(tools_info, sub_query.tool, toolkit)
+        schema = next(
+            (info.get("schema") for info in filtered_tools_info.values() if info.get("name") == sub_query.tool), None
+        )
+        bind_locally = isinstance(schema, dict) and argument in schema.get("properties", {})
+        sub_query_memory = await self._prompt_memory(graph, index, context)
+        semaphore = asyncio.Semaphore(sub_query.map_concurrency or self.map_concurrency)
+
+        async def _ask(item):
+            query = f"{sub_query.task}\n{argument}: {_json.dumps_text(item)}"
+            message, usage = await tool_maker.make_tools(query, filtered_tools_info, sub_query_memory)
+            graph.update_token_usage(usage)
+            message, tool_calls = await self._prepare_tool_calls(
+                graph, message, query, filtered_tools_info, sub_query_memory, tool_maker, toolkit
+            )
+            tool_call, arguments = next(
+                ((tool_call, arguments) for tool_call, arguments in tool_calls if tool_call["function"]["name"] == sub_query.tool),
+                tool_calls[0],
+            )
+            return message, tool_call, arguments
+
+        template = None
+        validator = self._get_argument_validator(filtered_tools_info, sub_query.tool, toolkit) if self.validate_arguments else None
+
+        async def _call(position, item):
+            try:
+                if template is None:
+                    message, tool_call, arguments = await _ask(item)
+                else:
+                    message, base_call, arguments = template
+                    arguments = {**arguments, argument: item}
+                    if validator is not None:
+                        arguments = validator(arguments)
+                    tool_call = {
+                        "id": f"{base_call['id']}_{position}",
+                        "type": "function",
+                        "function": {"name": base_call["function"]["name"], "arguments": json.dumps(arguments)},
+                    }
+                return await self._run_tool_call(graph, index, message, tool_call, arguments, tool_functions, **kwargs)
+            except Exception as e:
+                # One failing item does not stop the others, the sub-query ends up partial
+                return {
+                    "tool_call_id": f"map_{index}_{position}",
+                    "name": sub_query.tool,
+                    "result": json.dumps({"error": str(e)}),
+                    "help": "",
+                    "issue": f"Item {position}: {e}",
+                    "status": "failed",
+                    "memory": [],
+                }
+            finally:
+                semaphore.release()
+
+        tasks = []
+        try:
+            async for item in items:
+                if bind_locally and template is None:
+                    template = await _ask(item)
+                await semaphore.acquire()
+                tasks.append(asyncio.ensure_future(_call(len(tasks), item)))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if isinstance(items, StreamReader):
+                await items.close()
+        return list(await asyncio.gather(*tasks))
+
+    async def _run_tool_call(
+        self,
+        graph,
+        index: int,
+        message: Dict[str, Any],
+        tool_call: Dict[str, Any],
+        arguments: Dict[str, Any],
+        tool_functions: Dict[str, Callable],
+        **kwargs,
+    ) -> Dict[str, Any]:
+        tool_name = tool_call["function"]["name"]
+        tool_id = tool_call["id"]
+        if tool_name not in tool_functions:
+            raise ValueError(f"No function found for tool {tool_name}")
+
+        tool_result = {"tool_call_id": tool_id, "name": tool_name}
+        self._emit(graph, EventType.TOOL_CALL, index=index, tool_call_id=tool_id, name=tool_name, arguments=arguments)
+        result = await self._call_tool(
+            graph, index, tool_name, arguments, tool_functions, **kwargs
+        )
+        result_dict = _json.loads(result) if type(result) == str else result
+        stored_result = await self._store_result(result)
+        if stored_result is result:
+            # A result that is already JSON text is used as is
+            result_json = result if type(result) == str else _json.dumps_text(result_dict)
+        else:
+            # Memory and sub-query result share the stored blob
+            result_json = stored_result
+        tool_result["result"] = stored_result
+        tool_result["help"] = result_dict.get("help", "")
+        tool_result["issue"] = result_dict.get("issue", "")
+        tool_result["status"] = result_dict.get("status", "success")
+        
+        message_for_signle_tool_call = copy.deepcopy(message)
+        message_for_signle_tool_call['tool_calls'] = [tool_call]
+
+        memory_entry = [
+            # {"role": "user", "content": sub_query.task},
+            message_for_signle_tool_call,
+            {"role": "tool", "tool_call_id": tool_id, "name": tool_name, "content": result_json},
+        ]
+        tool_result["memory"] = memory_entry
+        return tool_result
+
+    def _finish_sub_query(self, graph, sub_query: SubQuery, all_tools_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Set the status, result, issues and memory of a sub-query from its tool results."""
+        from collections import Counter
+        # Count all status
+        status_counter = Counter([tool_result["status"] for tool_result in all_tools_results])
+        
+        if status_counter["success"] == len(all_tools_results):
+            status = "success"
+        elif status_counter["failed"] == len(all_tools_results):
+            status = "failed"
+        elif status_counter["human"] == len(all_tools_results):
+            status = "human"
+        else:
+            status = "partial"
+
+        memory_entries = sum([tool_result["memory"] for tool_result in all_tools_results], [])
+        # Tagged, so the "ancestors" scope can tell them from the conversation history
+        memory_entries = tag_messages([{"role": "user", "content": sub_query.task}] + memory_entries, graph.run_id)
+        # Through the store, which keeps the status columns up to date
+        graph.sub_queries.set_fields(
+            sub_query.index,
+            status=status,
+            result=_json.dumps_text([tool_result["result"] for tool_result in all_tools_results]),
+            issue=[f"Tool {tool_result['name']}, Issue {ix}: {tool_result['issue']}" for ix, tool_result in enumerate(all_tools_results) if tool_result["issue"]],
+            help=[f"Tool {tool_result['name']}, Help {ix}: {tool_result['help']}" for ix, tool_result in enumerate(all_tools_results) if tool_result["help"]],
+            internal_memory=memory_entries,
+        )
+        return memory_entries
@@ -0,0 +1,164 @@
+# memory_manager.py
+import asyncio
+import json
+from typing import Dict, List, Any, Optional
+from ...toolmakers import ToolMaker
+
+
+class MemoryManager:
+    """
+    Keeps the conversation memory of a graph execution under a token budget.
+
+    Token counts are estimated offline (no tokenizer call) from the message sizes. When the
+    budget is exceeded, older turns are compacted: tool payloads are replaced by a short marker,
+    large contents are truncated and, as a last resort, the oldest turns are dropped. Dropped
+    turns can optionally be summarized in the background and re-inserted as a single message.
+    """
+
+    CHARS_PER_TOKEN = 4
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(
+        self,
+        max_tokens: int = 8000,
+        keep_recent: int = 6,
+        max_entry_tokens: int = 500,
+        summarize: bool = False,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.max_entry_tokens = max_entry_tokens
+        self.summarize = summarize
+        self.token_usage = {
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_tokens": 0,
+        }
+        self._summary_task: Optional[asyncio.Task] = None
+
+    def estimate_tokens(self, message: Dict[str, Any]) -> int:
+        content = message.get("content") or ""
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        size = len(content)
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            size += len(function.get("name", "")) + len(function.get("arguments", ""))
+
+        return self.MESSAGE_OVERHEAD + size // self.CHARS_PER_TOKEN
+
+    def count_tokens(self, memory: List[Dict[str, Any]]) -> int:
+        return sum(self.estimate_tokens(message) for message in memory)
+
+    def compact(self, memory: List[Dict[str, Any]], tool_maker: Optional[ToolMaker] = None) -> List[Dict[str, Any]]:
+        """
+        Compact `memory` in place so that its estimated size fits `max_tokens`.
+
+        Args:
+            memory (List[Dict[str, Any]]): The conversation memory, usually context["memory"].
+            tool_maker (Optional[ToolMaker]): Used to summarize dropped turns when `summarize` is enabled.
+
+        Returns:
+            List[Dict[str, Any]]: The same list, compacted.
+        """
+        self._apply_summary(memory)
+
+        total = self.count_tokens(memory)
+        if total > self.max_tokens:
+            protected = self._protected_start(memory)
+
+            # First pass: shrink older entries, oldest first
+            for position in range(protected):
+                if total <= self.max_tokens:
+                    break
+                message = memory[position]
+                compacted = self._compact_message(message)
+                if compacted is not message:
+                    total += self.estimate_tokens(compacted) - self.estimate_tokens(message)
+                    memory[position] = compacted
+
+            # Second pass: drop the oldest turns
+            dropped = []
+            while total > self.max_tokens and protected > 0:
+                message = memory.pop(0)
+                protected -= 1
+                total -= self.estimate_tokens(message)
+                dropped.append(message)
+            # A tool message must always follow the assistant message that called it
+            while protected > 0 and memory and memory[0].get("role") == "tool":
+                dropped.append(memory.pop(0))
+                protected -= 1
+
+            if dropped and self.summarize and tool_maker is not None:
+                self._schedule_summary(dropped, memory, tool_maker)
+        return memory
+
+    async def wait_for_summary(self, memory: List[Dict[str, Any]]) -> None:
+        """Wait for a pending background summary, if any, and insert it into `memory`."""
+        if self._summary_task is not None:
+            await asyncio.shield(self._summary_task)
+            self._apply_summary(memory)
+
+    def _protected_start(self, memory: List[Dict[str, Any]]) -> int:
+        start = max(len(memory) - self.keep_recent, 0)
+        # Keep tool messages together with the assistant message that called them
+        while start > 0 and memory[start].get("role") == "tool":
+            start -= 1
+        return start
+
+    def _compact_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        content = message.get("content")
+        if not isinstance(content, str):
+            return message
+
+        if message.get("role") == "tool":
+            if content.startswith("[tool result omitted"):
+                return message
+            return {**message, "content": f"[tool result omitted, {len(content)} characters]"}
+
+        max_chars = self.max_entry_tokens * self.CHARS_PER_TOKEN
+        if len(content) > max_chars:
+            return {**message, "content": content[:max_chars] + " ...[truncated]"}
+        return message
+
+    def _schedule_summary(self, dropped: List[Dict[str, Any]], memory: List[Dict[str, Any]], tool_maker: ToolMaker) -> None:
+        previous = self._summary_task
+        anchor = memory[0] if memory else None
+
+        async def _summarize():
+            previous_summary = None
+            if previous is not None:
+                previous_summary, _ = await previous
+            transcript = "\n".join(
+                f"{message.get('role')}: {message.get('content') or ''}" for message in dropped
+            )
+            if previous_summary:
+                transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+            result, usage = await tool_maker.completion(
+                "Summarize the following conversation turns in a few sentences. Keep names, lists and decisions the user made.",
+                transcript,
+                max_tokens=self.max_entry_tokens,
+            )
+            for key in self.token_usage:
+                self.token_usage[key] += usage.get(key, 0)
+            return result.get("content"), anchor
+
+        try:
+            self._summary_task = asyncio.get_running_loop().create_task(_summarize())
+        except RuntimeError:
+            # No running event loop, the dropped turns are simply discarded
+            self._summary_task = None
+
+    def _apply_summary(self, memory: List[Dict[str, Any]]) -> None:
+        task = self._summary_task
+        if task is None or not task.done():
+            return
+        self._summary_task = None
+        if task.cancelled() or task.exception() is not None:
+            return
+        summary, anchor = task.result()
+        if not summary:
+            return
+        # Insert the summary right before the oldest turn that was kept when it was scheduled
+        position = next((ix for ix, message in enumerate(memory) if message is anchor), 0)
+        memory.insert(position, {"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
@@ -0,0 +1,73 @@
+# File: tool4ai/core/graph/plan_optimizer.py
+
+import re
+from typing import Dict, Tuple
+from ..models import Dependency, SubQuery
+
+_SPACES = re.compile(r"\s+")
+
+def normalize_task(task: str) -> str:
+    """The task text compared for duplicates: case, spacing and closing punctuation do not count."""
+    return _SPACES.sub(" ", (task or "").casefold()).strip().rstrip(".?!;: ")
+
+def sub_query_key(sub_query: SubQuery, parents: Tuple = ()) -> Tuple:
+    """What makes two sub-queries the same work, given a key for what they depend on."""
+    return (sub_query.tool, sub_query.node_type, sub_query.map_argument, normalize_task(sub_query.task), parents)
+
+def merge_duplicate_sub_queries(graph) -> Dict[int, int]:
+    """
+    Merge the pending sub-queries that call the same tool for the same normalized task, on the
+    same dependencies. The one with the lowest index is kept, the others are removed from the
+    graph and their dependents are rewired to it. Sub-queries are visited in execution order,
+    so sub-queries that only became duplicates once their dependencies were merged are found too.
+
+    Returns:
+        Dict[int, int]: The index kept for each removed sub-query, also added to
+            graph.merged_sub_queries.
+    """
+    merged: Dict[int, int] = {}
+    kept: Dict[Tuple, int] = {}
+    for level in graph.get_execution_order():
+        for index in level:
+            sub_query = graph.sub_queries[index]
+            if sub_query.status != "pending":
+                continue
+            parents = tuple(sorted(
+                {(merged.get(dependency.index, dependency.index), dependency.attr or "") for dependency in sub_query.get_dependencies()}
+            ))
+            key = sub_query_key(sub_query, parents)
+            if key in kept:
+                merged[index] = kept[key]
+            else:
+                kept[key] = index
+    if not merged:
+        return {}
+
+    for duplicate in merged:
+        for child in graph.reverse_dependency_map.get(duplicate, ()):
+            if child in merged:
+                continue
+            sub_query = graph.sub_queries[child]
+            dependencies, seen = [], set()
+            for dependency in sub_query.get_dependencies():
+                parent = merged.get(dependency.index, dependency.index)
+                if parent not in seen:
+                    seen.add(parent)
+                    dependencies.append(Dependency(index=parent, attr=dependency.attr))
+            sub_query.set_dependencies(dependencies)
+    for duplicate in merged:
+        del graph.sub_queries[duplicate]
+
+    dependency_map = {
+        child: {merged.get(parent, parent) for parent in parents}
+        for child, parents in graph.dependency_map.items()
+        if child not in merged
+    }
+    reverse_dependency_map: Dict[int, set] = {}
+    for child, parents in dependency_map.items():
+        for parent in parents:
+            reverse_dependency_map.setdefault(parent, set()).add(child)
+    graph.dependency_map = dependency_map
+    graph.reverse_dependency_map = reverse_dependency_map
+    graph.merged_sub_queries.update(merged)
+    return merged
@@ -1,11 +1,35 @@
 # result_generator.py
 import json
-from typing import List, Dict, Any
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from ..models import SubQuery
 from ...toolmakers import ToolMaker
+from ...utils.messages import strip_tags
 
 class ResultGenerator:
     async def generate_interim_message(self, tool_maker: ToolMaker, level_results: List[SubQuery], context: Dict[str, Any]) -> str:
+        system_message, user_prompt = self._interim_prompts(level_results, context)
+        json_schema = {
+            "name": "response",
+            "schema": {
+                "type": "object",
+                "properties": {"reply": {"type": "string"}},
+                "required": ["reply"],
+            },
+        }
+
+        result, usage = await tool_maker.completion(system_message, user_prompt, json_schema)
+        reply = json.loads(result["content"]).get("reply")
+        return reply, usage
+
+    async def generate_interim_message_stream(
+        self, tool_maker: ToolMaker, level_results: List[SubQuery], context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        """generate_interim_message() as plain text, yielded as it is generated."""
+        system_message, user_prompt = self._interim_prompts(level_results, context)
+        async for chunk in tool_maker.completion_stream(system_message, user_prompt):
+            yield chunk
+
+    def _interim_prompts(self, level_results: List[SubQuery], context: Dict[str, Any]) -> Tuple[str, str]:
         system_message = """You are an AI assistant engaged in a chat conversation with a user. Your task is to generate a concise, friendly, and personalized message about the current state of their request execution. Focus on what's immediately relevant for the user to proceed.
 
         Guidelines:
@@ -41,25 +65,21 @@ class ResultGenerator:
         {error_summary}
 
         If human input is needed, briefly state what's required. If errors occurred, briefly mention them with a simple suggestion. Keep your response short, friendly, and focused on what the user needs to do next. If there are more than 3 issues in either category, mention that there are additional issues not listed. Remember, this is mid-conversation, so don't use greetings."""
-
-        json_schema = {
-            "name": "response",
-            "schema": {
-                "type": "object",
-                "properties": {"reply": {"type": "string"}},
-                "required": ["reply"],
-            },
-        }
-
-        result, usage = await tool_maker.completion(system_message, user_prompt, json_schema)
-        reply = json.loads(result["content"]).get("reply")
-        return reply, usage
+        return system_message, user_prompt
 
     async def generate_final_response(self, context: Dict[str, Any], tool_maker: ToolMaker, final_prompt: str) -> str:
         context["memory"].append({"role": "user", "content": final_prompt})
         message, usage = await tool_maker.chat(context["memory"])
         return message, usage
 
+    async def generate_final_response_stream(
+        self, context: Dict[str, Any], tool_maker: ToolMaker, final_prompt: str
+    ) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        """generate_final_response(), yielding the response as it is generated."""
+        context["memory"].append({"role": "user", "content": final_prompt})
+        async for chunk in tool_maker.chat_stream(context["memory"]):
+            yield chunk
+
     async def classify_user_input(self, tool_maker: Any, user_query: str, context: Dict[str, Any]) -> str:
         system_message = """You are an AI assistant integrated into a movie recommendation and list management system. Your task is to classify whether a user's latest message is starting a new discussion or responding to a previously paused task execution.
 
@@ -76,7 +96,7 @@ class ResultGenerator:
         user_prompt = f"""Classify the following user input as either a new discussion or a continuation of the previous interaction. Here's the relevant information:
 
         Recent conversation history (last 5 exchanges):
-        {context['memory'][-5:]}
+        {strip_tags(context['memory'][-5:])}
 
         User's latest query: "{user_query}"
 
@@ -0,0 +1,78 @@
+# File: tool4ai/core/graph/streaming.py
+
+import asyncio
+from typing import Any, List, Optional
+
+class ResultStream:
+    """
+    Items of a tool result that is still being produced, kept in order and read by any number of
+    readers. Readers that subscribe late start from the first item. The producer waits while a
+    reader is `buffer_size` items behind, so a slow consumer slows the tool down instead of
+    letting items pile up.
+    """
+
+    def __init__(self, buffer_size: int = 64):
+        self.buffer_size = buffer_size
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._readers: List["StreamReader"] = []
+        self._changed = asyncio.Condition()
+
+    async def publish(self, item: Any) -> None:
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: all(len(self.items) - reader.position < self.buffer_size for reader in self._readers)
+            )
+            self.items.append(item)
+            self._changed.notify_all()
+
+    async def close(self, error: Optional[BaseException] = None) -> None:
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    def subscribe(self) -> "StreamReader":
+        reader = StreamReader(self)
+        self._readers.append(reader)
+        return reader
+
+    async def _next(self, reader: "StreamReader") -> Any:
+        async with self._changed:
+            await self._changed.wait_for(lambda: reader.position < len(self.items) or self.done)
+            if reader.position < len(self.items):
+                item = self.items[reader.position]
+                reader.position += 1
+                # The producer may be waiting for this reader
+                self._changed.notify_all()
+                return item
+        if self.error is not None:
+            raise self.error
+        raise StopAsyncIteration
+
+    async def _unsubscribe(self, reader: "StreamReader") -> None:
+        async with self._changed:
+            if reader in self._readers:
+                self._readers.remove(reader)
+            self._changed.notify_all()
+
+class StreamReader:
+    """Async iterator over the items of a ResultStream, close() it when stopping early."""
+
+    def __init__(self, stream: ResultStream):
+        self.stream = stream
+        self.position = 0
+
+    def __aiter__(self) -> "StreamReader":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self.stream._next(self)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        await self.stream._unsubscribe(self)
@@ -0,0 +1,80 @@
+# File: tool4ai/core/graph/sub_query_registry.py
+
+import asyncio
+import copy
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from .plan_optimizer import sub_query_key
+
+class SubQueryRegistry:
+    """
+    Sub-query results shared by the graphs of a session. When the execution strategies of
+    concurrent graphs share a registry, a sub-query that calls the same tool for the same
+    normalized task, on the same dependency results, runs once: the first graph to reach it runs
+    it and the others wait for its tool results. Only successful results are shared, and the
+    last `max_entries` of them are kept for graphs that reach the sub-query later.
+
+    The memory of a graph is not part of the key, only share a registry between graphs whose
+    tasks are self-contained. Strategies that share a registry should share their blob store too.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Args:
+            max_entries (int): Number of finished results kept.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._results: "OrderedDict[str, Any]" = OrderedDict()
+
+    @staticmethod
+    def key(graph, index: int) -> str:
+        sub_query = graph.sub_queries[index]
+        parents = []
+        for dependency in sub_query.get_dependencies():
+            parent = graph.sub_queries.get(dependency.index)
+            parents.append((dependency.attr or "", parent.result if parent is not None else None))
+        data = json.dumps(sub_query_key(sub_query, tuple(parents)), default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    async def run(
+        self, key: str, produce: Callable[[], Awaitable[Any]], shareable: Callable[[Any], bool] = lambda result: True
+    ) -> Tuple[Any, bool]:
+        """
+        The result of `produce()` for `key`, produced once for all callers. A result that is not
+        `shareable` is only returned to the caller that produced it, waiting callers then
+        produce their own.
+
+        Returns:
+            The result, and whether it was produced by another caller.
+        """
+        while True:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._results[key]), True
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            if await asyncio.shield(pending):
+                continue
+
+        pending = self._pending[key] = asyncio.get_running_loop().create_future()
+        shared = False
+        try:
+            result = await produce()
+            if shareable(result):
+                self._results[key] = copy.deepcopy(result)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+                shared = True
+            return result, False
+        finally:
+            del self._pending[key]
+            pending.set_result(shared)
+
+    def clear(self) -> None:
+        self._results.clear()
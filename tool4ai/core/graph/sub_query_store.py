@@ -0,0 +1,318 @@
+# File: tool4ai/core/graph/sub_query_store.py
+
+import copy
+import numpy as np
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from ..models import SubQuery
+
+# Status codes of the status column, statuses outside this list get codes as they appear
+STATUSES = ("pending", "success", "failed", "human", "partial", "error")
+_MAX_STATUSES = 64
+_FIELDS = tuple(SubQuery.model_fields)
+_DEFAULTS = SubQuery.model_construct(sub_query="", task="").model_dump()
+del _DEFAULTS["sub_query"], _DEFAULTS["task"]
+# Fields the order caches depend on besides the columns
+_STRUCTURE_FIELDS = frozenset(("dependent_on", "dependencies"))
+
+def _non_default(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in data.items() if name in _FIELDS and _DEFAULTS.get(name, ...) != value}
+
+class SubQueryStore(MutableMapping):
+    """
+    Sub-queries of a graph, by index. Status, tool and actionable flags live in NumPy
+    columns, with a running count per status, so status queries never touch the sub-queries.
+    Sub-queries loaded from storage are kept as compact rows holding their non-default fields,
+    and only become SubQuery objects when they are accessed. Sub-queries are changed through
+    set_fields(): the store does not see assignments made to the sub-query objects, so neither
+    its columns nor the next checkpoint would include them.
+    """
+
+    def __init__(self, sub_queries: Optional[Dict[int, SubQuery]] = None, capacity: int = 16):
+        self._slots: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._objects: Dict[int, SubQuery] = {}
+        self._statuses: List[str] = list(STATUSES)
+        self._status_codes = {status: code for code, status in enumerate(self._statuses)}
+        self._tools: List[str] = []
+        self._tool_ids: Dict[str, int] = {}
+        self._status = np.full(capacity, -1, dtype=np.int8)
+        self._tool = np.full(capacity, -1, dtype=np.int32)
+        self._actionable = np.zeros(capacity, dtype=bool)
+        self._index = np.full(capacity, -1, dtype=np.int64)
+        self._counts = np.zeros(_MAX_STATUSES, dtype=np.int64)
+        # Bumped whenever a sub-query is added or removed, or its tool, dependency or actionable flag changes
+        self.version = 0
+        # Indices set, changed or removed since the last pop_changed()
+        self._changed: Set[int] = set()
+        for index, sub_query in (sub_queries or {}).items():
+            self[index] = sub_query
+
+    @classmethod
+    def from_dicts(cls, items: Dict[int, Dict[str, Any]], trusted: bool = False) -> "SubQueryStore":
+        store = cls(capacity=max(16, len(items)))
+        for index, data in items.items():
+            store.set_row(index, data, trusted)
+        return store
+
+    # Columns
+
+    def _status_code(self, status: Optional[str]) -> int:
+        code = self._status_codes.get(status)
+        if code is None:
+            if len(self._statuses) >= _MAX_STATUSES:
+                raise ValueError(f"Too many distinct sub-query statuses, cannot add {status!r}")
+            code = self._status_codes[status] = len(self._statuses)
+            self._statuses.append(status)
+        return code
+
+    def _tool_id(self, tool: Optional[str]) -> int:
+        if not tool:
+            return -1
+        tool_id = self._tool_ids.get(tool)
+        if tool_id is None:
+            tool_id = self._tool_ids[tool] = len(self._tools)
+            self._tools.append(tool)
+        return tool_id
+
+    def _slot(self, index: int) -> int:
+        slot = self._slots.get(index)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._slots)
+            if slot >= len(self._status):
+                self._grow()
+        self._slots[index] = slot
+        self._index[slot] = index
+        return slot
+
+    def _grow(self) -> None:
+        size = len(self._status)
+        for name, fill in (("_status", -1), ("_tool", -1), ("_actionable", False), ("_index", -1)):
+            column = getattr(self, name)
+            grown = np.full(size * 2, fill, dtype=column.dtype)
+            grown[:size] = column
+            setattr(self, name, grown)
+
+    def _set_columns(self, index: int, status, tool, actionable) -> None:
+        slot = self._slot(index)
+        previous = self._status[slot]
+        if previous >= 0:
+            self._counts[previous] -= 1
+        code = self._status_code(status)
+        self._status[slot] = code
+        self._counts[code] += 1
+        tool_id = self._tool_id(tool)
+        actionable = bool(actionable)
+        if previous < 0 or self._tool[slot] != tool_id or self._actionable[slot] != actionable:
+            self.version += 1
+        self._tool[slot] = tool_id
+        self._actionable[slot] = actionable
+
+    def _field(self, index: int, name: str) -> Any:
+        if index in self._objects:
+            return getattr(self._objects[index], name)
+        return self._rows[index].get(name, _DEFAULTS.get(name))
+
+    # Rows and objects
+
+    def set_row(self, index: int, data: Dict[str, Any], trusted: bool = False) -> None:
+        """Store a sub-query from its dumped fields without building a SubQuery."""
+        if not trusted:
+            # Validated once, kept as a row
+            data = SubQuery(**data).model_dump()
+        row = _non_default(data)
+        self._detach(index)
+        self._rows[index] = row
+        self._changed.add(index)
+        self._set_columns(
+            index,
+            row.get("status", _DEFAULTS["status"]),
+            row.get("tool"),
+            row.get("actionable", _DEFAULTS["actionable"]),
+        )
+
+    def set_fields(self, index: int, **fields: Any) -> SubQuery:
+        """
+        Set fields of a sub-query and update its columns.
+
+        Args:
+            index (int): Index of the sub-query.
+            **fields: The fields to set, by name.
+
+        Returns:
+            SubQuery: The updated sub-query.
+        """
+        sub_query = self[index]
+        for name, value in fields.items():
+            setattr(sub_query, name, value)
+        if not _STRUCTURE_FIELDS.isdisjoint(fields):
+            # Not a column, but the order caches are keyed on the version
+            self.version += 1
+        self._set_columns(index, sub_query.status, sub_query.tool, sub_query.actionable)
+        self._changed.add(index)
+        return sub_query
+
+    def pop_changed(self) -> Set[int]:
+        """The indices set, changed or removed since the last call."""
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def mark_changed(self, indices: Iterable[int]) -> None:
+        """Report `indices` by the next pop_changed() again, e.g. after a failed save."""
+        self._changed.update(indices)
+
+    def _detach(self, index: int) -> None:
+        self._objects.pop(index, None)
+        self._rows.pop(index, None)
+
+    def __getitem__(self, index: int) -> SubQuery:
+        sub_query = self._objects.get(index)
+        if sub_query is not None:
+            return sub_query
+        row = self._rows.pop(index)
+        fields = copy.deepcopy(_DEFAULTS)
+        fields.update(row)
+        sub_query = SubQuery.model_construct(**fields)
+        self._objects[index] = sub_query
+        return sub_query
+
+    def __setitem__(self, index: int, sub_query: SubQuery) -> None:
+        self._detach(index)
+        self._objects[index] = sub_query
+        self._changed.add(index)
+        self._set_columns(index, sub_query.status, sub_query.tool, sub_query.actionable)
+
+    def __delitem__(self, index: int) -> None:
+        if index not in self._slots:
+            raise KeyError(index)
+        self._detach(index)
+        slot = self._slots.pop(index)
+        self._counts[self._status[slot]] -= 1
+        self._status[slot] = -1
+        self._tool[slot] = -1
+        self._actionable[slot] = False
+        self._index[slot] = -1
+        self._free.append(slot)
+        self._changed.add(index)
+        self.version += 1
+
+    def __contains__(self, index: object) -> bool:
+        return index in self._slots
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._slots))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __repr__(self) -> str:
+        return f"SubQueryStore({len(self)} sub-queries, {len(self._objects)} materialized)"
+
+    def dump(self, index: int, compact: bool = False) -> Dict[str, Any]:
+        """
+        The fields of a sub-query, without materializing it.
+
+        Args:
+            compact (bool): Leave out the fields that have their default value, except the index.
+        """
+        if index in self._objects:
+            fields = self._objects[index].model_dump()
+            return {"index": index, **_non_default(fields)} if compact else fields
+        if compact:
+            return {"index": index, **copy.deepcopy(self._rows[index])}
+        fields = copy.deepcopy(_DEFAULTS)
+        fields.update(copy.deepcopy(self._rows[index]))
+        return fields
+
+    def field_values(self, name: str) -> Iterator[Any]:
+        """The values of one field for every sub-query, without materializing them."""
+        for index in self._slots:
+            yield self._field(index, name)
+
+    def release(self, indices: Optional[Iterable[int]] = None) -> None:
+        """
+        Turn materialized sub-queries back into compact rows. Only for sub-queries nobody holds
+        anymore, changes made afterward through a released object are not stored.
+        """
+        changed = set(self._changed)
+        for index in list(self._objects if indices is None else indices):
+            sub_query = self._objects.get(index)
+            if sub_query is not None:
+                self.set_row(index, sub_query.model_dump(), trusted=True)
+        # Same fields, nothing to checkpoint
+        self._changed = changed
+
+    # Column queries
+
+    def _indices(self, mask: np.ndarray) -> List[int]:
+        size = len(self._slots) + len(self._free)
+        return self._index[:size][mask[:size]].tolist()
+
+    def status_counts(self) -> Dict[str, int]:
+        return {status: int(self._counts[code]) for code, status in enumerate(self._statuses) if self._counts[code]}
+
+    def count(self, status: str) -> int:
+        code = self._status_codes.get(status)
+        return int(self._counts[code]) if code is not None else 0
+
+    def indices_with_status(self, status: str) -> List[int]:
+        code = self._status_codes.get(status)
+        if code is None or not self._counts[code]:
+            return []
+        return self._indices(self._status == code)
+
+    def indices_with_tool(self, has_tool: bool = True) -> List[int]:
+        used = self._status >= 0
+        with_tool = self._tool >= 0
+        return self._indices(used & (with_tool if has_tool else ~with_tool))
+
+    def indices_not_actionable(self) -> List[int]:
+        return self._indices((self._status >= 0) & ~self._actionable)
+
+    def nbytes(self) -> int:
+        """Memory used by the columns."""
+        return sum(column.nbytes for column in (self._status, self._tool, self._actionable, self._index, self._counts))
+
+class ResultStore(MutableMapping):
+    """
+    Results of a graph, by key, recording the keys set or removed since the last pop_changed().
+    A result is replaced to change it, edits made inside a result are not seen.
+    """
+
+    def __init__(self, results: Optional[Dict[Any, Any]] = None):
+        self._results: Dict[Any, Any] = dict(results or {})
+        self._changed: Set[Any] = set(self._results)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._results[key]
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._results[key] = value
+        self._changed.add(key)
+
+    def __delitem__(self, key: Any) -> None:
+        del self._results[key]
+        self._changed.add(key)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._results)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __repr__(self) -> str:
+        return f"ResultStore({self._results!r})"
+
+    def pop_changed(self) -> Set[Any]:
+        """The keys set or removed since the last call."""
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def mark_changed(self, keys: Iterable[Any]) -> None:
+        """Report `keys` by the next pop_changed() again, e.g. after a failed save."""
+        self._changed.update(keys)
@@ -1,13 +1,21 @@
+import copy
 import uuid
-from typing import Dict, List, Any, Callable, Set, Optional
-from collections import deque
+import json
+import time
+import logging
+from typing import Dict, List, Any, AsyncIterator, Callable, Set, Optional, Tuple
 import asyncio
-from ..models import SubQuery, SubQueryResponse, ExecutionResult, ExecutionStatus
-from ...storages import BaseStorage, JSONStorage
+from ..models import EventType, ExecutionEvent, SubQuery, SubQueryResponse, ExecutionResult, ExecutionStatus
+from ...storages import BaseStorage, JSONStorage, ExecutionJournal
 from ..toolkit import Toolkit
 from .execution_strategy import DefaultExecutionStrategy
 from .visualization import GraphVisualizer
 from .result_generator import ResultGenerator
+from .sub_query_store import ResultStore, SubQueryStore
+from .dependency_index import DependencyIndex
+from .plan_optimizer import merge_duplicate_sub_queries
+
+logger = logging.getLogger(__name__)
 
 
 class ToolDependencyGraph:
@@ -18,17 +26,30 @@ class ToolDependencyGraph:
         visualizer: Optional[GraphVisualizer] = None,
         result_generator: Optional[ResultGenerator] = None,
         router: Any = None,
+        incremental_checkpoints: bool = False,
+        compact_every: int = 20,
+        tenant: Optional[str] = None,
+        merge_duplicates: bool = False,
     ):
         self.run_id = str(uuid.uuid4())
+        self.tenant = tenant
+        self.created_at = time.time()
+        self.updated_at = self.created_at
         self.router = router
         self.storage = storage or JSONStorage()
         self.execution_strategy = execution_strategy or DefaultExecutionStrategy()
         self.visualizer = visualizer or GraphVisualizer()
         self.result_generator = result_generator or ResultGenerator()
+        # Bumped on every change of the dependency maps or of the sub-query store, the cached ordering is rebuilt after it
+        self._structure_version = 0
+        self._order_cache: Optional[Tuple[Any, DependencyIndex]] = None
         self.sub_queries: Dict[int, SubQuery] = {}
         self.dependency_map: Dict[int, Set[int]] = {}
         self.reverse_dependency_map: Dict[int, Set[int]] = {}
-        self.results: Dict[int, Any] = {}
+        # Duplicate sub-queries removed by build_dependency_structure, mapped to the index kept
+        self.merge_duplicates = merge_duplicates
+        self.merged_sub_queries: Dict[int, int] = {}
+        self.results: Dict[Any, Any] = {}
         self.token_usage = {
             "prompt_tokens": 0,
             "completion_tokens": 0,
@@ -36,67 +57,119 @@ class ToolDependencyGraph:
         }
         self.level_status: Dict[int, str] = {}
         self.graph_status: str = "pending"
+        # Incremental checkpoints: save() appends only what changed since the last save and
+        # rewrites a full snapshot every `compact_every` deltas
+        self.incremental_checkpoints = incremental_checkpoints
+        self.compact_every = compact_every
+        self._checkpoint_seq = 0
+        self._deltas_since_snapshot = 0
+        self._saved_state: Optional[Dict[str, Any]] = None
+        # Set while a paused graph is saved by hibernate()
+        self._hibernation: Optional[Dict[str, Any]] = None
+
+    @property
+    def sub_queries(self) -> SubQueryStore:
+        return self._sub_queries
+
+    @sub_queries.setter
+    def sub_queries(self, sub_queries: Dict[int, SubQuery]) -> None:
+        # Any mapping assigned to the graph is kept in a column store
+        self._sub_queries = sub_queries if isinstance(sub_queries, SubQueryStore) else SubQueryStore(sub_queries)
+        self._structure_version += 1
+
+    @property
+    def results(self) -> ResultStore:
+        return self._results
+
+    @results.setter
+    def results(self, results: Dict[Any, Any]) -> None:
+        # Records the changed keys for incremental checkpoints
+        self._results = results if isinstance(results, ResultStore) else ResultStore(results)
+
+    # The dependency maps are replaced, not edited in place, outside of the graph's own methods:
+    # assigning them invalidates the cached ordering, editing them does not
+
+    @property
+    def dependency_map(self) -> Dict[int, Set[int]]:
+        return self._dependency_map
+
+    @dependency_map.setter
+    def dependency_map(self, dependency_map: Dict[int, Set[int]]) -> None:
+        self._dependency_map = dependency_map
+        self._structure_version += 1
+
+    @property
+    def reverse_dependency_map(self) -> Dict[int, Set[int]]:
+        return self._reverse_dependency_map
+
+    @reverse_dependency_map.setter
+    def reverse_dependency_map(self, reverse_dependency_map: Dict[int, Set[int]]) -> None:
+        self._reverse_dependency_map = reverse_dependency_map
+        self._structure_version += 1
 
     def build_dependency_structure(self, sub_query_response: SubQueryResponse):
         for sub_query in sub_query_response.sub_queries:
-            self.sub_queries[sub_query.index] = sub_query
             sub_query.actionable = sub_query.tool is not None
-            if sub_query.dependent_on >= 0 and sub_query.tool:
+            self.sub_queries[sub_query.index] = sub_query
+            if not sub_query.tool:
+                continue
+            for dependency in sub_query.get_dependencies():
                 if sub_query.index not in self.dependency_map:
                     self.dependency_map[sub_query.index] = set()
-                self.dependency_map[sub_query.index].add(sub_query.dependent_on)
+                self.dependency_map[sub_query.index].add(dependency.index)
 
-                if sub_query.dependent_on not in self.reverse_dependency_map:
-                    self.reverse_dependency_map[sub_query.dependent_on] = set()
-                self.reverse_dependency_map[sub_query.dependent_on].add(sub_query.index)
+                if dependency.index not in self.reverse_dependency_map:
+                    self.reverse_dependency_map[dependency.index] = set()
+                self.reverse_dependency_map[dependency.index].add(sub_query.index)
+        self._structure_version += 1
+        if self.merge_duplicates:
+            merge_duplicate_sub_queries(self)
 
     @property
     def non_actionable_sub_queries(self) -> List[int]:
-        return [index for index, sq in self.sub_queries.items() if not sq.tool]
+        return self.sub_queries.indices_with_tool(False)
 
     def get_sub_queries_by_status(self, status: ExecutionStatus) -> List[int]:
-        return [index for index, sq in self.sub_queries.items() if sq.status == status]
+        return self.sub_queries.indices_with_status(status)
+
+    def status_counts(self) -> Dict[str, int]:
+        """Number of sub-queries per status, kept up to date as statuses change."""
+        return self.sub_queries.status_counts()
+
+    def _dependency_index(self) -> DependencyIndex:
+        key = (self._structure_version, self.sub_queries.version)
+        if self._order_cache is None or self._order_cache[0] != key:
+            # Only sub-queries with a tool are executed, a dependency on any other one is dangling
+            index = DependencyIndex(self.sub_queries.indices_with_tool(), self.dependency_map)
+            previous = self._order_cache[1].unordered if self._order_cache is not None else []
+            if index.unordered and index.unordered != previous:
+                logger.warning(
+                    "Sub-queries left out of the execution order: %s (dangling dependencies: %s, cycles: %s)",
+                    index.unordered, index.dangling, index.cyclic,
+                )
+            self._order_cache = (key, index)
+        return self._order_cache[1]
 
     def get_execution_order(self, add_non_actionable=False) -> List[List[int]]:
-        execution_order: List[List[int]] = []
-        visited: Set[int] = set()
-        queue = deque()
-
-        root_nodes = set(
-            index
-            for index, sq in self.sub_queries.items()
-            if sq.tool and index not in self.dependency_map
-        )
-        non_tool_nodes = set(
-            index for index, sq in self.sub_queries.items() if not sq.actionable
-        )
-        queue.extend(root_nodes)
-
-        while queue:
-            level_size = len(queue)
-            current_level = []
-
-            for _ in range(level_size):
-                node = queue.popleft()
-                if node not in visited:
-                    visited.add(node)
-                    current_level.append(node)
-
-                    if node in self.reverse_dependency_map:
-                        for child in self.reverse_dependency_map[node]:
-                            if child not in visited and all(
-                                dep in visited
-                                for dep in self.dependency_map.get(child, set())
-                            ):
-                                queue.append(child)
-
-            if current_level:
-                execution_order.append(current_level)
-
-        if non_tool_nodes and add_non_actionable:
-            execution_order.append(list(non_tool_nodes))
+        # The layering is cached until the sub-queries or dependencies change
+        execution_order = [list(level) for level in self._dependency_index().levels]
+        if add_non_actionable:
+            non_tool_nodes = self.sub_queries.indices_not_actionable()
+            if non_tool_nodes:
+                execution_order.append(non_tool_nodes)
         return execution_order
 
+    def dependency_issues(self) -> Dict[str, Any]:
+        """
+        Sub-queries that can never be executed.
+
+        Returns:
+            Dict[str, Any]: "dangling" maps sub-queries to the dependencies they wait on that are
+                missing or have no tool, "cycles" lists sub-queries on or behind a dependency cycle.
+        """
+        index = self._dependency_index()
+        return {"dangling": dict(index.dangling), "cycles": list(index.cyclic)}
+
     def update_graph_status(self):
         if all(status == "success" for status in self.level_status.values()):
             self.graph_status = "success"
@@ -130,9 +203,38 @@ class ToolDependencyGraph:
             generate_interim_messages = generate_interim_messages,
             add_human_failed_memory = add_human_failed_memory,
             resume_from_level = resume_from_level,
+            toolkit = toolkit,
             **kwargs,
         )
 
+    async def execute_stream(self, *args, **kwargs) -> AsyncIterator[ExecutionEvent]:
+        """
+        Execute the graph like execute(), yielding its events as they happen. The last event is
+        a RESULT event carrying the ExecutionResult. Closing the iterator early cancels the run.
+        """
+        events: asyncio.Queue = asyncio.Queue()
+        self.execution_strategy.add_listener(self.run_id, events.put_nowait)
+        run = asyncio.ensure_future(self.execute(*args, **kwargs))
+        run.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            result = await run
+            yield ExecutionEvent(
+                type=EventType.RESULT,
+                run_id=self.run_id,
+                data=result.model_dump(mode="json", include={"status", "message", "issue", "help", "pasued_level", "error_info"}),
+                result=result,
+            )
+        finally:
+            self.execution_strategy.remove_listener(self.run_id)
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+
     async def _execute(
         self,
         tool_functions: Dict[str, Callable],
@@ -184,6 +286,7 @@ class ToolDependencyGraph:
             generate_sub_queries = generate_sub_queries,
             classify_for_new_discussion = classify_for_new_discussion,
             last_result = last_result,
+            toolkit = toolkit,
         )
     
     async def _resume_execution(
@@ -222,7 +325,69 @@ class ToolDependencyGraph:
     def generate_interactive_html(self, output_file: str = "interactive_graph.html"):
         self.visualizer.generate_interactive_html(self, output_file)
 
+    def _checkpoint_state(self) -> Dict[str, Any]:
+        # Sub-queries and results report their changes, only the maps are compared as strings
+        return {
+            "dependency_map": json.dumps({str(k): sorted(v) for k, v in self.dependency_map.items()}, sort_keys=True),
+            "reverse_dependency_map": json.dumps({str(k): sorted(v) for k, v in self.reverse_dependency_map.items()}, sort_keys=True),
+            "merged_sub_queries": json.dumps({str(k): v for k, v in self.merged_sub_queries.items()}, sort_keys=True),
+        }
+
     async def save(self) -> None:
+        state = self._checkpoint_state() if self.incremental_checkpoints else None
+        self._checkpoint_seq += 1
+        self.updated_at = time.time()
+        # Taken before anything is awaited, changes made during the save go to the next one
+        changed_sub_queries = self.sub_queries.pop_changed()
+        changed_results = self.results.pop_changed()
+
+        try:
+            if (
+                state is None
+                or self._saved_state is None
+                or self._deltas_since_snapshot >= self.compact_every
+            ):
+                await self._save_snapshot()
+            else:
+                await self._append_delta(state, changed_sub_queries, changed_results)
+        except BaseException:
+            self.sub_queries.mark_changed(changed_sub_queries)
+            self.results.mark_changed(changed_results)
+            raise
+        self._saved_state = state
+
+    async def _append_delta(self, state: Dict[str, Any], changed_sub_queries: Set[int], changed_results: Set[Any]) -> None:
+        previous = self._saved_state
+        delta = {
+            "seq": self._checkpoint_seq,
+            "sub_queries": {
+                str(idx): self.sub_queries.dump(idx, compact=True) for idx in changed_sub_queries if idx in self.sub_queries
+            },
+            "removed_sub_queries": [str(idx) for idx in changed_sub_queries if idx not in self.sub_queries],
+            "results": {
+                str(key): copy.deepcopy(self.results[key]) for key in changed_results if key in self.results
+            },
+            "removed_results": [str(key) for key in changed_results if key not in self.results],
+            "token_usage": self.token_usage,
+            "level_status": self.level_status,
+            "graph_status": self.graph_status,
+            "updated_at": self.updated_at,
+        }
+        for key in ("dependency_map", "reverse_dependency_map", "merged_sub_queries"):
+            if previous.get(key) != state[key]:
+                delta[key] = json.loads(state[key])
+
+        await self.storage.append_delta(self.run_id, delta)
+        self._deltas_since_snapshot += 1
+
+    async def _save_snapshot(self) -> None:
+        await self.storage.save(self.run_id, self.to_dict())
+        # Deltas are folded into the snapshot, load() also skips any that survive a crash here
+        if self._deltas_since_snapshot:
+            await self.storage.clear_deltas(self.run_id)
+            self._deltas_since_snapshot = 0
+
+    def to_dict(self) -> Dict[str, Any]:
         # conver self.dependency_map and self.reverse_dependency_map to list
         list_dependency_map = {
             key: list(value) for key, value in self.dependency_map.items()
@@ -232,17 +397,26 @@ class ToolDependencyGraph:
         }
         data = {
             "run_id": self.run_id,
+            "tenant": self.tenant,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "checkpoint_seq": self._checkpoint_seq,
+            # Fields left at their default are not stored, loading restores them
             "sub_queries": {
-                idx: sq.model_dump() for idx, sq in self.sub_queries.items()
+                idx: self.sub_queries.dump(idx, compact=True) for idx in self.sub_queries
             },
             "dependency_map": list_dependency_map,
             "reverse_dependency_map": list_reverse_dependency_map,
-            "results": self.results,
+            "results": dict(self.results),
             "token_usage": self.token_usage,
             "level_status": self.level_status,
             "graph_status": self.graph_status,
         }
-        await self.storage.save(self.run_id, data)
+        if self.merged_sub_queries:
+            data["merged_sub_queries"] = self.merged_sub_queries
+        if self._hibernation is not None:
+            data["hibernation"] = self._hibernation
+        return data
 
     def save_sync(self) -> None:
         # Create a new event loop
@@ -258,17 +432,63 @@ class ToolDependencyGraph:
 
     @classmethod
     async def load(
-        cls, run_id: str, storage: Optional[BaseStorage] = None
+        cls, run_id: str, storage: Optional[BaseStorage] = None, trusted: bool = False
     ) -> "ToolDependencyGraph":
+        """
+        Load a saved graph and replay its newer deltas.
+
+        Args:
+            trusted (bool): Skip validation of the stored sub-queries. Only for data this library
+                wrote itself, a malformed record is not detected.
+        """
         storage = storage or JSONStorage()
         data = await storage.load(run_id)
 
-        graph = cls(storage=storage)
+        graph = cls.from_dict(data, storage=storage, trusted=trusted)
+
+        deltas = await storage.load_deltas(run_id)
+        for delta in deltas:
+            if delta["seq"] > graph._checkpoint_seq:
+                graph._apply_delta(delta, trusted=trusted)
+        graph._deltas_since_snapshot = len(deltas)
+
+        return graph
+
+    @classmethod
+    async def load_many(
+        cls, run_ids: List[str], storage: Optional[BaseStorage] = None, trusted: bool = False
+    ) -> Dict[str, "ToolDependencyGraph"]:
+        """
+        Load several saved graphs with one bulk read of the snapshots and one of the deltas.
+        Runs that are not found are left out of the result.
+        """
+        storage = storage or JSONStorage()
+        snapshots = await storage.load_many(run_ids)
+        deltas = await storage.load_deltas_many(list(snapshots))
+
+        graphs = {}
+        for run_id, data in snapshots.items():
+            graph = cls.from_dict(data, storage=storage, trusted=trusted)
+            for delta in deltas.get(run_id, []):
+                if delta["seq"] > graph._checkpoint_seq:
+                    graph._apply_delta(delta, trusted=trusted)
+            graph._deltas_since_snapshot = len(deltas.get(run_id, []))
+            graphs[run_id] = graph
+        return graphs
+
+    @classmethod
+    def from_dict(
+        cls, data: Dict[str, Any], storage: Optional[BaseStorage] = None, trusted: bool = False, **kwargs
+    ) -> "ToolDependencyGraph":
+        graph = cls(storage=storage, **kwargs)
         graph.run_id = data["run_id"]
-        graph.sub_queries = {
-            int(idx): SubQuery(**sq_data)
-            for idx, sq_data in data["sub_queries"].items()
-        }
+        graph.tenant = data.get("tenant")
+        graph.created_at = data.get("created_at", graph.created_at)
+        graph.updated_at = data.get("updated_at", graph.created_at)
+        # Kept as compact rows, a sub-query object is only built when it is accessed
+        graph.sub_queries = SubQueryStore.from_dicts(
+            {int(idx): sq_data for idx, sq_data in data["sub_queries"].items()}, trusted=trusted
+        )
 
         # Convert data["dependency_map"] and data["reverse_dependency_map"] from list to set()
         dependency_map = {
@@ -282,14 +502,39 @@ class ToolDependencyGraph:
         graph.reverse_dependency_map = reverse_dependency_map
         graph.results = data["results"]
         graph.token_usage = data["token_usage"]
-        graph.level_status = data["level_status"]
+        # JSON turns the level numbers into strings
+        graph.level_status = {int(level): status for level, status in data["level_status"].items()}
         graph.graph_status = data["graph_status"]
-
+        graph._checkpoint_seq = data.get("checkpoint_seq", 0)
+        graph._hibernation = data.get("hibernation")
+        graph.merged_sub_queries = {int(idx): kept for idx, kept in data.get("merged_sub_queries", {}).items()}
         return graph
 
+    def _apply_delta(self, delta: Dict[str, Any], trusted: bool = False) -> None:
+        for idx, sq_data in delta["sub_queries"].items():
+            self.sub_queries.set_row(int(idx), sq_data, trusted=trusted)
+        for idx in delta["removed_sub_queries"]:
+            self.sub_queries.pop(int(idx), None)
+        if "dependency_map" in delta:
+            self.dependency_map = {int(key): set(value) for key, value in delta["dependency_map"].items()}
+        if "reverse_dependency_map" in delta:
+            self.reverse_dependency_map = {
+                int(key): set(value) for key, value in delta["reverse_dependency_map"].items()
+            }
+        if "merged_sub_queries" in delta:
+            self.merged_sub_queries = {int(idx): kept for idx, kept in delta["merged_sub_queries"].items()}
+        self.results.update(delta["results"])
+        for key in delta["removed_results"]:
+            self.results.pop(key, None)
+        self.token_usage = delta["token_usage"]
+        self.level_status = {int(level): status for level, status in delta["level_status"].items()}
+        self.graph_status = delta["graph_status"]
+        self.updated_at = delta.get("updated_at", self.updated_at)
+        self._checkpoint_seq = delta["seq"]
+
     @classmethod
     def load_sync(
-        cls, run_id: str, storage: Optional[BaseStorage] = None
+        cls, run_id: str, storage: Optional[BaseStorage] = None, trusted: bool = False
     ) -> "ToolDependencyGraph":
         # Create a new event loop
         loop = asyncio.new_event_loop()
@@ -297,12 +542,131 @@ class ToolDependencyGraph:
         
         try:
             # Run the async load function until it completes
-            graph = loop.run_until_complete(cls.load(run_id, storage))
+            graph = loop.run_until_complete(cls.load(run_id, storage, trusted))
             return graph
         finally:
             # Close the event loop
             loop.close()
 
+    @classmethod
+    async def recover(
+        cls,
+        run_id: str,
+        journal: ExecutionJournal,
+        storage: Optional[BaseStorage] = None,
+        execution_strategy: Optional[DefaultExecutionStrategy] = None,
+    ) -> "ToolDependencyGraph":
+        """
+        Rebuild a graph after a crash from its last checkpoint (or the journaled plan when it was
+        never saved) and the sub-queries finished since. The returned graph executes with the
+        journal, so tool calls that completed before the crash are not called again.
+        """
+        storage = storage or JSONStorage()
+        execution_strategy = execution_strategy or DefaultExecutionStrategy()
+        execution_strategy.journal = journal
+        entries = await journal.entries(run_id)
+
+        try:
+            graph = await cls.load(run_id, storage)
+            graph.execution_strategy = execution_strategy
+        except KeyError:
+            plan = next((entry["plan"] for entry in entries if entry["type"] == "plan"), None)
+            if plan is None:
+                raise KeyError(f"No checkpoint or journal found for run_id: {run_id}")
+            graph = cls.from_dict(plan, storage=storage, execution_strategy=execution_strategy)
+
+        for entry in entries:
+            if entry["type"] != "sub_query_finished":
+                continue
+            sub_query = SubQuery(**entry["sub_query"])
+            current = graph.sub_queries.get(sub_query.index)
+            # Never roll back a sub-query that already succeeded in the checkpoint
+            if current is None or current.status != "success":
+                graph.sub_queries[sub_query.index] = sub_query
+        return graph
+
+    async def hibernate(self, last_result: ExecutionResult) -> None:
+        """
+        Save a paused graph, with the state its execution strategy needs to resume it, and release
+        both from memory. The graph object is emptied and should be dropped, rehydrate() returns
+        a graph ready for resume_execution().
+
+        Args:
+            last_result (ExecutionResult): The result of the execution that paused.
+        """
+        strategy_state = self.execution_strategy.get_state()
+        context = strategy_state.get("last_context") or {}
+        attention = last_result.sub_query_need_attention
+        self._hibernation = {
+            "strategy": strategy_state,
+            "last_result": {
+                "status": ExecutionStatus(last_result.status).value,
+                "message": last_result.message,
+                "help": last_result.help,
+                "issue": last_result.issue,
+                "pasued_level": last_result.pasued_level,
+                "error_info": last_result.error_info,
+                "sub_query_need_attention": attention.index if attention is not None else None,
+                # Usually the context memory itself, stored once
+                "memory": None if context.get("memory") == last_result.memory else last_result.memory,
+            },
+        }
+        try:
+            # A full snapshot, rehydrating does not replay deltas
+            await self._save_snapshot()
+            self._saved_state = self._checkpoint_state() if self.incremental_checkpoints else None
+        finally:
+            self._hibernation = None
+
+        self.execution_strategy.clear_state()
+        self.reset()
+
+    @classmethod
+    async def rehydrate(
+        cls,
+        run_id: str,
+        storage: Optional[BaseStorage] = None,
+        execution_strategy: Optional[DefaultExecutionStrategy] = None,
+    ) -> Tuple["ToolDependencyGraph", ExecutionResult]:
+        """
+        Load a graph saved by hibernate() and restore its execution strategy.
+
+        Returns:
+            Tuple[ToolDependencyGraph, ExecutionResult]: The graph and the result to pass to
+                resume_execution() as `last_result`, the context is the strategy's `last_context`.
+        """
+        # The snapshot was written by hibernate(), it does not need validation
+        graph = await cls.load(run_id, storage, trusted=True)
+        if execution_strategy is not None:
+            graph.execution_strategy = execution_strategy
+        state, graph._hibernation = graph._hibernation, None
+        if state is None:
+            raise KeyError(f"Run {run_id} is not hibernated")
+
+        strategy_state = state["strategy"]
+        context = strategy_state.get("last_context")
+        graph.execution_strategy.set_state(strategy_state)
+
+        result = state["last_result"]
+        memory = result["memory"]
+        if memory is None:
+            memory = context.get("memory", []) if context else []
+        index = result["sub_query_need_attention"]
+        # Constructed without validation, which would copy the memory and the sub-queries
+        last_result = ExecutionResult.model_construct(
+            status=ExecutionStatus(result["status"]),
+            message=result["message"],
+            help=result["help"],
+            issue=result["issue"],
+            memory=memory,
+            sub_queries=list(graph.sub_queries.values()),
+            # The very object of the graph, resuming appends the user input to its memory
+            sub_query_need_attention=graph.sub_queries.get(index) if index is not None else None,
+            pasued_level=result["pasued_level"],
+            error_info=result["error_info"],
+        )
+        return graph, last_result
+
     async def delete(self) -> None:
         await self.storage.delete(self.run_id)
 
@@ -310,6 +674,7 @@ class ToolDependencyGraph:
         self.sub_queries = {}
         self.dependency_map = {}
         self.reverse_dependency_map = {}
+        self.merged_sub_queries = {}
         self.results = {}
         self.token_usage = {
             "prompt_tokens": 0,
@@ -331,4 +696,4 @@ class ToolDependencyGraph:
         return self.token_usage
 
     def get_results(self):
-        return self.results
+        return dict(self.results)
@@ -5,6 +5,11 @@ import importlib.resources
 from typing import Dict, Any
 
 class GraphVisualizer:
+    @staticmethod
+    def _edge_labels(sub_query) -> Dict[int, str]:
+        # The attribute of the sub-query that depends on each parent
+        return {dependency.index: dependency.attr or "" for dependency in sub_query.get_dependencies()}
+
     def visualize(self, graph, output_file: str = "tool_dependency_graph"):
         dot = graphviz.Digraph(comment="Tool Dependency Graph")
         dot.attr(rankdir="LR")  # Left to right layout
@@ -26,10 +31,9 @@ class GraphVisualizer:
 
         # Create edges with labels
         for dependent_index, dependencies in graph.dependency_map.items():
+            labels = self._edge_labels(graph.sub_queries[dependent_index])
             for dependency_index in dependencies:
-                dependent_sub_query = graph.sub_queries[dependent_index]
-                label = dependent_sub_query.dependency_attr
-                dot.edge(str(dependency_index), str(dependent_index), label=label)
+                dot.edge(str(dependency_index), str(dependent_index), label=labels.get(dependency_index, ""))
 
         # Save the graph
         dot.render(output_file, format="png", cleanup=True)
@@ -51,17 +55,19 @@ class GraphVisualizer:
                     "issue": sub_query.issue,
                     "sub_query": sub_query.sub_query,
                     "actionable": bool(sub_query.tool),
+                    "node_type": sub_query.node_type,
                     "arguments": json.dumps(sub_query.arguments) or "{}",
                 }
             })
 
             if index in graph.dependency_map:
+                labels = self._edge_labels(sub_query)
                 for dep_index in graph.dependency_map[index]:
                     edges.append({
                         "data": {
                             "source": str(dep_index),
                             "target": str(index),
-                            "label": graph.sub_queries[index].dependency_attr,
+                            "label": labels.get(dep_index, ""),
                         }
                     })
 
@@ -1,6 +1,10 @@
 from typing import Any, Dict, List, Optional, Union
 from enum import Enum
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, model_validator
+
+class Dependency(BaseModel):
+    index: int
+    attr: Optional[str] = ""
 
 class SubQuery(BaseModel):
     index: int = 0
@@ -10,6 +14,8 @@ class SubQuery(BaseModel):
     other_tools: Optional[List[str]] = Field(default_factory=list)
     dependent_on: int = -1
     dependency_attr: Optional[str] = ""
+    # Every sub-query this one depends on, dependent_on and dependency_attr hold the first one
+    dependencies: Optional[List[Dependency]] = Field(default_factory=list)
     arguments: Optional[Dict[str, Any]] = Field(default_factory=dict)
     tool_missing: Optional[bool] = False
     result: Optional[str] = None
@@ -19,6 +25,33 @@ class SubQuery(BaseModel):
     actionable: Optional[bool] = True
     is_orphan: Optional[bool] = False
     internal_memory: Optional[List[Dict[str, Any]]] = Field(default_factory=list)
+    # "map" calls the tool once per item of the list its first dependency returns under dependency_attr
+    node_type: Optional[str] = "tool"
+    # Tool argument each item is bound to, dependency_attr when None
+    map_argument: Optional[str] = None
+    # Maximum number of concurrent calls of a map node, the execution strategy's default when None
+    map_concurrency: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _mirror_first_dependency(self) -> "SubQuery":
+        if self.dependencies:
+            self.dependent_on = self.dependencies[0].index
+            self.dependency_attr = self.dependencies[0].attr
+        return self
+
+    def get_dependencies(self) -> List[Dependency]:
+        """The dependencies of the sub-query, from the list or from the scalar fields."""
+        if self.dependencies:
+            # Trusted loads build sub-queries without validation, dependencies may still be dicts
+            return [Dependency.model_validate(dependency) for dependency in self.dependencies]
+        if self.dependent_on is not None and self.dependent_on >= 0:
+            return [Dependency(index=self.dependent_on, attr=self.dependency_attr)]
+        return []
+
+    def set_dependencies(self, dependencies: List[Dependency]) -> None:
+        self.dependencies = list(dependencies)
+        self.dependent_on = dependencies[0].index if dependencies else -1
+        self.dependency_attr = dependencies[0].attr if dependencies else ""
 
 class SubQueryResponse(BaseModel):
     sub_queries: List[SubQuery]
@@ -42,4 +75,30 @@ class ExecutionResult(BaseModel):
     sub_queries: List[SubQuery]
     sub_query_need_attention: Optional[SubQuery] = None 
     pasued_level: Optional[int] = None
-    error_info: Optional[Dict[str, Any]] = None
\ No newline at end of file
+    error_info: Optional[Dict[str, Any]] = None
+
+class EventType(str, Enum):
+    NODE_STARTED = "node_started"
+    TOOL_CALL = "tool_call"
+    NODE_FINISHED = "node_finished"
+    LEVEL_FINISHED = "level_finished"
+    INTERIM_TOKEN = "interim_token"
+    INTERIM_MESSAGE = "interim_message"
+    FINAL_TOKEN = "final_token"
+    FINAL_RESPONSE = "final_response"
+    RESULT = "result"
+
+class ExecutionEvent(BaseModel):
+    """
+    A step of a graph execution. `data` only holds JSON values, the RESULT event also carries the
+    ExecutionResult, which is left out of serialization.
+    """
+    type: EventType
+    run_id: str
+    level: Optional[int] = None
+    index: Optional[int] = None
+    data: Dict[str, Any] = Field(default_factory=dict)
+    result: Optional[ExecutionResult] = Field(default=None, exclude=True)
+
+    def to_json(self) -> str:
+        return self.model_dump_json(exclude_none=True)
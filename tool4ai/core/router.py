@@ -8,10 +8,14 @@ from ..core.models import SubQuery, SubQueryResponse
 from ..toolmakers.openai_maker import OpenAIToolMaker
 from .graph.tool_dependency_graph import ToolDependencyGraph
 from .models import SubQuery, SubQueryResponse
+from ..utils.repair import repair_json, repair_sub_queries
 import litellm
 import json
 from tenacity import retry, stop_after_attempt, wait_exponential
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+
+logger = logging.getLogger(__name__)
 
 SYS_MESSAGE = """Your goal is to break down a complex user query into smaller, actionable sub-queries and rewrite each in a way that is clear and suitable for an AI agent to take action. 
 
@@ -23,15 +27,15 @@ If a sub-query would require multiple tools, it must be further broken down into
 2. **'sub_query'**: The original sub-query.
 3. **'task'**: The rewritten version suitable for AI action.
 4. **'tool'**: The name of the tool to use, if applicable. Empty string if sub-query is not actionable.
-5. **'dependent_on'**: The index of the sub-query that this sub-query is dependent on. Set to -1 if there is no dependency or sub-query is not actionable.
-6. **'dependency_attr'**: The name of the attribute in the tool that is dependent on the previous sub-query. Empty string if sub-query is not actionable.
+5. **'dependencies'**: The sub-queries that this sub-query is dependent on, each with its 'index' and 'attr', the name of the attribute in the tool that is dependent on the output of that sub-query. Empty list if there is no dependency or sub-query is not actionable.
+6. **'node_type'**: "map" when the tool must be called once for each item of a list returned by the sub-query it depends on (e.g. "recommend similar movies for each movie in my list"), the 'attr' of that dependency names the list. "tool" otherwise.
 
 Ensure that the sub-queries are ordered as follows: 
 1. First, list all actionable sub-queries that are not dependent on any other sub-query.
 2. Then, list actionable sub-queries that are dependent on previous sub-queries.
 3. Finally, place all non-actionable sub-queries at the end.
 
-The 'dependent_on' field should contain the index of the sub-query that this sub-query depends on, or -1 if there is no dependency. The 'dependency_attr' field should be a string representing the attribute in the tool that depends on the output of the previous sub-query.
+The 'dependencies' field should list every sub-query that this sub-query needs the output of. A sub-query that needs the outputs of two sub-queries lists both, they are then executed in parallel before it.
 
 ### Example:
 **Complex Query:** Find a sci-fi movie from my 'Sci-Fi Favorites' list, recommend similar movies, add those recommendations to a new 'Sci-Fi Discoveries' list, check the director of the first recommended movie and find more movies by them, and by the way, I'm feeling nostalgic about these classic sci-fi films.
@@ -43,48 +47,48 @@ The 'dependent_on' field should contain the index of the sub-query that this sub
         "sub_query": "Find a sci-fi movie from my 'Sci-Fi Favorites' list.",
         "task": "Retrieve a sci-fi movie from the 'Sci-Fi Favorites' list.",
         "tool": "retrieve_favorites",
-        "dependent_on": -1,
-        "dependency_attr": ""
+        "dependencies": [],
+        "node_type": "tool"
     },
     {
         "index": 1,
         "sub_query": "Recommend similar movies.",
         "task": "Recommend movies similar to the one retrieved from the 'Sci-Fi Favorites' list.",
         "tool": "recommend_similar_movies",
-        "dependent_on": 0,
-        "dependency_attr": "movie_title"
+        "dependencies": [{"index": 0, "attr": "movie_title"}],
+        "node_type": "tool"
     },
     {
         "index": 2,
         "sub_query": "Create a new 'Sci-Fi Discoveries' list.",
         "task": "Create a new favorite list with the title 'Sci-Fi Discoveries'.",
         "tool": "create_favorite_list",
-        "dependent_on": -1,
-        "dependency_attr": ""
+        "dependencies": [],
+        "node_type": "tool"
     },
     {
         "index": 3,
         "sub_query": "Add those recommendations to the 'Sci-Fi Discoveries' list.",
         "task": "Add the recommended movies to the 'Sci-Fi Discoveries' list.",
         "tool": "add_to_favorite",
-        "dependent_on": 1,
-        "dependency_attr": "movies"
+        "dependencies": [{"index": 1, "attr": "movies"}, {"index": 2, "attr": "list_name"}],
+        "node_type": "tool"
     },
     {
         "index": 4,
         "sub_query": "Check the director of the first recommended movie and find more movies by them.",
         "task": "Retrieve information about the director of the first recommended movie and find more movies by that director.",
         "tool": "get_director_info",
-        "dependent_on": 1,
-        "dependency_attr": "movie_title"
+        "dependencies": [{"index": 1, "attr": "movie_title"}],
+        "node_type": "tool"
     },
     {
         "index": 5,
         "sub_query": "By the way, I'm feeling nostalgic about these classic sci-fi films.",
         "task": "Acknowledge the user's sentiment about feeling nostalgic. No action is required.",
         "tool": "",
-        "dependent_on": -1,
-        "dependency_attr": ""
+        "dependencies": [],
+        "node_type": "tool"
     }
 ]
 
@@ -92,13 +96,13 @@ The 'dependent_on' field should contain the index of the sub-query that this sub
 1. **Atomic Sub-queries**: Each sub-query must be atomic and require only one tool. Break down sub-queries further if they require multiple tools. For example ven in the case of "Execut A, and B in parallel" you should break this down into two sub-queries.
 2. **Ordering**: Start with independent actionable sub-queries, followed by dependent actionable sub-queries, and end with non-actionable sub-queries.
 3. **Indexing**: Assign an index to each sub-query in the order they should be executed.
-4. **Dependencies**: Use the 'dependent_on' field to indicate dependencies by referencing the index of the dependent sub-query.
-5. **Dependency Attribute**: Specify the exact attribute in the tool that depends on the output of the previous sub-query in the 'dependency_attr' field.
+4. **Dependencies**: Use the 'dependencies' field to indicate dependencies by referencing the index of every sub-query whose output is needed. Never chain independent sub-queries to express that a later one needs both of them.
+5. **Dependency Attribute**: Specify, for each dependency, the exact attribute in the tool that depends on the output of that sub-query in its 'attr' field.
 6. **Efficiency of Dependency**: Make sure to assign dependency in the way that total execution of the detected tools become minimal. More parallel call ends to faster execution"""
 
 
 class Router:
-    def __init__(self, toolkit: Toolkit, tool_maker: ToolMaker = None):
+    def __init__(self, toolkit: Toolkit, tool_maker: ToolMaker = None, cache_breakpoints: bool = False):
         if not isinstance(toolkit, Toolkit):
             raise TypeError("toolkit must be an instance of Toolkit")
         self.toolkit = toolkit
@@ -106,6 +110,8 @@ class Router:
         self.tool_maker = tool_maker or OpenAIToolMaker(
             config_manager.get("llm.model")
         )
+        # Put a cache breakpoint after the tools block for providers with explicit prompt caching
+        self.cache_breakpoints = cache_breakpoints
         self.token_usage = {
             "prompt_tokens": 0,
             "completion_tokens": 0,
@@ -124,6 +130,10 @@ class Router:
     )
     def gen_subquery(self, query: str, toolkit: Toolkit = None) -> SubQueryResponse:
         tools = toolkit.to_markdown() if toolkit else ""
+        # The system prompt and the tools block form a stable prefix, the query always comes last
+        tools_block = {"type": "text", "text": f"<tools>{tools}</tools>\n"}
+        if self.cache_breakpoints:
+            tools_block["cache_control"] = {"type": "ephemeral"}
         try:
             response = litellm.completion(
                 model="gpt-4o-mini-2024-07-18",
@@ -137,10 +147,8 @@ class Router:
                     {
                         "role": "user",
                         "content": [
-                            {
-                                "type": "text",
-                                "text": f"<tools>{tools}</tools>\nComplex query: {query}",
-                            }
+                            tools_block,
+                            {"type": "text", "text": f"Complex query: {query}"},
                         ],
                     },
                 ],
@@ -178,13 +186,29 @@ class Router:
                                                 "type": "string",
                                                 "description": "The name of the tool to use for this sub-query, if applicable.",
                                             },
-                                            "dependent_on": {
-                                                "type": "integer",
-                                                "description": "The index of the sub-query that this sub-query is dependent on, or -1 if there is no dependency.",
-                                            },
-                                            "dependency_attr": {
+                                            "node_type": {
                                                 "type": "string",
-                                                "description": "The name of the attribute in the tool that depends on the output of the previous sub-query.",
+                                                "enum": ["tool", "map"],
+                                                "description": "\"map\" to call the tool once per item of the list returned by the first dependency, \"tool\" otherwise.",
+                                            },
+                                            "dependencies": {
+                                                "type": "array",
+                                                "description": "The sub-queries that this sub-query is dependent on, empty if there is no dependency.",
+                                                "items": {
+                                                    "type": "object",
+                                                    "properties": {
+                                                        "index": {
+                                                            "type": "integer",
+                                                            "description": "The index of the sub-query that this sub-query is dependent on.",
+                                                        },
+                                                        "attr": {
+                                                            "type": "string",
+                                                            "description": "The name of the attribute in the tool that depends on the output of that sub-query.",
+                                                        },
+                                                    },
+                                                    "required": ["index", "attr"],
+                                                    "additionalProperties": False,
+                                                },
                                             },
                                         },
                                         "required": [
@@ -192,8 +216,8 @@ class Router:
                                             "sub_query",
                                             "task",
                                             "tool",
-                                            "dependent_on",
-                                            "dependency_attr",
+                                            "dependencies",
+                                            "node_type",
                                         ],
                                         "additionalProperties": False,
                                     },
@@ -210,13 +234,19 @@ class Router:
                 "usage", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
             )
             content = message["content"]
-            result = SubQueryResponse.model_validate_json(content)
+            try:
+                result = SubQueryResponse.model_validate_json(content)
+            except ValueError:
+                # Repair the output locally, the retry only happens when this fails too
+                result = SubQueryResponse.model_validate(repair_json(content))
+            for fix in repair_sub_queries(result.sub_queries):
+                logger.info("Repaired decomposition: %s", fix)
             return result, usage
         except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {str(e)}")
+            logger.error("Error parsing JSON: %s", e)
             raise
         except Exception as e:
-            print(f"Error in gen_subquery: {str(e)}")
+            logger.error("Error in gen_subquery: %s", e)
             raise
 
     def route(self, query: str, context: Dict[str, Any] = None) -> ToolDependencyGraph:
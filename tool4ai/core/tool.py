@@ -2,6 +2,7 @@
 
 from typing import Union, Dict, Any, Callable
 from pydantic import BaseModel
+from ..utils.schema_validator import compile_schema
 import json, uuid
 
 class Tool:
@@ -15,7 +16,26 @@ class Tool:
         self.schema : Dict[str, Any] = schema if isinstance(schema, Dict) else json.loads(schema)
         self.description : str = description
         self.f : Callable = f
+        self._validator : Callable = None
 
+    @property
+    def validator(self) -> Callable[[Any], Any]:
+        # Compiled on first use only, most tools are never validated in a given process
+        if self._validator is None:
+            self._validator = compile_schema(self.schema)
+        return self._validator
+
+    def validate_arguments(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate the arguments of a tool call against the tool schema.
+
+        Returns:
+            Dict[str, Any]: The arguments, numeric strings and "true"/"false" converted to their schema type.
+
+        Raises:
+            SchemaValidationError: If the arguments do not match the schema.
+        """
+        return self.validator(arguments)
     
     def to_json_schema(self) -> Dict[str, Any]:
         return {
@@ -1,6 +1,6 @@
 # File: tool4ai/core/toolkit.py
 
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 from .tool import Tool
 
 class Toolkit:
@@ -9,12 +9,20 @@ class Toolkit:
         self.id_to_name: Dict[str, str] = {}
         self.name_to_id: Dict[str, str] = {}
         self.tool_function_map = tool_function_map or {}
+        # Everything derived from the tools is cached until the next add_tool/remove_tool
+        self.version: int = 0
+        self._cache: Dict[Any, Any] = {}
+
+    def _invalidate(self) -> None:
+        self.version += 1
+        self._cache = {}
 
     def add_tool(self, tool: Tool) -> None:
         self.tools[tool.id] = tool
         self.id_to_name[tool.id] = tool.name
         self.name_to_id[tool.name] = tool.id
         self.tool_function_map[tool.name] = tool.f
+        self._invalidate()
 
     def remove_tool(self, tool_id: str) -> None:
         tool = self.tools.get(tool_id)
@@ -23,6 +31,7 @@ class Toolkit:
             del self.id_to_name[tool.id]
             del self.name_to_id[tool.name]
             del self.tool_function_map[tool.name]
+            self._invalidate()
 
     def get_tool(self, tool_id_or_name: str) -> Optional[Tool]:
         tool = self.tools.get(tool_id_or_name)
@@ -36,14 +45,37 @@ class Toolkit:
     def list_tools(self) -> List[Tool]:
         return list(self.tools.values())
 
+    def _tools_info(self) -> Dict[str, Dict[str, Any]]:
+        if "json_schema" not in self._cache:
+            self._cache["json_schema"] = {tool_id: tool.to_json_schema() for tool_id, tool in self.tools.items()}
+        return self._cache["json_schema"]
+
     def to_json_schema(self) -> Dict[str, Dict]:
-        return {tool_id: tool.to_json_schema() for tool_id, tool in self.tools.items()}
-    
+        """
+        Return the `tool_id -> tool info` dict of every tool. The dict is a new one on each call,
+        the tool infos in it are shared until the next add_tool/remove_tool and must not be mutated.
+        """
+        return dict(self._tools_info())
+
+    def get_tools_info(self, names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the tools info restricted to the given tool names."""
+        key = ("tools_info", tuple(names))
+        if key not in self._cache:
+            tools_info = self._tools_info()
+            self._cache[key] = {
+                self.name_to_id[name]: tools_info[self.name_to_id[name]] for name in key[1] if name in self.name_to_id
+            }
+        return dict(self._cache[key])
+
     def has_tool(self, tool_id_or_name: str) -> bool:
         return tool_id_or_name in self.tools or tool_id_or_name in self.name_to_id
     
     def to_markdown(self) -> str:
-        return "\n\n".join([self._format_tool_from_schema(tool) for tool_name, tool in self.tools.items()])
+        if "markdown" not in self._cache:
+            # Sorted by name so the rendered tools are byte-stable regardless of insertion order
+            tools = sorted(self.tools.values(), key=lambda tool: (tool.name, tool.id))
+            self._cache["markdown"] = "\n\n".join([self._format_tool_from_schema(tool) for tool in tools])
+        return self._cache["markdown"]
     
     def _format_tool_from_schema(self, tool : Tool) -> str:
         tool_schema = tool.to_json_schema()
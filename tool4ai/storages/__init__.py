@@ -1,5 +1,10 @@
 from .base_storage import BaseStorage
 from .json_storage import JSONStorage
 from .lmdb_storage import LMDBStorage
+from .sqlite_storage import SQLiteStorage
+from .tiered_storage import TieredStorage
+from .journal import ExecutionJournal
+from .blob_store import BlobStore, FileBlobStore, LMDBBlobStore
+from .retention import RetentionSweeper
 
-__all__ = ['BaseStorage', 'JSONStorage', 'LmdbStorage']
+__all__ = ['BaseStorage', 'JSONStorage', 'LmdbStorage', 'SQLiteStorage', 'TieredStorage', 'ExecutionJournal', 'BlobStore', 'FileBlobStore', 'LMDBBlobStore', 'RetentionSweeper']
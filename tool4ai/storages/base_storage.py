@@ -1,7 +1,9 @@
 # tool4ai/storages/base_storage.py
 
 import abc
-from typing import Dict, Any
+import time
+import asyncio
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple
 
 class BaseStorage(abc.ABC):
     @abc.abstractmethod
@@ -14,4 +16,167 @@ class BaseStorage(abc.ABC):
 
     @abc.abstractmethod
     async def delete(self, run_id: str) -> None:
-        pass
\ No newline at end of file
+        pass
+
+    def close(self) -> None:
+        """Release the connections or threads held by the backend."""
+        pass
+
+    def __enter__(self) -> "BaseStorage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "BaseStorage":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    # Bulk operations. Backends should override these with a native batch (one transaction, one
+    # statement, a reader pool), the default implementation runs the single-run calls concurrently.
+
+    async def save_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        await asyncio.gather(*[self.save(run_id, data) for run_id, data in items.items()])
+
+    async def load_many(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Load several runs at once, runs that are not found are left out of the result."""
+        run_ids = list(run_ids)
+        loaded = await asyncio.gather(*[self.load(run_id) for run_id in run_ids], return_exceptions=True)
+        found = {}
+        for run_id, data in zip(run_ids, loaded):
+            if isinstance(data, KeyError):
+                continue
+            if isinstance(data, BaseException):
+                raise data
+            found[run_id] = data
+        return found
+
+    async def delete_many(self, run_ids: Iterable[str]) -> int:
+        """
+        Delete several runs with their deltas.
+
+        Returns:
+            int: Number of bytes removed from the backend, 0 when the backend cannot tell.
+        """
+        await asyncio.gather(*[self.delete(run_id) for run_id in run_ids])
+        return 0
+
+    async def load_deltas_many(self, run_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        run_ids = list(run_ids)
+        deltas = await asyncio.gather(*[self.load_deltas(run_id) for run_id in run_ids])
+        return dict(zip(run_ids, deltas))
+
+    async def scan(self, batch_size: int = 100) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over every stored run as (run_id, data), loading `batch_size` runs at a time."""
+        run_ids = await self.list_run_ids()
+        for start in range(0, len(run_ids), batch_size):
+            batch = await self.load_many(run_ids[start:start + batch_size])
+            for run_id, data in batch.items():
+                yield run_id, data
+
+    async def scan_metadata(self, batch_size: int = 100) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the metadata of every stored run, with the deltas of each batch folded in."""
+        batch: Dict[str, Dict[str, Any]] = {}
+        async for run_id, data in self.scan(batch_size):
+            batch[run_id] = data
+            if len(batch) >= batch_size:
+                for record in await self._batch_metadata(batch):
+                    yield record
+                batch = {}
+        for record in await self._batch_metadata(batch):
+            yield record
+
+    async def _batch_metadata(self, batch: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not batch:
+            return []
+        deltas = await self.load_deltas_many(list(batch))
+        return [self.run_metadata(run_id, data, deltas.get(run_id, ())) for run_id, data in batch.items()]
+
+    async def compact(self) -> int:
+        """Give the space freed by deleted runs back to the file system, return the bytes reclaimed."""
+        return 0
+
+    # Incremental checkpoints. There is no default: appending to a run stored under a single key
+    # would rewrite every delta of the run on each append and race with concurrent appends, so
+    # every backend provides a native append.
+
+    @abc.abstractmethod
+    async def append_delta(self, run_id: str, delta: Dict[str, Any]) -> None:
+        """Append `delta` to the deltas of `run_id`, without rewriting the ones already stored."""
+        pass
+
+    @abc.abstractmethod
+    async def load_deltas(self, run_id: str) -> List[Dict[str, Any]]:
+        """The deltas of `run_id` in the order they were appended, an empty list when there are none."""
+        pass
+
+    @abc.abstractmethod
+    async def clear_deltas(self, run_id: str) -> None:
+        pass
+
+    # Queries over stored runs. Backends with an index should override query(), the default
+    # implementation loads every run returned by list_run_ids().
+
+    @abc.abstractmethod
+    async def list_run_ids(self) -> List[str]:
+        """The run_id of every stored run, scan(), query() and the retention sweeper rely on it."""
+        pass
+
+    @staticmethod
+    def run_metadata(run_id: str, data: Dict[str, Any], deltas: Iterable[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """
+        Extract the queryable metadata of a run from its saved data. Incremental checkpoints only
+        write status changes to the deltas until the next snapshot, so the newest delta newer
+        than the snapshot wins.
+        """
+        graph_status = data.get("graph_status")
+        updated_at = data.get("updated_at")
+        for delta in deltas:
+            if delta.get("seq", 0) > data.get("checkpoint_seq", 0) and "graph_status" in delta:
+                graph_status = delta["graph_status"]
+                updated_at = delta.get("updated_at") or updated_at
+        updated_at = updated_at or time.time()
+        return {
+            "run_id": run_id,
+            "graph_status": graph_status,
+            "tenant": data.get("tenant"),
+            "created_at": data.get("created_at") or updated_at,
+            "updated_at": updated_at,
+        }
+
+    async def query(
+        self,
+        graph_status: Optional[str] = None,
+        tenant: Optional[str] = None,
+        updated_before: Optional[float] = None,
+        updated_after: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        List the metadata of the stored runs matching every given filter, oldest update first.
+
+        Args:
+            graph_status (Optional[str]): Only runs with this graph status, e.g. "human".
+            tenant (Optional[str]): Only runs of this tenant.
+            updated_before (Optional[float]): Only runs last saved before this Unix timestamp.
+            updated_after (Optional[float]): Only runs last saved after this Unix timestamp.
+            limit (Optional[int]): Maximum number of records returned.
+
+        Returns:
+            List[Dict[str, Any]]: Records with run_id, graph_status, tenant, created_at and updated_at.
+        """
+        records = []
+        async for record in self.scan_metadata():
+            if graph_status is not None and record["graph_status"] != graph_status:
+                continue
+            if tenant is not None and record["tenant"] != tenant:
+                continue
+            if updated_before is not None and record["updated_at"] >= updated_before:
+                continue
+            if updated_after is not None and record["updated_at"] <= updated_after:
+                continue
+            records.append(record)
+        records.sort(key=lambda record: record["updated_at"])
+        return records[:limit] if limit is not None else records
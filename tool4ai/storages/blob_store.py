@@ -0,0 +1,178 @@
+# tool4ai/storages/blob_store.py
+
+import os
+import re
+import json
+import abc
+import mmap
+import asyncio
+import hashlib
+import tempfile
+from typing import Dict, Any, Callable, List, Optional
+from .lmdb_storage import get_environment
+
+# A reference is a short token put in place of a large text
+_REFERENCE = re.compile(r'<blob:sha256:([0-9a-f]{64})>')
+
+def make_reference(digest: str) -> str:
+    return f"<blob:sha256:{digest}>"
+
+def has_references(text: Any) -> bool:
+    return isinstance(text, str) and "<blob:sha256:" in text
+
+def _map_strings(value: Any, replace: Callable[[str], str]) -> Any:
+    if isinstance(value, str):
+        return replace(value) if has_references(value) else value
+    if isinstance(value, list):
+        return [_map_strings(item, replace) for item in value]
+    if isinstance(value, dict):
+        return {key: _map_strings(item, replace) for key, item in value.items()}
+    return value
+
+class BlobStore(abc.ABC):
+    """
+    Content-addressed store for large texts such as tool results. A text is stored once under its
+    SHA-256 digest, and sub-queries and memory entries hold a reference to it, which is only
+    materialized when a prompt needs the data.
+    """
+
+    @abc.abstractmethod
+    def _write(self, digest: str, data: bytes) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _read(self, digest: str) -> str:
+        pass
+
+    @abc.abstractmethod
+    def _delete(self, digest: str) -> None:
+        pass
+
+    async def _run_write(self, op: Callable[..., None], *args: Any) -> None:
+        """Run the write `op(*args)` off the event loop."""
+        await asyncio.to_thread(op, *args)
+
+    async def put(self, text: str) -> str:
+        """Store `text` and return its reference."""
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        await self._run_write(self._write, digest, data)
+        return make_reference(digest)
+
+    async def get(self, reference: str) -> str:
+        match = _REFERENCE.fullmatch(reference)
+        if match is None:
+            raise ValueError(f"Not a blob reference: {reference[:100]!r}")
+        return await asyncio.to_thread(self._read, match.group(1))
+
+    async def delete(self, reference: str) -> None:
+        match = _REFERENCE.fullmatch(reference)
+        if match is not None:
+            await self._run_write(self._delete, match.group(1))
+
+    async def materialize(self, text: str) -> str:
+        """
+        Replace every reference in `text` with the text it points to. In a JSON document the
+        references are replaced inside the decoded string values, so the text is escaped wherever
+        the reference stood, and the document is encoded again.
+        """
+        if not has_references(text):
+            return text
+        digests = {match.group(1) for match in _REFERENCE.finditer(text)}
+        blobs = dict(zip(digests, await asyncio.gather(*[asyncio.to_thread(self._read, d) for d in digests])))
+
+        def _replace(value: str) -> str:
+            return _REFERENCE.sub(lambda match: blobs[match.group(1)], value)
+
+        try:
+            document = json.loads(text)
+        except ValueError:
+            return _replace(text)
+        return json.dumps(_map_strings(document, _replace), ensure_ascii=False)
+
+    async def materialize_memory(self, memory: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return a copy of `memory` in which every referenced content is materialized."""
+        materialized = []
+        for entry in memory:
+            if has_references(entry.get("content")):
+                entry = {**entry, "content": await self.materialize(entry["content"])}
+            materialized.append(entry)
+        return materialized
+
+class FileBlobStore(BlobStore):
+    """Blobs as files sharded by digest prefix, read through a memory map."""
+
+    def __init__(self, storage_path: Optional[str] = None):
+        self.storage_path = storage_path or os.path.expanduser("~/.tool4ai/storage/blobs")
+        os.makedirs(self.storage_path, exist_ok=True)
+
+    def _get_file_path(self, digest: str) -> str:
+        return os.path.join(self.storage_path, digest[:2], digest[2:4], digest)
+
+    def _write(self, digest: str, data: bytes) -> None:
+        file_path = self._get_file_path(digest)
+        if os.path.exists(file_path):
+            # Same digest, same content
+            return
+        directory = os.path.dirname(file_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{digest[:8]}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read(self, digest: str) -> str:
+        file_path = self._get_file_path(digest)
+        try:
+            f = open(file_path, 'rb')
+        except FileNotFoundError:
+            raise KeyError(f"No blob found for digest: {digest}")
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return str(mapped, "utf-8")
+
+    def _delete(self, digest: str) -> None:
+        file_path = self._get_file_path(digest)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+class LMDBBlobStore(BlobStore):
+    """Blobs in an LMDB environment, decoded straight from the memory-mapped database."""
+
+    def __init__(self, db_path: Optional[str] = None, map_size: int = 256 * 1024 * 1024):
+        self.db_path = db_path or os.path.expanduser("~/.tool4ai/storage/lmdb_blobs")
+        # Shares the environment, and its writer, of any LMDBStorage opened on the same path
+        self.shared = get_environment(self.db_path, map_size)
+
+    @property
+    def env(self):
+        return self.shared.env
+
+    def _key(self, digest: str) -> bytes:
+        return f"blob/{digest}".encode()
+
+    def _write(self, digest: str, data: bytes, txn: Any) -> None:
+        txn.put(self._key(digest), data, overwrite=False)
+
+    def _read(self, digest: str) -> str:
+        def _get(txn):
+            data = txn.get(self._key(digest))
+            if data is None:
+                raise KeyError(f"No blob found for digest: {digest}")
+            return str(data, "utf-8")
+
+        return self.shared.transaction(_get)
+
+    def _delete(self, digest: str, txn: Any) -> None:
+        txn.delete(self._key(digest))
+
+    async def _run_write(self, op: Callable[..., None], *args: Any) -> None:
+        # Through the shared writer, which groups commits and grows the map
+        await self.shared.write(lambda txn: op(*args, txn))
@@ -0,0 +1,73 @@
+# tool4ai/storages/journal.py
+
+import hashlib
+import json
+from typing import Dict, Any, List, Optional
+from .base_storage import BaseStorage
+from .json_storage import JSONStorage
+
+class ExecutionJournal:
+    """
+    Write-ahead journal of a graph execution. Entries are appended to a storage backend when the
+    plan starts executing, when each tool call starts and finishes, and when a sub-query
+    finishes, so a crashed run can be recovered without calling completed tools again.
+    """
+
+    def __init__(self, storage: Optional[BaseStorage] = None):
+        self.storage = storage or JSONStorage()
+
+    @staticmethod
+    def journal_id(run_id: str) -> str:
+        """Storage key of the journal of a run, its entries are stored as deltas of this key."""
+        return f"{run_id}.journal"
+
+    @staticmethod
+    def idempotency_key(index: int, tool_name: str, arguments: Dict[str, Any]) -> str:
+        """Identify a tool call by its sub-query, tool and canonical arguments."""
+        payload = json.dumps([index, tool_name, arguments], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def succeeded(result: Any) -> bool:
+        """Whether a tool result reports success, a result without a status succeeded."""
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except ValueError:
+                return True
+        return not isinstance(result, dict) or result.get("status", "success") == "success"
+
+    async def _append(self, run_id: str, entry: Dict[str, Any]) -> None:
+        await self.storage.append_delta(self.journal_id(run_id), entry)
+
+    async def record_plan(self, run_id: str, plan: Dict[str, Any]) -> None:
+        await self._append(run_id, {"type": "plan", "plan": plan})
+
+    async def tool_call_started(self, run_id: str, key: str, index: int, tool_name: str, arguments: Dict[str, Any]) -> None:
+        await self._append(run_id, {
+            "type": "tool_call_started",
+            "key": key,
+            "index": index,
+            "tool": tool_name,
+            "arguments": arguments,
+        })
+
+    async def tool_call_finished(self, run_id: str, key: str, result: Any) -> None:
+        await self._append(run_id, {"type": "tool_call_finished", "key": key, "result": result})
+
+    async def sub_query_finished(self, run_id: str, sub_query: Dict[str, Any]) -> None:
+        await self._append(run_id, {"type": "sub_query_finished", "sub_query": sub_query})
+
+    async def entries(self, run_id: str) -> List[Dict[str, Any]]:
+        return await self.storage.load_deltas(self.journal_id(run_id))
+
+    async def completed_tool_calls(self, run_id: str) -> Dict[str, Any]:
+        """Map the idempotency key of every tool call that finished successfully to its result."""
+        return {
+            entry["key"]: entry["result"]
+            for entry in await self.entries(run_id)
+            if entry["type"] == "tool_call_finished" and self.succeeded(entry["result"])
+        }
+
+    async def clear(self, run_id: str) -> None:
+        await self.storage.clear_deltas(self.journal_id(run_id))
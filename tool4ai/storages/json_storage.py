@@ -1,67 +1,285 @@
 # tool4ai/storages/json_storage.py
 
 import os
-import json
+import time
+import lzma
+import zlib
 import asyncio
-from typing import Dict, Any
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple, Union
 from .base_storage import BaseStorage
+from ..utils.codec import Codec, decode, get_codec
+
+# Compressed files start with a header: magic, format version and codec. Plain JSON files have
+# no header, so files written with any settings can always be read back.
+MAGIC = b"T4AI"
+FORMAT_VERSION = 1
+CODECS = {
+    "zlib": (1, zlib.compress, zlib.decompress),
+    "lzma": (2, lzma.compress, lzma.decompress),
+}
+CODEC_IDS = {codec_id: decompress for codec_id, _, decompress in CODECS.values()}
+FSYNC_POLICIES = ("never", "deltas", "always")
+
+# Thread pools of the bulk operations, shared by every JSONStorage with the same number of workers.
+# Threads are only started when a bulk operation runs and are joined at interpreter exit
+_POOLS: Dict[int, ThreadPoolExecutor] = {}
+_POOLS_LOCK = threading.Lock()
+
+def _shared_pool(io_workers: int) -> ThreadPoolExecutor:
+    with _POOLS_LOCK:
+        pool = _POOLS.get(io_workers)
+        if pool is None:
+            pool = _POOLS[io_workers] = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="json-storage")
+        return pool
 
 class JSONStorage(BaseStorage):
-    def __init__(self):
-        self.storage_path = os.path.expanduser("~/.tool4ai/storage/json")
+    def __init__(
+        self,
+        storage_path: Optional[str] = None,
+        shard_depth: int = 0,
+        compression: Optional[str] = None,
+        fsync: str = "deltas",
+        codec: Optional[Union[str, Codec]] = None,
+        io_workers: int = 8,
+    ):
+        """
+        Args:
+            storage_path (Optional[str]): Root directory, ~/.tool4ai/storage/json by default.
+            shard_depth (int): Number of hash-prefix directory levels (256 directories each) used
+                to spread runs, 0 keeps a flat directory.
+            compression (Optional[str]): "zlib", "lzma" or None for plain JSON.
+            fsync (str): "never", "deltas" (appended deltas and journal entries only) or "always"
+                (snapshots too, including the directory entry of the renamed file).
+            codec (Optional[Union[str, Codec]]): Serialization of snapshots, "json" (default) or
+                "msgpack". Deltas are always JSON lines.
+            io_workers (int): Size of the thread pool that reads and writes files in bulk operations,
+                the pool is shared with the other JSONStorage instances of the same size.
+        """
+        if compression is not None and compression not in CODECS:
+            raise ValueError(f"compression must be one of {list(CODECS)} or None, got {compression!r}")
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.storage_path = storage_path or os.path.expanduser("~/.tool4ai/storage/json")
+        self.shard_depth = shard_depth
+        self.compression = compression
+        self.fsync = fsync
+        self.codec = get_codec(codec)
+        self._lines_codec = get_codec("json")
+        self.io_workers = io_workers
+        self._pool: Optional[ThreadPoolExecutor] = _shared_pool(io_workers)
         os.makedirs(self.storage_path, exist_ok=True)
 
+    def _get_dir(self, run_id: str) -> str:
+        if not self.shard_depth:
+            return self.storage_path
+        digest = hashlib.sha1(run_id.encode()).hexdigest()
+        return os.path.join(self.storage_path, *[digest[2 * ix:2 * ix + 2] for ix in range(self.shard_depth)])
+
     def _get_file_path(self, run_id: str) -> str:
-        return os.path.join(self.storage_path, f"{run_id}.json")
+        return os.path.join(self._get_dir(run_id), f"{run_id}.json")
 
-    async def save(self, run_id: str, data: Dict[str, Any]) -> None:
+    def _find_file_path(self, run_id: str) -> Optional[str]:
         file_path = self._get_file_path(run_id)
-        
-        def _save():
-            with open(file_path, 'w') as f:
-                json.dump(data, f)
+        if os.path.exists(file_path):
+            return file_path
+        # Runs saved before sharding was enabled stay in the root directory
+        legacy_path = os.path.join(self.storage_path, f"{run_id}.json")
+        if self.shard_depth and os.path.exists(legacy_path):
+            return legacy_path
+        return None
 
-        await asyncio.to_thread(_save)
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        payload = self.codec.dumps(data)
+        if self.compression is None:
+            return payload
+        codec_id, compress, _ = CODECS[self.compression]
+        return MAGIC + bytes([FORMAT_VERSION, codec_id]) + compress(payload)
 
-    async def load(self, run_id: str) -> Dict[str, Any]:
+    @staticmethod
+    def _decode(raw: bytes) -> Dict[str, Any]:
+        if raw.startswith(MAGIC):
+            version, codec_id = raw[len(MAGIC)], raw[len(MAGIC) + 1]
+            if version != FORMAT_VERSION or codec_id not in CODEC_IDS:
+                raise ValueError(f"Unsupported storage format version {version}, codec {codec_id}")
+            raw = CODEC_IDS[codec_id](raw[len(MAGIC) + 2:])
+        return decode(raw)
+
+    @staticmethod
+    def _fsync_dir(path: str) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _map(self, fn, items: List[Any]) -> List[Any]:
+        """Run `fn` over `items` on the reader pool, from a worker thread."""
+        if self._pool is None:
+            raise RuntimeError("JSONStorage is closed")
+        return list(self._pool.map(fn, items))
+
+    def close(self) -> None:
+        """Detach from the shared thread pool, bulk operations fail afterward."""
+        self._pool = None
+
+    def _write_file(self, run_id: str, payload: bytes) -> None:
         file_path = self._get_file_path(run_id)
-        
-        def _load():
-            if not os.path.exists(file_path):
-                raise KeyError(f"No data found for run_id: {run_id}")
-            with open(file_path, 'r') as f:
-                return json.load(f)
+        directory = os.path.dirname(file_path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file and rename it, readers never see a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{run_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                if self.fsync == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.fsync == "always":
+            self._fsync_dir(directory)
+
+    def _read_file(self, run_id: str) -> Optional[Dict[str, Any]]:
+        file_path = self._find_file_path(run_id)
+        if file_path is None:
+            return None
+        try:
+            with open(file_path, 'rb') as f:
+                return self._decode(f.read())
+        except FileNotFoundError:
+            # Deleted since it was found
+            return None
 
-        return await asyncio.to_thread(_load)
+    def _delete_files(self, run_id: str) -> int:
+        deleted = 0
+        for path in (self._find_file_path(run_id), self._get_deltas_path(run_id)):
+            try:
+                if path:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    deleted += size
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    async def save(self, run_id: str, data: Dict[str, Any]) -> None:
+        payload = self._encode(data)
+        await asyncio.to_thread(self._write_file, run_id, payload)
+
+    async def load(self, run_id: str) -> Dict[str, Any]:
+        data = await asyncio.to_thread(self._read_file, run_id)
+        if data is None:
+            raise KeyError(f"No data found for run_id: {run_id}")
+        return data
 
     async def delete(self, run_id: str) -> None:
-        file_path = self._get_file_path(run_id)
-        
-        def _delete():
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        await asyncio.to_thread(self._delete_files, run_id)
+
+    async def save_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        payloads = [(run_id, self._encode(data)) for run_id, data in items.items()]
+        # One thread hop, the files are written by the pool
+        await asyncio.to_thread(self._map, lambda item: self._write_file(*item), payloads)
+
+    async def load_many(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        run_ids = list(run_ids)
+        loaded = await asyncio.to_thread(self._map, self._read_file, run_ids)
+        return {run_id: data for run_id, data in zip(run_ids, loaded) if data is not None}
+
+    async def delete_many(self, run_ids: Iterable[str]) -> int:
+        return sum(await asyncio.to_thread(self._map, self._delete_files, list(run_ids)))
+
+    async def compact(self) -> int:
+        """Remove temporary files left by interrupted writes and empty shard directories."""
+        def _compact():
+            reclaimed = 0
+            for directory, subdirectories, names in os.walk(self.storage_path, topdown=False):
+                for name in names:
+                    path = os.path.join(directory, name)
+                    # Skip files of writes that may still be running
+                    if name.startswith(".") and name.endswith(".tmp") and time.time() - os.path.getmtime(path) > 3600:
+                        reclaimed += os.path.getsize(path)
+                        os.remove(path)
+                if directory != self.storage_path and not os.listdir(directory):
+                    os.rmdir(directory)
+            return reclaimed
+
+        return await asyncio.to_thread(_compact)
+
+    async def load_deltas_many(self, run_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        run_ids = list(run_ids)
+        deltas = await asyncio.to_thread(self._map, self._read_deltas, run_ids)
+        return dict(zip(run_ids, deltas))
+
+    async def scan(self, batch_size: int = 100) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        # Walk one directory at a time instead of listing every run first
+        walker = os.walk(self.storage_path)
+        batch: List[str] = []
+        while True:
+            entry = await asyncio.to_thread(next, walker, None)
+            if entry is not None:
+                batch.extend(name[:-len(".json")] for name in entry[2] if name.endswith(".json"))
+            while len(batch) >= batch_size or (entry is None and batch):
+                chunk, batch = batch[:batch_size], batch[batch_size:]
+                for run_id, data in (await self.load_many(chunk)).items():
+                    yield run_id, data
+            if entry is None:
+                return
+
+    async def list_run_ids(self) -> List[str]:
+        def _list():
+            run_ids = []
+            for _, _, names in os.walk(self.storage_path):
+                run_ids.extend(name[:-len(".json")] for name in names if name.endswith(".json"))
+            return run_ids
+
+        return await asyncio.to_thread(_list)
+
+    def _get_deltas_path(self, run_id: str) -> str:
+        return os.path.join(self._get_dir(run_id), f"{run_id}.deltas.jsonl")
+
+    async def append_delta(self, run_id: str, delta: Dict[str, Any]) -> None:
+        deltas_path = self._get_deltas_path(run_id)
 
-        await asyncio.to_thread(_delete)
+        def _append():
+            os.makedirs(os.path.dirname(deltas_path), exist_ok=True)
+            # One JSON document per line, appending never rewrites earlier deltas
+            with open(deltas_path, 'ab') as f:
+                f.write(self._lines_codec.dumps(delta) + b"\n")
+                if self.fsync != "never":
+                    f.flush()
+                    os.fsync(f.fileno())
 
-async def main():
-    storage = JSONStorage()
-    run_id = "test_run_1"
-    test_data = {"key": "value", "nested": {"a": 1, "b": 2}}
+        await asyncio.to_thread(_append)
 
-    await storage.save(run_id, test_data)
-    print(f"Saved data for run_id: {run_id}")
+    def _read_deltas(self, run_id: str) -> List[Dict[str, Any]]:
+        deltas_path = self._get_deltas_path(run_id)
+        if not os.path.exists(deltas_path):
+            return []
+        deltas = []
+        with open(deltas_path, 'rb') as f:
+            for line in f:
+                try:
+                    deltas.append(self._lines_codec.loads(line))
+                except ValueError:
+                    # A torn last line from an interrupted append
+                    break
+        return deltas
 
-    loaded_data = await storage.load(run_id)
-    print(f"Loaded data for run_id: {run_id}")
-    print(loaded_data)
+    async def load_deltas(self, run_id: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read_deltas, run_id)
 
-    await storage.delete(run_id)
-    print(f"Deleted data for run_id: {run_id}")
+    async def clear_deltas(self, run_id: str) -> None:
+        deltas_path = self._get_deltas_path(run_id)
 
-    try:
-        await storage.load(run_id)
-    except KeyError as e:
-        print(f"Expected error: {e}")
+        def _clear():
+            if os.path.exists(deltas_path):
+                os.remove(deltas_path)
 
-if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+        await asyncio.to_thread(_clear)
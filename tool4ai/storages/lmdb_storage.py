@@ -1,61 +1,376 @@
 # tool4ai/storages/lmdb_storage.py
 
 import os
-import json
 import lmdb
+import queue
+import shutil
+import tempfile
 import asyncio
-from typing import Dict, Any
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, AsyncIterator, Callable, Iterable, List, Optional, Tuple, Union
 from .base_storage import BaseStorage
+from ..utils.codec import Codec, decode, get_codec
+
+class _ReadWriteGate:
+    """Any number of shared holders or one exclusive holder. A waiting exclusive holder goes first."""
 
-class LMDBStorage(BaseStorage):
     def __init__(self):
-        self.db_path = os.path.expanduser("~/.tool4ai/storage/lmdb")
-        os.makedirs(self.db_path, exist_ok=True)
-        self.env = lmdb.open(self.db_path, map_size=1024*1024*1024)  # 1GB max
+        self._changed = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
 
-    async def save(self, run_id: str, data: Dict[str, Any]) -> None:
-        def _save():
-            with self.env.begin(write=True) as txn:
-                txn.put(run_id.encode(), json.dumps(data).encode())
+    @contextmanager
+    def shared(self):
+        with self._changed:
+            self._changed.wait_for(lambda: not self._exclusive and not self._waiting)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._shared -= 1
+                if not self._shared:
+                    self._changed.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._changed:
+            self._waiting += 1
+            self._changed.wait_for(lambda: not self._exclusive and not self._shared)
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._exclusive = False
+                self._changed.notify_all()
+
+class SharedEnvironment:
+    """
+    One LMDB environment per database path and process. All writes go through a single
+    background writer thread, which commits every write queued while the previous transaction
+    was running in one group transaction, and grows the map when it is full. Read transactions
+    hold a gate that growing and compacting take exclusively, LMDB forbids both while any
+    transaction is open.
+    """
+
+    def __init__(self, db_path: str, map_size: int, max_map_size: Optional[int] = None, max_batch: int = 256):
+        self.db_path = db_path
+        self.max_map_size = max_map_size
+        self.max_batch = max_batch
+        self.env = lmdb.open(db_path, map_size=map_size)
+        self._writes: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._gate = _ReadWriteGate()
+
+    def transaction(self, op: Callable[[Any], Any], buffers: bool = True, write: bool = False) -> Any:
+        """
+        Run `op(txn)` in a transaction outside the writer thread, blocking while the map is
+        resized or compacted. Writes should go through write(), which groups commits.
+        """
+        with self._gate.shared():
+            with self.env.begin(buffers=buffers, write=write) as txn:
+                return op(txn)
+
+    def write(self, op: Callable[..., Any], exclusive: bool = False) -> "asyncio.Future":
+        """
+        Queue `op(txn)` for the writer, the returned future resolves once it is committed. An
+        exclusive `op()` runs alone, outside any transaction, after the writes queued before it.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name=f"lmdb-writer:{self.db_path}", daemon=True)
+                self._writer.start()
+        self._writes.put((op, loop, future, exclusive))
+        return future
+
+    def _run_writer(self) -> None:
+        pending = None
+        while True:
+            item, pending = pending or self._writes.get(), None
+            if item[3]:
+                self._run_exclusive(item)
+                continue
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item[3]:
+                    pending = item
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _run_exclusive(self, item) -> None:
+        op, loop, future, _ = item
+        try:
+            ok, value = True, op()
+        except Exception as e:
+            ok, value = False, e
+        loop.call_soon_threadsafe(self._resolve, future, ok, value)
+
+    def _commit(self, batch) -> None:
+        while True:
+            results = []
+            try:
+                with self.env.begin(write=True) as txn:
+                    for op, _, _, _ in batch:
+                        # Each op runs in a nested transaction, a failing op does not abort the group
+                        try:
+                            with self.env.begin(write=True, parent=txn) as child:
+                                results.append((True, op(child)))
+                        except lmdb.MapFullError:
+                            raise
+                        except Exception as e:
+                            results.append((False, e))
+                break
+            except lmdb.MapFullError:
+                if not self._grow():
+                    results = [(False, lmdb.MapFullError("LMDB map is full"))] * len(batch)
+                    break
+            except Exception as e:
+                results = [(False, e)] * len(batch)
+                break
+
+        for (_, loop, future, _), (ok, value) in zip(batch, results):
+            loop.call_soon_threadsafe(self._resolve, future, ok, value)
 
-        await asyncio.to_thread(_save)
+    @staticmethod
+    def _resolve(future: "asyncio.Future", ok: bool, value: Any) -> None:
+        if future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def data_size(self) -> int:
+        return os.path.getsize(os.path.join(self.db_path, "data.mdb"))
+
+    def _compact(self) -> int:
+        """Rewrite the database without its free pages, runs on the writer thread."""
+        with self._gate.exclusive():
+            return self._compact_unlocked()
+
+    def _compact_unlocked(self) -> int:
+        before = self.data_size()
+        map_size = self.env.info()["map_size"]
+        copy_dir = tempfile.mkdtemp(dir=os.path.dirname(self.db_path), prefix=".lmdb-compact-")
+        closed = False
+        try:
+            self.env.copy(copy_dir, compact=True)
+            self.env.close()
+            closed = True
+            os.replace(os.path.join(copy_dir, "data.mdb"), os.path.join(self.db_path, "data.mdb"))
+        finally:
+            shutil.rmtree(copy_dir, ignore_errors=True)
+            if closed:
+                self.env = lmdb.open(self.db_path, map_size=map_size)
+        return before - self.data_size()
+
+    def _grow(self) -> bool:
+        current = self.env.info()["map_size"]
+        new_size = current * 2
+        if self.max_map_size is not None:
+            new_size = min(new_size, self.max_map_size)
+        if new_size <= current:
+            return False
+        with self._gate.exclusive():
+            self.env.set_mapsize(new_size)
+        return True
+
+_environments: Dict[str, SharedEnvironment] = {}
+_environments_lock = threading.Lock()
+
+def get_environment(db_path: str, map_size: int = 64 * 1024 * 1024, max_map_size: Optional[int] = None) -> SharedEnvironment:
+    """Return the process-wide environment of `db_path`, opening it on first use."""
+    db_path = os.path.abspath(db_path)
+    with _environments_lock:
+        if db_path not in _environments:
+            os.makedirs(db_path, exist_ok=True)
+            _environments[db_path] = SharedEnvironment(db_path, map_size, max_map_size)
+        return _environments[db_path]
+
+class LMDBStorage(BaseStorage):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        map_size: int = 64 * 1024 * 1024,
+        max_map_size: Optional[int] = None,
+        codec: Optional[Union[str, Codec]] = None,
+    ):
+        """
+        Args:
+            db_path (Optional[str]): Database directory, ~/.tool4ai/storage/lmdb by default.
+            map_size (int): Initial map size, it doubles whenever it is full.
+            max_map_size (Optional[int]): Upper bound for the map size, unbounded if None.
+            codec (Optional[Union[str, Codec]]): Serialization of saved values, "json" (default) or
+                "msgpack". Values written with any codec can be read back.
+        """
+        self.db_path = db_path or os.path.expanduser("~/.tool4ai/storage/lmdb")
+        # Storages on the same path share one environment and one writer
+        self.shared = get_environment(self.db_path, map_size, max_map_size)
+        self.codec = get_codec(codec)
+
+    @property
+    def env(self) -> lmdb.Environment:
+        # Compaction reopens the shared environment
+        return self.shared.env
+
+    async def save(self, run_id: str, data: Dict[str, Any]) -> None:
+        value = self.codec.dumps(data)
+        await self.shared.write(lambda txn: txn.put(run_id.encode(), value))
 
     async def load(self, run_id: str) -> Dict[str, Any]:
-        def _load():
-            with self.env.begin() as txn:
-                data = txn.get(run_id.encode())
-                if data is None:
-                    raise KeyError(f"No data found for run_id: {run_id}")
-                return json.loads(data.decode())
+        def _load(txn):
+            data = txn.get(run_id.encode())
+            if data is None:
+                raise KeyError(f"No data found for run_id: {run_id}")
+            # The buffer is only valid inside the transaction, it is decoded without a copy
+            return decode(data)
 
-        return await asyncio.to_thread(_load)
+        return await asyncio.to_thread(self.shared.transaction, _load)
 
     async def delete(self, run_id: str) -> None:
-        def _delete():
-            with self.env.begin(write=True) as txn:
-                txn.delete(run_id.encode())
+        def _delete(txn):
+            txn.delete(run_id.encode())
+            self._delete_deltas(txn, run_id)
+
+        await self.shared.write(_delete)
+
+    # Bulk operations run in a single transaction
+
+    async def save_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        values = [(run_id.encode(), self.codec.dumps(data)) for run_id, data in items.items()]
+
+        def _save_many(txn):
+            with txn.cursor() as cursor:
+                cursor.putmulti(values)
+
+        await self.shared.write(_save_many)
+
+    async def load_many(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        run_ids = list(run_ids)
+
+        def _load_many(txn):
+            found = {}
+            for run_id in run_ids:
+                data = txn.get(run_id.encode())
+                if data is not None:
+                    found[run_id] = decode(data)
+            return found
+
+        return await asyncio.to_thread(self.shared.transaction, _load_many)
+
+    async def delete_many(self, run_ids: Iterable[str]) -> int:
+        run_ids = list(run_ids)
+
+        def _delete_many(txn):
+            deleted = 0
+            for run_id in run_ids:
+                value = txn.pop(run_id.encode())
+                if value is not None:
+                    deleted += len(run_id.encode()) + len(value)
+                deleted += self._delete_deltas(txn, run_id)
+            return deleted
+
+        # Freed pages are reused by later writes, compact() shrinks the file
+        return await self.shared.write(_delete_many)
+
+    async def compact(self) -> int:
+        """
+        Rewrite the database file without its free pages. Reads and writes wait while it runs,
+        so it stalls all I/O on the database for the time of a full copy: run it when idle.
+        """
+        return await self.shared.write(self.shared._compact, exclusive=True)
+
+    async def load_deltas_many(self, run_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        run_ids = list(run_ids)
+
+        def _load_deltas_many(txn):
+            return {run_id: self._read_deltas(txn, run_id) for run_id in run_ids}
+
+        return await asyncio.to_thread(self.shared.transaction, _load_deltas_many)
+
+    async def scan(self, batch_size: int = 100) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        def _next_batch(txn, after: Optional[bytes]):
+            batch = []
+            cursor = txn.cursor()
+            positioned = cursor.set_range(after + b"\x00") if after is not None else cursor.first()
+            while positioned and len(batch) < batch_size:
+                key = bytes(cursor.key())
+                if b"/" not in key:
+                    batch.append((key, decode(cursor.value())))
+                positioned = cursor.next()
+            return batch
+
+        after = None
+        while True:
+            # A short read transaction per batch, a long one would pin old pages while the scan runs
+            batch = await asyncio.to_thread(self.shared.transaction, lambda txn: _next_batch(txn, after))
+            if not batch:
+                return
+            for key, data in batch:
+                yield key.decode(), data
+            after = batch[-1][0]
+
+    async def list_run_ids(self) -> List[str]:
+        def _list(txn):
+            # Deltas live under "<run_id>/delta/<seq>" keys
+            return [key.decode() for key in txn.cursor().iternext(values=False) if b"/" not in key]
+
+        return await asyncio.to_thread(self.shared.transaction, _list, False)
+
+    def _deltas_prefix(self, run_id: str) -> bytes:
+        return f"{run_id}/delta/".encode()
 
-        await asyncio.to_thread(_delete)
+    def _delete_deltas(self, txn, run_id: str) -> int:
+        prefix = self._deltas_prefix(run_id)
+        cursor = txn.cursor()
+        deleted = 0
+        if cursor.set_range(prefix):
+            while cursor.key().startswith(prefix):
+                deleted += len(cursor.key()) + len(cursor.value())
+                if not cursor.delete():
+                    break
+        return deleted
 
-async def main():
-    storage = LMDBStorage()
-    run_id = "test_run_1"
-    test_data = {"key": "value", "nested": {"a": 1, "b": 2}}
+    async def append_delta(self, run_id: str, delta: Dict[str, Any]) -> None:
+        value = self.codec.dumps(delta)
 
-    await storage.save(run_id, test_data)
-    print(f"Saved data for run_id: {run_id}")
+        def _append(txn):
+            prefix = self._deltas_prefix(run_id)
+            # Keys sort by sequence number, the next one follows the last existing delta
+            cursor = txn.cursor()
+            seq = 0
+            positioned = cursor.prev() if cursor.set_range(prefix + b"\xff") else cursor.last()
+            if positioned and cursor.key().startswith(prefix):
+                seq = int(bytes(cursor.key()[len(prefix):])) + 1
+            txn.put(prefix + f"{seq:010d}".encode(), value)
 
-    loaded_data = await storage.load(run_id)
-    print(f"Loaded data for run_id: {run_id}")
-    print(loaded_data)
+        await self.shared.write(_append)
 
-    await storage.delete(run_id)
-    print(f"Deleted data for run_id: {run_id}")
+    def _read_deltas(self, txn, run_id: str) -> List[Dict[str, Any]]:
+        prefix = self._deltas_prefix(run_id)
+        deltas = []
+        cursor = txn.cursor()
+        if cursor.set_range(prefix):
+            for key, value in cursor:
+                if not bytes(key).startswith(prefix):
+                    break
+                deltas.append(decode(value))
+        return deltas
 
-    try:
-        await storage.load(run_id)
-    except KeyError as e:
-        print(f"Expected error: {e}")
+    async def load_deltas(self, run_id: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.shared.transaction, lambda txn: self._read_deltas(txn, run_id))
 
-if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    async def clear_deltas(self, run_id: str) -> None:
+        await self.shared.write(lambda txn: self._delete_deltas(txn, run_id))
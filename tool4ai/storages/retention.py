@@ -0,0 +1,131 @@
+# tool4ai/storages/retention.py
+
+import time
+import asyncio
+import logging
+from typing import Dict, Any, AsyncIterator, List, Optional
+from .base_storage import BaseStorage
+from .journal import ExecutionJournal
+
+logger = logging.getLogger(__name__)
+
+class RetentionSweeper:
+    """
+    Delete stored runs once they are older than the TTL of their graph status, e.g. keep "human"
+    runs, which wait for the user, for 7 days and "success" runs for 1 day. Runs are deleted in
+    small batches with a pause between them, so a sweep does not hold up foreground I/O. The
+    sweeper never compacts the storage, compaction stalls all I/O while it runs: call
+    storage.compact() yourself when the storage is idle.
+    """
+
+    def __init__(
+        self,
+        storage: BaseStorage,
+        ttls: Dict[str, float],
+        default_ttl: Optional[float] = None,
+        batch_size: int = 100,
+        pause: float = 0.1,
+        interval: float = 3600.0,
+    ):
+        """
+        Args:
+            storage (BaseStorage): The storage to sweep.
+            ttls (Dict[str, float]): TTL in seconds per graph status, counted from the last save.
+            default_ttl (Optional[float]): TTL of runs whose status is not in `ttls`, None keeps them.
+            batch_size (int): Number of runs deleted at once.
+            pause (float): Seconds to wait between two batches.
+            interval (float): Seconds between two sweeps of the background task.
+        """
+        self.storage = storage
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.totals = {"runs": 0, "bytes": 0, "sweeps": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def _is_expired(self, record: Dict[str, Any], now: float) -> bool:
+        ttl = self.ttls.get(record["graph_status"], self.default_ttl)
+        return ttl is not None and record["updated_at"] < now - ttl
+
+    async def _expired_batches(self, now: float) -> AsyncIterator[List[str]]:
+        if type(self.storage).query is not BaseStorage.query:
+            # Indexed backend, ask for the expired runs of each status
+            for status, ttl in self.ttls.items():
+                seen = set()
+                while True:
+                    records = await self.storage.query(graph_status=status, updated_before=now - ttl, limit=self.batch_size)
+                    run_ids = [record["run_id"] for record in records if record["run_id"] not in seen]
+                    if not run_ids:
+                        break
+                    seen.update(run_ids)
+                    yield run_ids
+            if self.default_ttl is not None:
+                updated_after = None
+                while True:
+                    records = await self.storage.query(
+                        updated_before=now - self.default_ttl, updated_after=updated_after, limit=self.batch_size
+                    )
+                    if not records:
+                        break
+                    run_ids = [record["run_id"] for record in records if record["graph_status"] not in self.ttls]
+                    if run_ids:
+                        yield run_ids
+                    updated_after = records[-1]["updated_at"]
+            return
+
+        # Without an index, check every run once
+        expired = []
+        async for record in self.storage.scan_metadata(self.batch_size):
+            if self._is_expired(record, now):
+                expired.append(record["run_id"])
+            if len(expired) >= self.batch_size:
+                yield expired
+                expired = []
+        if expired:
+            yield expired
+
+    async def sweep(self) -> Dict[str, int]:
+        """
+        Delete every expired run, with its deltas and execution journal.
+
+        Returns:
+            Dict[str, int]: Number of runs deleted and bytes removed.
+        """
+        report = {"runs": 0, "bytes": 0}
+        async for run_ids in self._expired_batches(time.time()):
+            journal_ids = [ExecutionJournal.journal_id(run_id) for run_id in run_ids]
+            report["bytes"] += await self.storage.delete_many(run_ids + journal_ids)
+            report["runs"] += len(run_ids)
+            await asyncio.sleep(self.pause)
+
+        for key, value in report.items():
+            self.totals[key] += value
+        self.totals["sweeps"] += 1
+        return report
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                report = await self.sweep()
+                if report["runs"]:
+                    logger.info("Retention sweep: deleted %d runs, reclaimed %d bytes", report["runs"], report["bytes"])
+            except Exception:
+                logger.exception("Error during retention sweep")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        """Sweep every `interval` seconds in a background task of the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
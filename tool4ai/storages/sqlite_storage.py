@@ -0,0 +1,301 @@
+# tool4ai/storages/sqlite_storage.py
+
+import os
+import zlib
+import queue
+import sqlite3
+import asyncio
+from contextlib import contextmanager
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple, Union
+from .base_storage import BaseStorage
+from ..utils.codec import Codec, decode, get_codec
+
+class SQLiteStorage(BaseStorage):
+    """
+    SQLite backend. Runs are stored as zlib-compressed JSON blobs next to indexed metadata
+    columns (graph status, tenant, timestamps), so runs can be queried without loading them.
+    The database runs in WAL mode and connections are shared through a small pool.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            graph_status TEXT,
+            tenant TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            payload BLOB NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS runs_status_updated ON runs (graph_status, updated_at)",
+        "CREATE INDEX IF NOT EXISTS runs_tenant_updated ON runs (tenant, updated_at)",
+        "CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated_at)",
+        """CREATE TABLE IF NOT EXISTS deltas (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            payload BLOB NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS deltas_run ON deltas (run_id, seq)",
+    ]
+
+    def __init__(self, db_path: Optional[str] = None, pool_size: int = 4, codec: Optional[Union[str, Codec]] = None):
+        self.codec = get_codec(codec)
+        self.db_path = db_path or os.path.expanduser("~/.tool4ai/storage/sqlite/tool4ai.db")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _encode(self, data: Dict[str, Any]) -> bytes:
+        return zlib.compress(self.codec.dumps(data))
+
+    @staticmethod
+    def _decode(payload: bytes) -> Dict[str, Any]:
+        return decode(zlib.decompress(payload))
+
+    async def save(self, run_id: str, data: Dict[str, Any]) -> None:
+        record = self.run_metadata(run_id, data)
+        payload = self._encode(data)
+
+        def _save():
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO runs (run_id, graph_status, tenant, created_at, updated_at, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (run_id, record["graph_status"], record["tenant"], record["created_at"], record["updated_at"], payload),
+                )
+
+        await asyncio.to_thread(_save)
+
+    async def load(self, run_id: str) -> Dict[str, Any]:
+        def _load():
+            with self._connection() as conn:
+                row = conn.execute("SELECT payload FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"No data found for run_id: {run_id}")
+            return self._decode(row[0])
+
+        return await asyncio.to_thread(_load)
+
+    async def delete(self, run_id: str) -> None:
+        def _delete():
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+                conn.execute("DELETE FROM deltas WHERE run_id = ?", (run_id,))
+
+        await asyncio.to_thread(_delete)
+
+    # SQLite limits the number of bound parameters per statement
+    MAX_VARIABLES = 500
+
+    def _chunks(self, run_ids: List[str]):
+        for start in range(0, len(run_ids), self.MAX_VARIABLES):
+            chunk = run_ids[start:start + self.MAX_VARIABLES]
+            yield chunk, ",".join("?" * len(chunk))
+
+    async def save_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        rows = []
+        for run_id, data in items.items():
+            record = self.run_metadata(run_id, data)
+            rows.append((
+                run_id, record["graph_status"], record["tenant"], record["created_at"], record["updated_at"],
+                self._encode(data),
+            ))
+
+        def _save_many():
+            with self._transaction() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO runs (run_id, graph_status, tenant, created_at, updated_at, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+
+        await asyncio.to_thread(_save_many)
+
+    async def load_many(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        run_ids = list(run_ids)
+
+        def _load_many():
+            found = {}
+            with self._connection() as conn:
+                for chunk, placeholders in self._chunks(run_ids):
+                    rows = conn.execute(
+                        f"SELECT run_id, payload FROM runs WHERE run_id IN ({placeholders})", chunk
+                    ).fetchall()
+                    found.update((run_id, self._decode(payload)) for run_id, payload in rows)
+            return found
+
+        return await asyncio.to_thread(_load_many)
+
+    async def delete_many(self, run_ids: Iterable[str]) -> int:
+        run_ids = list(run_ids)
+
+        def _delete_many():
+            deleted = 0
+            with self._transaction() as conn:
+                for chunk, placeholders in self._chunks(run_ids):
+                    for table in ("runs", "deltas"):
+                        deleted += conn.execute(
+                            f"SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM {table} WHERE run_id IN ({placeholders})", chunk
+                        ).fetchone()[0]
+                        conn.execute(f"DELETE FROM {table} WHERE run_id IN ({placeholders})", chunk)
+            return deleted
+
+        # Freed pages are reused by later writes, compact() shrinks the file
+        return await asyncio.to_thread(_delete_many)
+
+    def _file_size(self) -> int:
+        return sum(
+            os.path.getsize(path)
+            for path in (self.db_path, self.db_path + "-wal")
+            if os.path.exists(path)
+        )
+
+    async def compact(self) -> int:
+        def _compact():
+            before = self._file_size()
+            with self._connection() as conn:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return before - self._file_size()
+
+        return await asyncio.to_thread(_compact)
+
+    async def load_deltas_many(self, run_ids: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        run_ids = list(run_ids)
+
+        def _load_deltas_many():
+            deltas = {run_id: [] for run_id in run_ids}
+            with self._connection() as conn:
+                for chunk, placeholders in self._chunks(run_ids):
+                    rows = conn.execute(
+                        f"SELECT run_id, payload FROM deltas WHERE run_id IN ({placeholders}) ORDER BY seq", chunk
+                    ).fetchall()
+                    for run_id, payload in rows:
+                        deltas[run_id].append(self._decode(payload))
+            return deltas
+
+        return await asyncio.to_thread(_load_deltas_many)
+
+    async def scan(self, batch_size: int = 100) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        def _next_batch(after: str):
+            # Keyset pagination on the primary key, each batch is one indexed range read
+            with self._connection() as conn:
+                return conn.execute(
+                    "SELECT run_id, payload FROM runs WHERE run_id > ? ORDER BY run_id LIMIT ?", (after, batch_size)
+                ).fetchall()
+
+        after = ""
+        while True:
+            rows = await asyncio.to_thread(_next_batch, after)
+            for run_id, payload in rows:
+                yield run_id, self._decode(payload)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    async def append_delta(self, run_id: str, delta: Dict[str, Any]) -> None:
+        payload = self._encode(delta)
+
+        def _append():
+            with self._transaction() as conn:
+                conn.execute("INSERT INTO deltas (run_id, payload) VALUES (?, ?)", (run_id, payload))
+                # Keep the indexed columns current, the snapshot payload is only rewritten on compaction
+                if "graph_status" in delta:
+                    conn.execute(
+                        "UPDATE runs SET graph_status = ?, updated_at = COALESCE(?, updated_at) WHERE run_id = ?",
+                        (delta["graph_status"], delta.get("updated_at"), run_id),
+                    )
+
+        await asyncio.to_thread(_append)
+
+    async def load_deltas(self, run_id: str) -> List[Dict[str, Any]]:
+        def _load_deltas():
+            with self._connection() as conn:
+                rows = conn.execute(
+                    "SELECT payload FROM deltas WHERE run_id = ? ORDER BY seq", (run_id,)
+                ).fetchall()
+            return [self._decode(row[0]) for row in rows]
+
+        return await asyncio.to_thread(_load_deltas)
+
+    async def clear_deltas(self, run_id: str) -> None:
+        def _clear():
+            with self._connection() as conn:
+                conn.execute("DELETE FROM deltas WHERE run_id = ?", (run_id,))
+
+        await asyncio.to_thread(_clear)
+
+    async def list_run_ids(self) -> List[str]:
+        def _list():
+            with self._connection() as conn:
+                return [row[0] for row in conn.execute("SELECT run_id FROM runs")]
+
+        return await asyncio.to_thread(_list)
+
+    async def query(
+        self,
+        graph_status: Optional[str] = None,
+        tenant: Optional[str] = None,
+        updated_before: Optional[float] = None,
+        updated_after: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for clause, value in (
+            ("graph_status = ?", graph_status),
+            ("tenant = ?", tenant),
+            ("updated_at < ?", updated_before),
+            ("updated_at > ?", updated_after),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = "SELECT run_id, graph_status, tenant, created_at, updated_at FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY updated_at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        def _query():
+            with self._connection() as conn:
+                rows = conn.execute(sql, params).fetchall()
+            return [
+                dict(zip(("run_id", "graph_status", "tenant", "created_at", "updated_at"), row))
+                for row in rows
+            ]
+
+        return await asyncio.to_thread(_query)
+
+    def close(self) -> None:
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
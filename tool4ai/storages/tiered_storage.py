@@ -0,0 +1,206 @@
+# tool4ai/storages/tiered_storage.py
+
+import copy
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional
+from .base_storage import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+class TieredStorage(BaseStorage):
+    """
+    In-memory tier in front of another storage backend. Recently used runs are served from a
+    bounded LRU cache, and saved snapshots are written to the backend behind the caller's back,
+    at most `flush_interval` seconds later. Deltas are written through, after any pending
+    snapshot of the same run, so the backend never holds deltas newer than a missing snapshot.
+    Call flush() before shutting down, unflushed snapshots only live in memory.
+    """
+
+    def __init__(
+        self,
+        backend: BaseStorage,
+        max_entries: int = 128,
+        flush_interval: float = 1.0,
+        max_dirty: int = 64,
+    ):
+        """
+        Args:
+            backend (BaseStorage): The storage every run is eventually written to.
+            max_entries (int): Number of runs kept in the memory tier.
+            flush_interval (float): Maximum delay, in seconds, before a saved run is written to the backend.
+            max_dirty (int): Maximum number of runs waiting to be written, save() flushes when it is exceeded.
+        """
+        self.backend = backend
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        # run_id -> {"data": snapshot, "deltas": list of deltas}, either key may be missing
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # run_id -> (time it became dirty, snapshot), in insertion order
+        self._dirty: Dict[str, Any] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _entry(self, run_id: str) -> Dict[str, Any]:
+        entry = self._cache.get(run_id)
+        if entry is None:
+            entry = self._cache[run_id] = {}
+        self._cache.move_to_end(run_id)
+        # Dirty runs stay reachable through self._dirty, they can be evicted safely
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return entry
+
+    def _lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._flush_lock is None or self._lock_loop is not loop:
+            self._flush_lock, self._lock_loop = asyncio.Lock(), loop
+        return self._flush_lock
+
+    async def save(self, run_id: str, data: Dict[str, Any]) -> None:
+        # Callers keep mutating their objects (e.g. graph results), keep a private copy
+        data = copy.deepcopy(data)
+        self._entry(run_id)["data"] = data
+        since = self._dirty.pop(run_id, (time.monotonic(), None))[0]
+        self._dirty[run_id] = (since, data)
+
+        if len(self._dirty) > self.max_dirty:
+            await self.flush()
+        else:
+            self._schedule_flush()
+
+    def _cached(self, run_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(run_id)
+        if entry is not None and "data" in entry:
+            self._cache.move_to_end(run_id)
+            return entry["data"]
+        if run_id in self._dirty:
+            # Evicted before it was written
+            data = self._entry(run_id)["data"] = self._dirty[run_id][1]
+            return data
+        return None
+
+    async def load(self, run_id: str) -> Dict[str, Any]:
+        data = self._cached(run_id)
+        if data is None:
+            data = await self.backend.load(run_id)
+            self._entry(run_id)["data"] = data
+        return copy.deepcopy(data)
+
+    async def load_many(self, run_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        found, missing = {}, []
+        for run_id in run_ids:
+            data = self._cached(run_id)
+            if data is not None:
+                found[run_id] = copy.deepcopy(data)
+            else:
+                missing.append(run_id)
+        if missing:
+            for run_id, data in (await self.backend.load_many(missing)).items():
+                self._entry(run_id)["data"] = data
+                found[run_id] = copy.deepcopy(data)
+        return found
+
+    async def delete(self, run_id: str) -> None:
+        self._cache.pop(run_id, None)
+        self._dirty.pop(run_id, None)
+        async with self._lock():
+            await self.backend.delete(run_id)
+
+    async def delete_many(self, run_ids: Iterable[str]) -> int:
+        run_ids = list(run_ids)
+        for run_id in run_ids:
+            self._cache.pop(run_id, None)
+            self._dirty.pop(run_id, None)
+        async with self._lock():
+            return await self.backend.delete_many(run_ids)
+
+    async def compact(self) -> int:
+        return await self.backend.compact()
+
+    async def append_delta(self, run_id: str, delta: Dict[str, Any]) -> None:
+        await self._flush_run(run_id)
+        await self.backend.append_delta(run_id, delta)
+        entry = self._cache.get(run_id)
+        if entry is not None and "deltas" in entry:
+            entry["deltas"].append(copy.deepcopy(delta))
+
+    async def load_deltas(self, run_id: str) -> List[Dict[str, Any]]:
+        entry = self._cache.get(run_id)
+        if entry is None or "deltas" not in entry:
+            deltas = await self.backend.load_deltas(run_id)
+            self._entry(run_id)["deltas"] = deltas
+        else:
+            deltas = entry["deltas"]
+        return copy.deepcopy(deltas)
+
+    async def clear_deltas(self, run_id: str) -> None:
+        # The snapshot that folds these deltas in must be durable before they are dropped
+        await self._flush_run(run_id)
+        await self.backend.clear_deltas(run_id)
+        entry = self._cache.get(run_id)
+        if entry is not None:
+            entry["deltas"] = []
+
+    async def list_run_ids(self) -> List[str]:
+        run_ids = await self.backend.list_run_ids()
+        known = set(run_ids)
+        return run_ids + [run_id for run_id in self._dirty if run_id not in known]
+
+    async def query(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        await self.flush()
+        return await self.backend.query(*args, **kwargs)
+
+    def _schedule_flush(self) -> None:
+        loop = asyncio.get_running_loop()
+        # A task of a closed loop (e.g. after save_sync) never finishes, replace it
+        if self._flush_task is None or self._flush_task.done() or self._flush_task.get_loop() is not loop:
+            self._flush_task = loop.create_task(self._flush_on_deadline())
+
+    async def _flush_on_deadline(self) -> None:
+        while self._dirty:
+            oldest = min(since for since, _ in self._dirty.values())
+            await asyncio.sleep(max(0.0, oldest + self.flush_interval - time.monotonic()))
+            try:
+                await self.flush(older_than=time.monotonic() - self.flush_interval)
+            except Exception:
+                logger.exception("Error flushing tiered storage")
+                await asyncio.sleep(self.flush_interval)
+
+    async def _write(self, run_ids: List[str]) -> None:
+        async with self._lock():
+            batch = [(run_id, self._dirty.pop(run_id)) for run_id in run_ids if run_id in self._dirty]
+            results = await asyncio.gather(
+                *[self.backend.save(run_id, data) for run_id, (_, data) in batch], return_exceptions=True
+            )
+            errors = []
+            for (run_id, pending), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    # Keep the run dirty unless it was saved again in the meantime
+                    self._dirty.setdefault(run_id, pending)
+                    errors.append(result)
+            if errors:
+                raise errors[0]
+
+    async def _flush_run(self, run_id: str) -> None:
+        if run_id in self._dirty:
+            await self._write([run_id])
+
+    async def flush(self, older_than: Optional[float] = None) -> None:
+        """
+        Write pending snapshots to the backend.
+
+        Args:
+            older_than (Optional[float]): Only write runs dirty since before this time.monotonic()
+                value, every pending run if None.
+        """
+        run_ids = [
+            run_id for run_id, (since, _) in self._dirty.items()
+            if older_than is None or since <= older_than
+        ]
+        if run_ids:
+            await self._write(run_ids)
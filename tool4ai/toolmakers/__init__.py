@@ -1,13 +1,30 @@
 from .tool_convertors import ToolsConvertor, OpenAIToolConvertor, AnthropicToolConvertor
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 import litellm, json
+import logging
+from ..utils.messages import strip_tags
+
+logger = logging.getLogger(__name__)
 
 class ToolMaker(ABC):
-    def __init__(self, model_name: str):
+    # Provider specs kept, least recently used ones are dropped first
+    MAX_SPECS = 256
+
+    def __init__(self, model_name: str, cache_breakpoints: bool = False):
+        """
+        Args:
+            model_name (str): The model used for all calls.
+            cache_breakpoints (bool): Annotate the end of the shared message prefix with a
+                `cache_control` breakpoint, for providers that support explicit prompt caching.
+        """
         self.model_name = model_name
+        self.cache_breakpoints = cache_breakpoints
         self.system_prompt = "You are an AI assistant designed to analyze user queries and determine which tools, if any, should be used to respond."
+        # Provider spec of each (format, tool id), with the tool info it was converted from
+        self._specs: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], Dict[str, Any]]]" = OrderedDict()
 
     @abstractmethod
     def extract_usage(self, response) -> Dict[str, int]:
@@ -21,6 +38,54 @@ class ToolMaker(ABC):
     def _create_messages(self, query: str, memory: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         pass
     
+    @staticmethod
+    def sort_tools_info(tools_info: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Return the tools in a canonical order (by name, then id) so that the tool specs sent to the
+        provider are byte-stable across calls, which keeps provider-side prompt caching effective.
+        """
+        return [tools_info[key] for key in sorted(tools_info, key=lambda key: (tools_info[key]["name"], key))]
+
+    def tool_specs(self, convertor: ToolsConvertor, tools_info: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Return the provider specs of `tools_info` in canonical order. A tool is converted again
+        only when its info compares unequal to the one its spec was built from. Tool infos are
+        replaced, never edited in place, the ones of a Toolkit are shared until add_tool/remove_tool.
+        """
+        specs = []
+        for tool_id in sorted(tools_info, key=lambda key: (tools_info[key]["name"], key)):
+            info = tools_info[tool_id]
+            key = (type(convertor).__name__, tool_id)
+            cached = self._specs.get(key)
+            if cached is None or cached[0] != info:
+                cached = self._specs[key] = (info, convertor.convert([info])[0])
+                while len(self._specs) > self.MAX_SPECS:
+                    self._specs.popitem(last=False)
+            self._specs.move_to_end(key)
+            specs.append(cached[1])
+        return specs
+
+    def _mark_cache_breakpoint(self, messages: List[Dict[str, Any]], boundary: int) -> List[Dict[str, Any]]:
+        """
+        Put a cache breakpoint on the last message at or before `boundary` that has content.
+        The messages are copied, never mutated, since they usually come from the shared memory.
+        """
+        if not self.cache_breakpoints:
+            return messages
+        messages = list(messages)
+        for position in range(min(boundary, len(messages) - 1), -1, -1):
+            content = messages[position].get("content")
+            if isinstance(content, str) and content:
+                content = [{"type": "text", "text": content}]
+            elif isinstance(content, list) and content:
+                content = [dict(block) for block in content]
+            else:
+                continue
+            content[-1]["cache_control"] = {"type": "ephemeral"}
+            messages[position] = {**messages[position], "content": content}
+            break
+        return messages
+
     async def completion(self, 
                          system_message: str, 
                          user_prompt: str, 
@@ -49,10 +114,10 @@ class ToolMaker(ABC):
         # Update default parameters with any provided kwargs
         params = {**default_params, **kwargs}
 
-        messages = [
+        messages = self._mark_cache_breakpoint([
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_prompt}
-        ]
+        ], 0)
 
         if json_schema:
             json_schema["schema"]["additionalProperties"] = False
@@ -77,7 +142,7 @@ class ToolMaker(ABC):
             return message, usage
 
         except Exception as e:
-            print(f"Error in completion: {str(e)}")
+            logger.error("Error in completion: %s", e)
             raise
 
     async def chat(self, 
@@ -94,6 +159,9 @@ class ToolMaker(ABC):
         # Update default parameters with any provided kwargs
         params = {**default_params, **kwargs}
 
+        # Everything but the last message is shared with the previous turn of the conversation
+        messages = self._mark_cache_breakpoint(strip_tags(messages), len(messages) - 2)
+
         try:
             response = await litellm.acompletion(
                 model=self.model_name,
@@ -108,9 +176,72 @@ class ToolMaker(ABC):
             return message, usage
 
         except Exception as e:
-            print(f"Error in completion: {str(e)}")
+            logger.error("Error in completion: %s", e)
             raise
 
+    async def _stream(
+        self, messages: List[Dict[str, Any]], params: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        try:
+            response = await litellm.acompletion(
+                model=self.model_name,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+            async for chunk in response:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                # Providers report the usage on the last chunk
+                usage = getattr(chunk, "usage", None)
+                if text or usage:
+                    yield text or "", usage
+        except Exception as e:
+            logger.error("Error in streaming completion: %s", e)
+            raise
+
+    async def completion_stream(self,
+                                system_message: str,
+                                user_prompt: str,
+                                **kwargs) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        """
+        Like completion(), without a JSON schema, yielding the text as it is generated.
+
+        Yields:
+            Tuple[str, Optional[Dict[str, int]]]: The next piece of text, and the usage statistics
+                on the chunk that reports them, None on the others.
+        """
+        params = {
+            "temperature": 0.7,
+            "max_tokens": 150,
+            "top_p": 1,
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+            **kwargs,
+        }
+        messages = self._mark_cache_breakpoint([
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_prompt}
+        ], 0)
+        async for chunk in self._stream(messages, params):
+            yield chunk
+
+    async def chat_stream(self,
+                          messages: List[Dict[str, Any]],
+                          **kwargs) -> AsyncIterator[Tuple[str, Optional[Dict[str, int]]]]:
+        """Like chat(), yielding the reply as it is generated, in the format of completion_stream()."""
+        params = {
+            "temperature": 0.7,
+            "max_tokens": 1024,
+            "top_p": 1,
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+            **kwargs,
+        }
+        messages = self._mark_cache_breakpoint(strip_tags(messages), len(messages) - 2)
+        async for chunk in self._stream(messages, params):
+            yield chunk
+
 
 # Define what should be importable from the package
 __all__ = ['ToolsConvertor', 'OpenAIToolConvertor', 'AnthropicToolConvertor', 'ToolMaker']
\ No newline at end of file
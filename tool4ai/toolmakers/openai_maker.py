@@ -1,13 +1,14 @@
 from .tool_convertors import OpenAIToolConvertor
 from ..toolmakers import ToolMaker
 from .tool_convertors import OpenAIToolConvertor
+from ..utils.messages import strip_tags
 from typing import Dict, Any, List, Tuple
 import json
 import litellm
 
 class OpenAIToolMaker(ToolMaker):
-    def __init__(self, model_name: str = "gpt-4o-mini-2024-07-18"):
-        super().__init__(model_name)
+    def __init__(self, model_name: str = "gpt-4o-mini-2024-07-18", cache_breakpoints: bool = False):
+        super().__init__(model_name, cache_breakpoints)
         self.tool_convertor = OpenAIToolConvertor()
 
     def extract_usage(self, response) -> Dict[str, int]:
@@ -19,7 +20,7 @@ class OpenAIToolMaker(ToolMaker):
     
     async def make_tools(self, query: str, tools_info: Dict[str, Dict[str, Any]], memory: List[Dict[str, Any]]) -> Dict[str, Any]:
         messages = self._create_messages(query, memory)
-        tools = self.tool_convertor.convert(list(tools_info.values()))
+        tools = self.tool_specs(self.tool_convertor, tools_info)
 
         try:
             response = await litellm.acompletion(
@@ -36,8 +37,10 @@ class OpenAIToolMaker(ToolMaker):
             raise
 
     def _create_messages(self, query: str, memory: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Stable prefix first (system prompt, shared memory), per-node query last
         messages = [{"role": "system", "content": self.system_prompt}]
-        messages.extend(memory)
+        messages.extend(strip_tags(memory))
+        messages = self._mark_cache_breakpoint(messages, len(messages) - 1)
         if query:
             messages.append({"role": "user", "content": query})
         return messages
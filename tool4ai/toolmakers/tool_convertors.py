@@ -23,12 +23,14 @@ class OpenAIToolConvertor(ToolsConvertor):
         converted_tools = []
         
         for tool in tools_info:
-            tool["schema"].setdefault("additionalProperties", False)
+            # Copy the schema, the tool's own schema is shared and must not be mutated
+            parameters = dict(tool["schema"])
+            parameters.setdefault("additionalProperties", False)
             converted_tool = {
                 "name": tool["name"],
                 "strict": True,
                 "description": tool["description"],
-                "parameters": tool["schema"] #{**tool["schema"], "additionalProperties" : False}
+                "parameters": parameters
             }
             converted_tools.append({
                 "type": "function",
@@ -0,0 +1,86 @@
+# File: tool4ai/utils/codec.py
+
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    # Several times faster than the json module for both directions
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+class Codec:
+    """Serialize plain data (dicts, lists, strings, numbers) to bytes and back."""
+    name = ""
+
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        raise NotImplementedError
+
+class JSONCodec(Codec):
+    """Compact JSON, through orjson when it is installed and the json module otherwise."""
+    name = "json"
+
+    def dumps(self, obj: Any) -> bytes:
+        if orjson is not None:
+            try:
+                # Graph dicts use int keys, the json module converts them to strings too
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # e.g. integers over 64 bits, the json module handles them
+                pass
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def dumps_text(self, obj: Any) -> str:
+        return self.dumps(obj).decode()
+
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        return json.loads(data)
+
+class MsgPackCodec(Codec):
+    """MessagePack, a compact binary format. Requires the optional msgpack package."""
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImportError("MsgPackCodec requires msgpack, install it with `pip install msgpack`")
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+CODECS = {"json": JSONCodec, "msgpack": MsgPackCodec}
+_instances: Dict[str, Codec] = {}
+
+def get_codec(codec: Optional[Union[str, Codec]] = None) -> Codec:
+    """Resolve a codec name ("json" by default) or instance to a codec instance."""
+    if isinstance(codec, Codec):
+        return codec
+    name = codec or "json"
+    if name not in CODECS:
+        raise ValueError(f"codec must be one of {list(CODECS)}, got {name!r}")
+    if name not in _instances:
+        _instances[name] = CODECS[name]()
+    return _instances[name]
+
+def decode(data: Union[bytes, bytearray, memoryview]) -> Any:
+    """
+    Decode data written by any codec. JSON documents start with "{" or "[", anything else is
+    MessagePack, so data stays readable after the codec of a storage is changed.
+    """
+    if not data or data[:1] in (b"{", b"[", b" ", b"\n", b"\r", b"\t"):
+        return get_codec("json").loads(data)
+    return get_codec("msgpack").loads(data)
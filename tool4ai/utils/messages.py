@@ -0,0 +1,23 @@
+# File: tool4ai/utils/messages.py
+
+from typing import Any, Dict, List, Optional
+
+# Key of the memory entries written by a graph's sub-queries, holding the graph's run_id. Unlike
+# object identity it survives copies, serialization and compaction. It is never sent to providers
+RUN_TAG = "tool4ai_run_id"
+
+def tag_messages(messages: List[Dict[str, Any]], run_id: str) -> List[Dict[str, Any]]:
+    """Mark `messages`, in place, as written by the graph of `run_id`."""
+    for message in messages:
+        message[RUN_TAG] = run_id
+    return messages
+
+def message_run_id(message: Dict[str, Any]) -> Optional[str]:
+    return message.get(RUN_TAG)
+
+def strip_tags(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The messages as sent to a provider, tagged messages are copied, never mutated."""
+    return [
+        {key: value for key, value in message.items() if key != RUN_TAG} if RUN_TAG in message else message
+        for message in messages
+    ]
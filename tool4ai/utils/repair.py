@@ -0,0 +1,152 @@
+# File: tool4ai/utils/repair.py
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*(?:```\s*)?$", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+class JSONRepairError(ValueError):
+    """Exception raised when a JSON document cannot be repaired locally."""
+    pass
+
+def _replace_outside_strings(text: str) -> str:
+    """Remove trailing commas and convert Python literals, leaving string contents untouched."""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    for ix in range(0, len(parts), 2):
+        part = _TRAILING_COMMA.sub(r"\1", parts[ix])
+        parts[ix] = re.sub(r"\b(True|False|None)\b", lambda m: _PYTHON_LITERALS[m.group(1)], part)
+    return "".join(parts)
+
+def _close_truncated(text: str) -> str:
+    """Close the strings, arrays and objects left open by a truncated document."""
+    stack: List[str] = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    if in_string:
+        text = (text[:-1] if escape else text) + '"'
+    text = text.rstrip()
+    if stack and stack[-1] == "}":
+        # A key without a value cannot be completed, drop it
+        text = _DANGLING_KEY.sub(r"\1", text)
+    text = text.rstrip().rstrip(",:").rstrip()
+    return text + "".join(reversed(stack))
+
+def repair_json(text: str) -> Any:
+    """
+    Parse `text` as JSON, repairing the usual defects of LLM output when needed: code fences,
+    leading prose, trailing commas, Python literals and truncation.
+
+    Raises:
+        JSONRepairError: If the document cannot be repaired.
+    """
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        pass
+    if not isinstance(text, str):
+        raise JSONRepairError(f"Cannot parse {type(text).__name__} as JSON")
+
+    fenced = _CODE_FENCE.match(text)
+    candidate = fenced.group(1) if fenced else text
+    starts = [pos for pos in (candidate.find("{"), candidate.find("[")) if pos >= 0]
+    if not starts:
+        raise JSONRepairError(f"No JSON document found in: {text[:100]!r}")
+    candidate = _replace_outside_strings(candidate[min(starts):].strip())
+
+    # Retry with the last, possibly incomplete, element cut off a few times
+    for _ in range(5):
+        try:
+            return json.loads(_close_truncated(candidate))
+        except ValueError:
+            pass
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError as e:
+            # Extra data after a complete document
+            if e.msg == "Extra data":
+                return json.loads(candidate[:e.pos])
+        cut = candidate.rfind(",")
+        if cut <= 0:
+            break
+        candidate = candidate[:cut]
+    raise JSONRepairError(f"Could not repair JSON: {text[:100]!r}")
+
+def repair_sub_queries(sub_queries: List[Any]) -> List[str]:
+    """
+    Fix the dependencies of a decomposition plan in place: references to unknown sub-queries,
+    self-dependencies and cycles are removed.
+
+    Returns:
+        List[str]: A description of every fix that was applied.
+
+    Raises:
+        ValueError: If the plan cannot be repaired (e.g. duplicated indices).
+    """
+    indices = [sq.index for sq in sub_queries]
+    if len(set(indices)) != len(indices):
+        raise ValueError(f"Duplicated sub-query indices: {indices}")
+    known = set(indices)
+    fixes = []
+    by_index: Dict[int, Any] = {sq.index: sq for sq in sub_queries}
+    dependencies = {sq.index: sq.get_dependencies() for sq in sub_queries}
+
+    def _drop_dependency(sq, parent, reason):
+        fixes.append(f"Sub-query {sq.index}: removed dependency on {parent} ({reason})")
+        dependencies[sq.index] = [item for item in dependencies[sq.index] if item.index != parent]
+        sq.set_dependencies(dependencies[sq.index])
+
+    for sq in sub_queries:
+        for dependency in list(dependencies[sq.index]):
+            if dependency.index == sq.index:
+                _drop_dependency(sq, dependency.index, "self-dependency")
+            elif dependency.index not in known:
+                _drop_dependency(sq, dependency.index, "unknown sub-query")
+
+    def _find_cycle() -> Optional[List[Any]]:
+        # Depth-first search along parent links, a cycle is returned as its (child, parent) edges
+        state: Dict[int, int] = {}
+        for root in sub_queries:
+            if root.index in state:
+                continue
+            state[root.index] = 1
+            stack = [(root.index, iter(dependencies[root.index]))]
+            while stack:
+                child, parents = stack[-1]
+                dependency = next(parents, None)
+                if dependency is None:
+                    state[child] = 2
+                    stack.pop()
+                elif state.get(dependency.index) == 1:
+                    path = [node for node, _ in stack]
+                    cycle = path[path.index(dependency.index):] + [dependency.index]
+                    return list(zip(cycle, cycle[1:]))
+                elif dependency.index not in state:
+                    state[dependency.index] = 1
+                    stack.append((dependency.index, iter(dependencies[dependency.index])))
+        return None
+
+    cycle = _find_cycle()
+    while cycle is not None:
+        # A forward reference is the most likely mistake, the router lists parents first
+        child, parent = next(((child, parent) for child, parent in cycle if parent > child), cycle[0])
+        _drop_dependency(by_index[child], parent, "cycle")
+        cycle = _find_cycle()
+    return fixes
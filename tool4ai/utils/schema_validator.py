@@ -0,0 +1,188 @@
+# File: tool4ai/utils/schema_validator.py
+
+import re
+from typing import Any, Callable, Dict, List
+
+class SchemaValidationError(ValueError):
+    """Exception raised when a value does not match a tool schema."""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict),
+    "null": lambda value: value is None,
+}
+
+# Strings that convert to a number and back without losing anything the model meant
+_INTEGER = re.compile(r"[-+]?[0-9]+")
+_NUMBER = re.compile(r"[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?")
+
+def _coerce(value: Any, type_name: str) -> Any:
+    """
+    Convert a numeric string to an integer or number and "true"/"false" to a boolean, return
+    `value` unchanged otherwise. Nothing else is coerced, a mismatch is a validation error.
+    """
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    if type_name == "integer" and _INTEGER.fullmatch(text):
+        return int(text)
+    if type_name == "number" and _NUMBER.fullmatch(text):
+        return float(text)
+    if type_name == "boolean" and text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    return value
+
+# A compiled validator takes a value and a path, appends errors and returns the (coerced) value
+Validator = Callable[[Any, str, List[str]], Any]
+
+def _compile(schema: Dict[str, Any]) -> Validator:
+    if not isinstance(schema, dict) or not schema:
+        return lambda value, path, errors: value
+
+    checks: List[Validator] = []
+
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, str) else list(types)
+        known = [type_name for type_name in types if type_name in _TYPE_CHECKS]
+
+        def check_type(value, path, errors):
+            if any(_TYPE_CHECKS[type_name](value) for type_name in known):
+                return value
+            for type_name in known:
+                coerced = _coerce(value, type_name)
+                if _TYPE_CHECKS[type_name](coerced):
+                    return coerced
+            errors.append(f"{path}: expected {' or '.join(types)}, got {type(value).__name__}")
+            return value
+
+        if known:
+            checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append(f"{path}: {value!r} is not one of {allowed}")
+            return value
+
+        checks.append(check_enum)
+
+    for key, compare, message in (
+        ("minimum", lambda value, bound: value >= bound, "must be >= {}"),
+        ("maximum", lambda value, bound: value <= bound, "must be <= {}"),
+    ):
+        if key in schema:
+            def check_bound(value, path, errors, bound=schema[key], compare=compare, message=message):
+                if _TYPE_CHECKS["number"](value) and not compare(value, bound):
+                    errors.append(f"{path}: {value} {message.format(bound)}")
+                return value
+
+            checks.append(check_bound)
+
+    for key, compare, message in (
+        ("minLength", lambda size, bound: size >= bound, "at least {} characters"),
+        ("maxLength", lambda size, bound: size <= bound, "at most {} characters"),
+        ("minItems", lambda size, bound: size >= bound, "at least {} items"),
+        ("maxItems", lambda size, bound: size <= bound, "at most {} items"),
+    ):
+        if key in schema:
+            sized = str if key.endswith("Length") else list
+
+            def check_size(value, path, errors, bound=schema[key], compare=compare, message=message, sized=sized):
+                if isinstance(value, sized) and not compare(len(value), bound):
+                    errors.append(f"{path}: must have {message.format(bound)}")
+                return value
+
+            checks.append(check_size)
+
+    if "items" in schema:
+        validate_item = _compile(schema["items"])
+
+        def check_items(value, path, errors):
+            if isinstance(value, list):
+                return [validate_item(item, f"{path}[{ix}]", errors) for ix, item in enumerate(value)]
+            return value
+
+        checks.append(check_items)
+
+    properties = {name: _compile(sub_schema) for name, sub_schema in schema.get("properties", {}).items()}
+    required = list(schema.get("required", []))
+    additional = schema.get("additionalProperties", True)
+    validate_additional = _compile(additional) if isinstance(additional, dict) else None
+
+    if properties or required or additional is not True:
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return value
+            missing = [name for name in required if name not in value]
+            if missing:
+                errors.append(f"{path}: missing required properties {missing}")
+            result = {}
+            for name, item in value.items():
+                if name in properties:
+                    result[name] = properties[name](item, f"{path}.{name}", errors)
+                elif validate_additional is not None:
+                    result[name] = validate_additional(item, f"{path}.{name}", errors)
+                elif additional is False:
+                    errors.append(f"{path}: unexpected property '{name}'")
+                else:
+                    result[name] = item
+            return result
+
+        checks.append(check_object)
+
+    variants = schema.get("anyOf") or schema.get("oneOf")
+    if variants:
+        compiled_variants = [_compile(variant) for variant in variants]
+
+        def check_variants(value, path, errors):
+            variant_errors = []
+            for validate_variant in compiled_variants:
+                attempt: List[str] = []
+                coerced = validate_variant(value, path, attempt)
+                if not attempt:
+                    return coerced
+                variant_errors.extend(attempt)
+            errors.append(f"{path}: does not match any allowed schema ({'; '.join(variant_errors)})")
+            return value
+
+        checks.append(check_variants)
+
+    def validate(value, path, errors):
+        for check in checks:
+            count = len(errors)
+            value = check(value, path, errors)
+            if len(errors) > count:
+                break
+        return value
+
+    return validate
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], Any]:
+    """
+    Compile a JSON schema once into a validator function.
+
+    The validator returns the value, with lossless coercions applied (e.g. "2021" -> 2021 for an
+    integer), or raises SchemaValidationError listing every problem found. Only the subset of JSON
+    schema used by tool definitions is supported, unknown keywords are ignored.
+    """
+    validate_root = _compile(schema)
+
+    def validator(value: Any) -> Any:
+        errors: List[str] = []
+        value = validate_root(value, "arguments", errors)
+        if errors:
+            raise SchemaValidationError(errors)
+        return value
+
+    return validator